@@ -2,7 +2,8 @@ from django.contrib import admin
 from nextcloudappstore.core.models import DatabaseDependency, AppRelease, \
     ShellCommand, Screenshot, PhpExtensionDependency, License, PhpExtension, \
     Database, AppRating, App, Category, AppAuthor, AppOwnershipTransfer, \
-    AppReleaseDeleteLog, NextcloudRelease
+    AppReleaseDeleteLog, NextcloudRelease, AppReleaseJob, AppReleaseMetadata, \
+    AppReleaseOrigin
 
 from parler.admin import TranslatableAdmin
 
@@ -32,6 +33,30 @@ class AppReleaseAdmin(TranslatableAdmin):
     ordering = ('-last_modified',)
 
 
+@admin.register(AppReleaseJob)
+class AppReleaseJobAdmin(admin.ModelAdmin):
+    list_display = ('download', 'owner', 'state', 'stage', 'status_code',
+                    'created')
+    list_filter = ('state', 'created')
+    ordering = ('-created',)
+
+
+@admin.register(AppReleaseMetadata)
+class AppReleaseMetadataAdmin(admin.ModelAdmin):
+    list_display = ('app_id', 'version', 'is_nightly', 'digest', 'size',
+                    'hits', 'last_used')
+    list_filter = ('is_nightly', 'last_used')
+    search_fields = ('app_id', 'digest')
+    ordering = ('-last_used',)
+
+
+@admin.register(AppReleaseOrigin)
+class AppReleaseOriginAdmin(admin.ModelAdmin):
+    list_display = ('url', 'etag', 'last_modified', 'digest', 'last_used')
+    search_fields = ('url', 'digest')
+    ordering = ('-last_used',)
+
+
 @admin.register(AppAuthor)
 class AppAuthorAdmin(admin.ModelAdmin):
     list_display = ('name', 'mail', 'homepage')
@@ -1,6 +1,10 @@
-from django.http import Http404
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render_to_response, get_object_or_404
+from django.template.loader import render_to_string
 
+from nextcloudappstore.core.caching import apps_etag, get_snapshot, \
+    snapshot_response
 from nextcloudappstore.core.models import App, Category
 
 
@@ -30,15 +34,28 @@ def in_category(app, category):
 def apps(request):
     version = transform_version(request.GET.get('version'))
     category = request.GET.get('categories', None)
-    compatible_apps = App.objects.get_compatible(version)
-    apps = filter(lambda a: a.ocsid is not None, compatible_apps)
-    if category is not None:
-        apps = filter(lambda app: in_category(app, category), apps)
-    return render_to_response('api/v0/apps.xml', {
-        'apps': list(apps),
-        'request': request,
-        'version': version
-    }, content_type='application/xml')
+
+    def render():
+        compatible_apps = App.objects.get_compatible(version)
+        apps = filter(lambda a: a.ocsid is not None, compatible_apps)
+        if category is not None:
+            apps = filter(lambda app: in_category(app, category), apps)
+        return render_to_string('api/v0/apps.xml', {
+            'apps': list(apps),
+            'request': request,
+            'version': version
+        }).encode('utf-8')
+
+    # only known categories and explicitly allowed hosts are kept in
+    # snapshots, any other value would create a snapshot which never expires
+    host = request.get_host()
+    known_category = category is None or category in {
+        cat.ocsid for cat in Category.objects.only('id')}
+    if host not in settings.ALLOWED_HOSTS or not known_category:
+        return HttpResponse(render(), content_type='application/xml')
+    key = 'v0:apps:%s://%s:%s:%s' % (request.scheme, host, version, category)
+    snapshot = get_snapshot(key, apps_etag(request, version), render)
+    return snapshot_response(request, snapshot, 'application/xml')
 
 
 def app(request, id):
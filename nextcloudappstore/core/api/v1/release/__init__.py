@@ -1,7 +1,19 @@
+from functools import lru_cache
+
 from django.conf import settings  # type: ignore
 from nextcloudappstore.core.facades import read_relative_file
 
 
+@lru_cache(maxsize=None)
+def read_release_file(name: str) -> str:
+    """
+    Reads a file which ships with this package once per process
+    :param name: the file name relative to this package
+    :return: the file contents
+    """
+    return read_relative_file(__file__, name)
+
+
 class ReleaseConfig:
     def __init__(self) -> None:
         self.download_root = settings.RELEASE_DOWNLOAD_ROOT  # type: str
@@ -9,7 +21,15 @@ class ReleaseConfig:
         self.download_max_timeout = settings.MAX_DOWNLOAD_TIMEOUT
         self.download_max_redirects = settings.MAX_DOWNLOAD_REDIRECTS
         self.download_max_size = settings.MAX_DOWNLOAD_SIZE
-        self.info_schema = read_relative_file(__file__, 'info.xsd')
-        self.info_xslt = read_relative_file(__file__, 'info.xslt')
-        self.pre_info_xslt = read_relative_file(__file__, 'pre-info.xslt')
+        self.download_chunk_size = settings.DOWNLOAD_CHUNK_SIZE
+        self.download_pool_hosts = settings.DOWNLOAD_POOL_HOSTS
+        self.download_pool_size = settings.DOWNLOAD_POOL_SIZE
+        self.download_pool_timeout = settings.DOWNLOAD_POOL_TIMEOUT
+        # the signature digest and a content hash are computed while
+        # downloading so the archive is never read into memory
+        self.download_digests = (settings.CERTIFICATE_DIGEST, 'sha256')
+        self.info_schema = read_release_file('info.xsd')
+        self.info_xslt = read_release_file('info.xslt')
+        self.pre_info_xslt = read_release_file('pre-info.xslt')
         self.languages = settings.LANGUAGES
+        self.metadata_store_max_size = settings.RELEASE_METADATA_STORE_SIZE
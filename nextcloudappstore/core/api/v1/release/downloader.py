@@ -1,10 +1,20 @@
+import hashlib
 import os
 import tempfile
-from typing import Any
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Iterable, Optional, Tuple, cast
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from requests.packages.urllib3.exceptions import EmptyPoolError
 from rest_framework.exceptions import ValidationError  # type: ignore
 
+from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.streams import iter_bounded, \
+    SizeLimitExceededException, DEFAULT_CHUNK_SIZE
+
 
 class MaximumDownloadSizeExceededException(ValidationError):
     pass
@@ -14,21 +24,149 @@ class DownloadException(ValidationError):
     pass
 
 
+class DownloadValidators:
+    def __init__(self, etag: str, last_modified: str,
+                 digests: Dict[str, bytes]) -> None:
+        """
+        HTTP validators of a previous download which are sent to only
+        download the archive again if it changed
+        :param etag: the ETag header of the previous response or ''
+        :param last_modified: the Last-Modified header of the previous
+        response or ''
+        :param digests: the digests of the previously downloaded archive
+        """
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digests = digests
+
+    def headers(self) -> Dict[str, str]:
+        """
+        :return: the headers of a conditional request
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
 class ReleaseDownload:
-    def __init__(self, filename: str) -> None:
+    def __init__(self, filename: Optional[str], digests: Dict[str, bytes],
+                 etag: str = '', last_modified: str = '') -> None:
+        """
+        :param filename: the path to the downloaded archive, None if the
+        archive was not modified since the previous download
+        :param digests: the digests of the archive by hashlib algorithm name
+        :param etag: the ETag header of the response
+        :param last_modified: the Last-Modified header of the response
+        """
         self.filename = filename
+        self.digests = digests
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def is_modified(self) -> bool:
+        return self.filename is not None
 
     def __enter__(self) -> 'ReleaseDownload':
         return self
 
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
-        os.remove(self.filename)
+        if self.filename is not None:
+            os.remove(self.filename)
+
+
+class BoundedPool:
+    """
+    Connection pool which waits at most pool_timeout seconds for a free
+    connection, requests itself never passes a pool timeout
+    """
+
+    def __init__(self, pool: Any, pool_timeout: float) -> None:
+        self.pool = pool
+        self.pool_timeout = pool_timeout
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.pool, attr)
+
+    def urlopen(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault('pool_timeout', self.pool_timeout)
+        return self.pool.urlopen(*args, **kwargs)
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    def __init__(self, pool_timeout: float, **kwargs: Any) -> None:
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def get_connection(self, url: str, proxies: Any = None) -> BoundedPool:
+        return BoundedPool(super().get_connection(url, proxies),
+                           self.pool_timeout)
+
+
+_sessions = {}  # type: Dict[Tuple[int, int, int, float], requests.Session]
+_sessions_lock = threading.Lock()
+
+
+def create_download_session(max_redirects: int, pool_hosts: int,
+                            pool_size: int,
+                            pool_timeout: float) -> requests.Session:
+    """
+    Creates a session which keeps connections alive and never stores
+    cookies so downloads of different uploads do not influence each other.
+    Downloads wait for a free connection once pool_size connections to the
+    same host are in use
+    :param max_redirects: number of maximum redirects to follow
+    :param pool_hosts: number of hosts whose connections are kept
+    :param pool_size: maximum number of connections per host
+    :param pool_timeout: seconds to wait for a free connection before the
+    download fails
+    :return: the session
+    """
+    session = requests.Session()
+    session.max_redirects = max_redirects
+    # new sessions always use a RequestsCookieJar
+    cookies = cast(RequestsCookieJar, session.cookies)
+    cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, BoundedPoolAdapter(
+            pool_timeout, pool_connections=pool_hosts,
+            pool_maxsize=pool_size, pool_block=True))
+    return session
+
+
+def get_download_session(max_redirects: int, pool_hosts: int,
+                         pool_size: int,
+                         pool_timeout: float) -> requests.Session:
+    """
+    Returns the process wide session for the given limits so uploads reuse
+    connections instead of opening a new TCP and TLS connection every time
+    :param max_redirects: number of maximum redirects to follow
+    :param pool_hosts: number of hosts whose connections are kept
+    :param pool_size: maximum number of connections per host
+    :param pool_timeout: seconds to wait for a free connection
+    :return: the session
+    """
+    key = (max_redirects, pool_hosts, pool_size, pool_timeout)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = create_download_session(*key)
+        return _sessions[key]
 
 
 class AppReleaseDownloader:
+    def __init__(self, config: ReleaseConfig) -> None:
+        self.config = config
+
     def get_archive(self, url: str, target_directory: str, timeout: int = 60,
                     max_redirects: int = 10,
-                    max_size: int = 50 * (1024 ** 2)) -> ReleaseDownload:
+                    max_size: int = 50 * (1024 ** 2),
+                    digests: Iterable[str] = ('sha512', 'sha256'),
+                    validators: Optional[DownloadValidators] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE
+                    ) -> ReleaseDownload:
         """
         Downloads an app release from an url to a directory
         :argument target_directory directory where the downloaded archive
@@ -39,11 +177,20 @@ class AppReleaseDownloader:
         defaults to 10
         :argument max_size how big the archive is allowed to be in bytes,
         defaults to 50Mb
+        :argument digests hashlib algorithms whose digests are computed while
+        the archive is downloaded
+        :argument validators validators of a previous download of the url,
+        if the server responds that the archive was not modified nothing is
+        downloaded and the previous digests are returned
+        :argument chunk_size maximum number of bytes which are read from the
+        response at once
         :raises MaximumDownloadSizeExceededException if the archive is bigger
         than allowed
         :raises DownloadException: if any HTTP or connection error occured
-        :return the path to the downloaded file
+        :return the path to the downloaded file, its digests and the
+        validators of the response
         """
+        hashes = {name: hashlib.new(name) for name in digests}
 
         if target_directory is None:
             file = tempfile.NamedTemporaryFile(delete=False)
@@ -51,30 +198,55 @@ class AppReleaseDownloader:
             os.makedirs(target_directory, mode=0o700, exist_ok=True)
             file = tempfile.NamedTemporaryFile(dir=target_directory,
                                                delete=False)
+        headers = validators.headers() if validators else {}
+        req = None
         try:
-            with requests.Session() as session:
-                session.max_redirects = max_redirects
-                req = session.get(url, stream=True, timeout=timeout)
-                req.raise_for_status()
-                self._stream_to_file(file, max_size, req)
-        except requests.exceptions.RequestException as e:
+            session = self._get_session(max_redirects)
+            req = session.get(url, stream=True, timeout=timeout,
+                              headers=headers)
+            req.raise_for_status()
+            etag = req.headers.get('ETag', '')
+            last_modified = req.headers.get('Last-Modified', '')
+            if validators and req.status_code == 304:
+                file.close()
+                os.remove(file.name)
+                return ReleaseDownload(
+                    None, validators.digests, etag or validators.etag,
+                    last_modified or validators.last_modified)
+            self._stream_to_file(file, max_size, req, hashes.values(),
+                                 chunk_size)
+        except (requests.exceptions.RequestException, EmptyPoolError) as e:
             raise DownloadException(e)
-        return ReleaseDownload(file.name)
+        finally:
+            # hands the connection back to the pool of the session
+            if req is not None:
+                req.close()
+        return ReleaseDownload(file.name, {name: digest.digest() for
+                                           name, digest in hashes.items()},
+                               etag, last_modified)
+
+    def _get_session(self, max_redirects: int) -> requests.Session:
+        return get_download_session(max_redirects,
+                                    self.config.download_pool_hosts,
+                                    self.config.download_pool_size,
+                                    self.config.download_pool_timeout)
 
     def _stream_to_file(self, file: Any, max_size: int,
-                        req: requests.Response) -> None:
+                        req: requests.Response, hashes: Iterable[Any],
+                        chunk_size: int) -> None:
         # start streaming download
         finished = False
         try:
-            size = 0
-            for chunk in req.iter_content(1024):
+            chunks = req.iter_content(chunk_size)
+            for chunk in iter_bounded(chunks, max_size):
                 file.write(chunk)
-                size += len(chunk)
-                if size > max_size:
-                    msg = 'Downloaded archive is bigger than the ' \
-                          'allowed %i bytes' % max_size
-                    raise MaximumDownloadSizeExceededException(msg)
+                for digest in hashes:
+                    digest.update(chunk)
             finished = True
+        except SizeLimitExceededException:
+            msg = 'Downloaded archive is bigger than the allowed %i bytes' \
+                  % max_size
+            raise MaximumDownloadSizeExceededException(msg)
         finally:
             # in case any errors occurred, get rid of the file
             file.close()
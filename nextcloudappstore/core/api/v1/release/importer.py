@@ -1,12 +1,15 @@
-from typing import Dict, Any, Set, Tuple  # type: ignore
+from collections import OrderedDict
+from typing import Dict, Any, Set, Tuple, List, Iterable, \
+    Callable, Sequence  # type: ignore
+from django.db import connection
 from django.utils import timezone
-from semantic_version import Version  # type: ignore
 
 from nextcloudappstore.core.facades import any_match
 from nextcloudappstore.core.models import App, Screenshot, Category, \
     AppRelease, ShellCommand, License, Database, DatabaseDependency, \
-    PhpExtensionDependency, PhpExtension, AppAuthor
-from nextcloudappstore.core.versioning import to_spec, to_raw_spec
+    PhpExtensionDependency, PhpExtension, AppAuthor, spec_keys
+from nextcloudappstore.core.versioning import to_spec, to_raw_spec, \
+    parse_version
 
 
 def none_to_empty_string(value: str) -> str:
@@ -16,19 +19,165 @@ def none_to_empty_string(value: str) -> str:
         return value
 
 
+def create_missing(model: Any, ids: Iterable[str]) -> List[str]:
+    """
+    Like get_or_create for many objects at once which are only identified by
+    their primary key
+    :param model: the model class
+    :param ids: the primary keys, can contain duplicates
+    :return: the primary keys without duplicates in the order of their first
+    occurrence
+    """
+    unique = []  # type: List[str]
+    for id in ids:
+        if id not in unique:
+            unique.append(id)
+    existing = set(model.objects.filter(pk__in=unique)
+                   .values_list('pk', flat=True))
+    missing = [model(pk=id) for id in unique if id not in existing]
+    if missing:
+        model.objects.bulk_create(missing)
+    return unique
+
+
+def create_all(model: Any, objs: List[Any]) -> List[Any]:
+    """
+    Inserts objects in one query if the database returns the ids of bulk
+    inserted rows, otherwise one by one since the ids are needed to relate
+    the objects
+    :param model: the model class
+    :param objs: the unsaved objects
+    :return: the saved objects
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    for obj in objs:
+        obj.save()
+    return objs
+
+
+def update_relations(manager: Any, ids: Iterable[str]) -> bool:
+    """
+    Relates exactly the given objects, only the rows which differ are removed
+    or added
+    :param manager: the many to many manager, e.g. release.licenses
+    :param ids: the primary keys of the related objects
+    :return: True if a relation was added or removed
+    """
+    current = set(manager.values_list('pk', flat=True))
+    stale = current - set(ids)
+    missing = []  # type: List[str]
+    for id in ids:
+        if id not in current and id not in missing:
+            missing.append(id)
+    if stale:
+        manager.remove(*stale)
+    if missing:
+        manager.add(*missing)
+    return bool(stale or missing)
+
+
+def diff_rows(current: Iterable[Any], values: Sequence[Tuple[Any, ...]],
+              get_values: Callable[[Any], Tuple[Any, ...]]
+              ) -> Tuple[List[Any], List[Tuple[Any, ...]]]:
+    """
+    Compares stored rows with the imported values
+    :param current: the stored objects
+    :param values: the imported values of each row, can contain duplicates
+    :param get_values: returns the values of a stored object in the same
+    form as the imported values
+    :return: the stored objects which are not imported anymore and the
+    values which are not stored yet
+    """
+    missing = list(values)
+    stale = []  # type: List[Any]
+    for obj in current:
+        obj_values = get_values(obj)
+        if obj_values in missing:
+            missing.remove(obj_values)
+        else:
+            stale.append(obj)
+    return stale, missing
+
+
+class ImportSummary:
+    """
+    Changes which an import wrote to the database. Nothing is written for
+    unchanged values so importing the same data again results in an empty
+    summary
+    """
+
+    def __init__(self, created: bool = False) -> None:
+        self.created = created
+        self.changes = OrderedDict()  # type: Dict[str, Any]
+
+    def add(self, key: str, changes: Any) -> None:
+        """
+        :param key: the imported field
+        :param changes: the result of the field's importer, either a bool or
+        the summary of a nested importer
+        """
+        if changes:
+            self.changes[key] = changes
+
+    def __bool__(self) -> bool:
+        return self.created or bool(self.changes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: whether the object was created, the changed fields and the
+        summaries of the nested objects
+        """
+        result = {
+            'created': self.created,
+            'changed': list(self.changes),
+        }  # type: Dict[str, Any]
+        for key, changes in self.changes.items():
+            if isinstance(changes, ImportSummary):
+                result[key] = changes.as_dict()
+        return result
+
+
 class Importer:
+    # importers which write relations need the object to be saved first
+    # whereas all others only set attributes which are saved at once
+    needs_saved_object = True
+
     def __init__(self, importers: Dict[str, 'Importer'],
                  ignored_fields: Set[str]) -> None:
         self.importers = importers
         self.ignored_fields = ignored_fields
 
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
+    def import_data(self, key: str, value: Any, obj: Any) -> Any:
+        """
+        Objects are only saved if they are new or if one of their attributes
+        changed
+        :return: the summary of the changes
+        """
         obj = self._get_object(key, value, obj)
         value, obj = self._before_import(key, value, obj)
+        summary = ImportSummary(obj.pk is None)
+        relations = []
         for key, val in value.items():
             if key not in self.ignored_fields:
-                self.importers[key].import_data(key, val, obj)
-        obj.save()
+                importer = self.importers[key]
+                if importer.needs_saved_object and obj.pk is None:
+                    relations.append((importer, key, val))
+                else:
+                    summary.add(key, importer.import_data(key, val, obj))
+        if self._before_save(obj, summary):
+            obj.save()
+        for importer, key, val in relations:
+            summary.add(key, importer.import_data(key, val, obj))
+        return summary
+
+    def _before_save(self, obj: Any, summary: ImportSummary) -> bool:
+        """
+        Changed relations save the object as well so its modification date
+        and the generations of the documents which include it are updated
+        :return: True if the object needs to be saved
+        """
+        return bool(summary)
 
     def _get_object(self, key: str, value: Any, obj: Any) -> Any:
         raise NotImplementedError
@@ -44,118 +193,205 @@ class ScalarImporter(Importer):
 
 
 class PhpExtensionImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        for ext in value:
-            version_spec = to_spec(ext['php_extension']['min_version'],
-                                   ext['php_extension']['max_version'])
-            raw_version_spec = to_raw_spec(
-                ext['php_extension']['raw_min_version'],
-                ext['php_extension']['raw_max_version'])
-            extension, created = PhpExtension.objects.get_or_create(
-                id=ext['php_extension']['id'])
-            PhpExtensionDependency.objects.create(
-                version_spec=version_spec,
-                raw_version_spec=raw_version_spec,
-                app_release=obj, php_extension=extension,
-            )
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        ids = [ext['php_extension']['id'] for ext in value]
+        create_missing(PhpExtension, ids)
+        rows = [(
+            ext['php_extension']['id'],
+            to_spec(ext['php_extension']['min_version'],
+                    ext['php_extension']['max_version']),
+            to_raw_spec(ext['php_extension']['raw_min_version'],
+                        ext['php_extension']['raw_max_version'])
+        ) for ext in value]
+        current = PhpExtensionDependency.objects.filter(app_release=obj)
+        stale, missing = diff_rows(current, rows, lambda dep: (
+            dep.php_extension_id, dep.version_spec, dep.raw_version_spec
+        ))
+        if stale:
+            current.filter(pk__in=[dep.pk for dep in stale]).delete()
+        if missing:
+            PhpExtensionDependency.objects.bulk_create([
+                PhpExtensionDependency(
+                    app_release=obj, php_extension_id=id,
+                    version_spec=version_spec,
+                    raw_version_spec=raw_version_spec,
+                    version_min_key=spec_keys(version_spec)[0],
+                    version_max_key=spec_keys(version_spec)[1],
+                ) for id, version_spec, raw_version_spec in missing
+            ])
+        return bool(stale or missing)
 
 
 class DatabaseImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        for db in value:
-            version_spec = to_spec(db['database']['min_version'],
-                                   db['database']['max_version'])
-            raw_version_spec = to_raw_spec(db['database']['raw_min_version'],
-                                           db['database']['raw_max_version'])
-            # all dbs should be known already
-            database = Database.objects.get(id=db['database']['id'])
-            DatabaseDependency.objects.create(
-                version_spec=version_spec,
-                raw_version_spec=raw_version_spec,
-                app_release=obj, database=database,
-            )
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        # all dbs should be known already
+        ids = [db['database']['id'] for db in value]
+        databases = Database.objects.in_bulk(ids)
+        for id in ids:
+            if id not in databases:
+                raise Database.DoesNotExist('Database %s does not exist' % id)
+        rows = [(
+            db['database']['id'],
+            to_spec(db['database']['min_version'],
+                    db['database']['max_version']),
+            to_raw_spec(db['database']['raw_min_version'],
+                        db['database']['raw_max_version'])
+        ) for db in value]
+        current = DatabaseDependency.objects.filter(app_release=obj)
+        stale, missing = diff_rows(current, rows, lambda dep: (
+            dep.database_id, dep.version_spec, dep.raw_version_spec
+        ))
+        if stale:
+            current.filter(pk__in=[dep.pk for dep in stale]).delete()
+        if missing:
+            DatabaseDependency.objects.bulk_create([
+                DatabaseDependency(
+                    app_release=obj, database_id=id,
+                    version_spec=version_spec,
+                    raw_version_spec=raw_version_spec,
+                    version_min_key=spec_keys(version_spec)[0],
+                    version_max_key=spec_keys(version_spec)[1],
+                ) for id, version_spec, raw_version_spec in missing
+            ])
+        return bool(stale or missing)
 
 
 class LicenseImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        def map_models(data: Dict) -> License:
-            id = data['license']['id']
-            model, created = License.objects.get_or_create(id=id)
-            return model
-
-        obj.licenses.set(list(map(map_models, value)))
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        ids = [data['license']['id'] for data in value]
+        return update_relations(obj.licenses, create_missing(License, ids))
 
 
 class ShellCommandImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        def map_commands(data: Dict) -> ShellCommand:
-            name = data['shell_command']['name']
-            command, created = ShellCommand.objects.get_or_create(name=name)
-            return command
-
-        obj.shell_commands.set(list(map(map_commands, value)))
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        names = [data['shell_command']['name'] for data in value]
+        return update_relations(obj.shell_commands,
+                                create_missing(ShellCommand, names))
 
 
 class AuthorImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        def map_authors(data: Dict) -> AppAuthor:
-            author = data['author']
-            return AppAuthor.objects.create(
-                name=author['name'],
-                mail=none_to_empty_string(author['mail']),
-                homepage=none_to_empty_string(author['homepage'])
-            )
-
-        obj.authors.set(list(map(map_authors, value)))
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        rows = [(
+            data['author']['name'],
+            none_to_empty_string(data['author']['mail']),
+            none_to_empty_string(data['author']['homepage'])
+        ) for data in value]
+        current = list(obj.authors.order_by('pk'))
+        # authors are listed in the order in which they were created
+        if rows == [(author.name, author.mail, author.homepage)
+                    for author in current]:
+            return False
+        obj.authors.all().delete()
+        authors = [AppAuthor(name=name, mail=mail, homepage=homepage)
+                   for name, mail, homepage in rows]
+        obj.authors.add(*create_all(AppAuthor, authors))
+        return True
+
+
+def set_changed(obj: Any, key: str, value: Any) -> bool:
+    """
+    Sets an attribute unless it already has the value
+    :return: True if the attribute was changed
+    """
+    if getattr(obj, key) == value:
+        return False
+    setattr(obj, key, value)
+    return True
 
 
 class DefaultAttributeImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        setattr(obj, key, value)
+    needs_saved_object = False
+
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        return set_changed(obj, key, value)
 
 
 class StringAttributeImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        setattr(obj, key, none_to_empty_string(value))
+    needs_saved_object = False
+
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        return set_changed(obj, key, none_to_empty_string(value))
 
 
 class MinVersionImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        setattr(obj, key, value)
+    needs_saved_object = False
+
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        return set_changed(obj, key, value)
 
 
 class MaxVersionImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        setattr(obj, key, value)
+    needs_saved_object = False
 
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        return set_changed(obj, key, value)
 
-class ScreenshotsImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        def create_screenshot(img: Dict[str, str]) -> Screenshot:
-            return Screenshot.objects.create(
-                url=img['url'], app=obj, ordering=img['ordering'],
-                small_thumbnail=none_to_empty_string(img['small_thumbnail']))
 
-        shots = map(lambda val: create_screenshot(val['screenshot']), value)
-        obj.screenshots.set(list(shots))
+class ScreenshotsImporter(ScalarImporter):
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        rows = [(
+            val['screenshot']['url'],
+            val['screenshot']['ordering'],
+            none_to_empty_string(val['screenshot']['small_thumbnail'])
+        ) for val in value]
+        current = obj.screenshots.all()
+        stale, missing = diff_rows(current, rows, lambda shot: (
+            shot.url, shot.ordering, shot.small_thumbnail
+        ))
+        if stale:
+            current.filter(pk__in=[shot.pk for shot in stale]).delete()
+        if missing:
+            Screenshot.objects.bulk_create([
+                Screenshot(url=url, app=obj, ordering=ordering,
+                           small_thumbnail=small_thumbnail)
+                for url, ordering, small_thumbnail in missing
+            ])
+        return bool(stale or missing)
 
 
 class CategoryImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
-        def map_categories(cat: Dict) -> Category:
-            id = cat['category']['id']
-            category, created = Category.objects.get_or_create(id=id)
-            return category
-
-        obj.categories.set(list(map(map_categories, value)))
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        ids = [cat['category']['id'] for cat in value]
+        existing = Category.objects.in_bulk(ids)
+        for id in ids:
+            if id not in existing:
+                # saved one by one so the category caches are invalidated
+                existing[id], _ = Category.objects.get_or_create(id=id)
+        return update_relations(obj.categories, ids)
 
 
 class L10NImporter(ScalarImporter):
-    def import_data(self, key: str, value: Any, obj: Any) -> None:
+    """
+    Sets the changed translations which are saved together with the object
+    """
+    needs_saved_object = False
+
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        changed = False
         for lang, translation in value.items():
+            # compare without falling back to another language
+            if obj.has_translation(lang) and \
+                    getattr(obj.get_translation(lang), key) == translation:
+                continue
             obj.set_current_language(lang)
             setattr(obj, key, translation)
-            obj.save()
+            changed = True
+        return changed
+
+
+class LanguagesImporter(ScalarImporter):
+    """
+    Deletes the translations of languages which are not imported anymore
+    """
+    needs_saved_object = False
+
+    def import_data(self, key: str, value: Any, obj: Any) -> bool:
+        if obj.pk is None:
+            return False
+        stale = set(obj.get_available_languages()) - set(value)
+        for lang in stale:
+            obj.delete_translation(lang)
+        return bool(stale)
 
 
 class AppReleaseImporter(Importer):
@@ -206,18 +442,15 @@ class AppReleaseImporter(Importer):
         value['raw_php_version_spec'] = to_raw_spec(
             value['raw_php_min_version'],
             value['raw_php_max_version'])
-        obj.licenses.clear()
-        obj.shell_commands.clear()
-        obj.licenses.clear()
-        obj.php_extensions.clear()
-        obj.databases.clear()
         return value, obj
 
     def _get_object(self, key: str, value: Any, obj: Any) -> Any:
-        release, created = AppRelease.objects.get_or_create(
-            version=value['version'], app=obj, is_nightly=value['is_nightly']
-        )
-        return release
+        try:
+            return AppRelease.objects.get(version=value['version'], app=obj,
+                                          is_nightly=value['is_nightly'])
+        except AppRelease.DoesNotExist:
+            return AppRelease(version=value['version'], app=obj,
+                              is_nightly=value['is_nightly'])
 
 
 class AppImporter(Importer):
@@ -227,7 +460,8 @@ class AppImporter(Importer):
                  l10n_importer: L10NImporter,
                  category_importer: CategoryImporter,
                  author_importer: AuthorImporter,
-                 default_attribute_importer: DefaultAttributeImporter) -> None:
+                 default_attribute_importer: DefaultAttributeImporter,
+                 languages_importer: LanguagesImporter) -> None:
         super().__init__({
             'release': release_importer,
             'screenshots': screenshots_importer,
@@ -243,6 +477,7 @@ class AppImporter(Importer):
             'categories': category_importer,
             'authors': author_importer,
             'ocsid': default_attribute_importer,
+            'languages': languages_importer,
         }, {'id'})
 
     def _get_object(self, key: str, value: Any, obj: Any) -> Any:
@@ -252,26 +487,29 @@ class AppImporter(Importer):
 
     def _before_import(self, key: str, value: Any, obj: Any) -> Tuple[Any,
                                                                       Any]:
-        obj.last_release = timezone.now()
-
         if 'is_nightly' not in value['release']:
             value['release']['is_nightly'] = False
         if value['release']['is_nightly']:
-            AppRelease.objects.filter(app__id=obj.id, is_nightly=True).delete()
+            # the same nightly is updated instead
+            AppRelease.objects.filter(app__id=obj.id, is_nightly=True) \
+                .exclude(version=value['release']['version']).delete()
 
         # only new releases update an app's data
         if self._should_update_everything(value):
-            # clear all relations
-            obj.screenshots.all().delete()
-            obj.authors.all().delete()
-            obj.categories.clear()
-            for translation in obj.translations.all():
-                translation.delete()
+            if 'name' in value:
+                # all translated fields contain the same languages
+                value['languages'] = list(value['name'])
         else:
             value = {'id': value['id'], 'release': value['release']}
 
         return value, obj
 
+    def _before_save(self, obj: Any, summary: ImportSummary) -> bool:
+        if 'release' in summary.changes:
+            obj.last_release = timezone.now()
+            return True
+        return super()._before_save(obj, summary)
+
     def _should_update_everything(self, value: Any) -> bool:
         releases = AppRelease.objects.filter(app__id=value['id'])
 
@@ -284,13 +522,13 @@ class AppImporter(Importer):
 
         # we do not care about nightlies here so it's fine to just use a
         # normal semver
-        uploaded_version = Version(current_version)
+        uploaded_version = parse_version(current_version)
         is_prerelease = '-' in current_version
         is_nightly = value['release']['is_nightly']
         is_stable = not is_prerelease and not is_nightly
 
         def is_newer_version(release: Any) -> bool:
-            return uploaded_version >= Version(release.version)
+            return uploaded_version >= parse_version(release.version)
 
         # the main page should only be updated when stable and new releases
         # are uploaded
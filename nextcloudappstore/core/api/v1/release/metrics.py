@@ -0,0 +1,262 @@
+"""
+Per stage metrics of release uploads. The duration, the number of processed
+bytes and the number of database queries of every stage are sent in the
+Server-Timing header of the upload, logged as JSON and added to histograms
+in the cache which are served by the upload metrics API route.
+
+Histograms are plain cache counters so all processes which share the cache
+add to the same histograms. Durations are counted in microseconds since not
+every cache backend can increment floats.
+"""
+import json
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# stages of an upload in the order in which they are run
+DOWNLOAD_STAGE = 'download'
+STORE_STAGE = 'store'
+EXTRACT_STAGE = 'extract'
+PARSE_STAGE = 'parse'
+PERMISSION_STAGE = 'permission'
+VALIDATION_STAGE = 'validation'
+IMPORT_STAGE = 'import'
+STAGES = (DOWNLOAD_STAGE, STORE_STAGE, EXTRACT_STAGE, PARSE_STAGE,
+          PERMISSION_STAGE, VALIDATION_STAGE, IMPORT_STAGE)
+# histogram of the complete upload
+TOTAL = 'total'
+
+# upper bounds of the histogram buckets in seconds, the last bucket counts
+# everything which is slower
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def metric_key(stage: str, name: str) -> str:
+    return 'upload_metrics:%s:%s' % (stage, name)
+
+
+def bucket_name(index: int) -> str:
+    return 'bucket%i' % index
+
+
+# counters of every histogram
+COUNTERS = ('count', 'duration', 'bytes', 'queries') + tuple(
+    bucket_name(i) for i in range(len(DURATION_BUCKETS) + 1))
+
+
+class StageMetrics:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.duration = 0.0  # seconds
+        self.bytes = 0
+        self.queries = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'duration': round(self.duration, 6),
+            'bytes': self.bytes,
+            'queries': self.queries,
+        }
+
+
+class CountingCursor:
+    """Cursor which counts the executed statements"""
+
+    def __init__(self, cursor: Any, counter: 'QueryCounter') -> None:
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.cursor, attr)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.cursor)
+
+    def __enter__(self) -> 'CountingCursor':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.cursor.__exit__(*args)
+
+    def execute(self, sql: str, params: Any = None) -> Any:
+        self.counter.count += 1
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql: str, param_list: Any) -> Any:
+        self.counter.count += 1
+        return self.cursor.executemany(sql, param_list)
+
+
+class QueryCounter:
+    """
+    Counts the queries of the current thread's default database connection.
+    Unlike the debug cursor it does not keep the executed statements
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.db = connections[DEFAULT_DB_ALIAS]
+        self.replaced = None  # type: Any
+
+    def __enter__(self) -> 'QueryCounter':
+        # cursor() can already be replaced on the instance, e.g. by an outer
+        # counter, so that replacement is restored afterwards
+        self.replaced = vars(self.db).get('cursor')
+        cursor = self.db.cursor
+
+        def counting_cursor() -> CountingCursor:
+            return CountingCursor(cursor(), self)
+
+        self.db.cursor = counting_cursor
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self.replaced is None:
+            del self.db.cursor
+        else:
+            self.db.cursor = self.replaced
+
+
+class UploadMetrics:
+    """
+    Metrics of the stages of one upload. A stage which is measured more than
+    once, e.g. the download of an archive whose stored metadata was evicted,
+    adds up
+    """
+
+    def __init__(self) -> None:
+        self.stages = OrderedDict()  # type: Dict[str, StageMetrics]
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[StageMetrics]:
+        """
+        Measures the duration and the database queries of the block, the
+        block can add the number of bytes it processed
+        :param stage: the stage name
+        :return: the metrics of the stage
+        """
+        if stage not in self.stages:
+            self.stages[stage] = StageMetrics(stage)
+        metrics = self.stages[stage]
+        with QueryCounter() as queries:
+            start = perf_counter()
+            try:
+                yield metrics
+            finally:
+                metrics.duration += perf_counter() - start
+        metrics.queries += queries.count
+
+    @property
+    def duration(self) -> float:
+        return sum(stage.duration for stage in self.stages.values())
+
+    def server_timing(self) -> str:
+        """
+        :return: the value of the Server-Timing header
+        """
+        return ', '.join('%s;dur=%.1f;desc="%i bytes, %i queries"' % (
+            stage.name, stage.duration * 1000, stage.bytes, stage.queries)
+            for stage in self.stages.values())
+
+    def record(self, url: str, status: int, app_id: str = '',
+               version: str = '') -> None:
+        """
+        Logs the metrics and adds them to the histograms. Uploads which took
+        longer than RELEASE_UPLOAD_SLOW_DURATION are logged as warnings
+        :param url: the download url of the release
+        :param status: the response status of the upload
+        :param app_id: the app id of the release if it is known
+        :param version: the version of the release if it is known
+        """
+        duration = self.duration
+        message = json.dumps({
+            'download': url,
+            'status': status,
+            'app_id': app_id,
+            'version': version,
+            'duration': round(duration, 6),
+            'stages': [stage.as_dict() for stage in self.stages.values()],
+        })
+        if duration >= settings.RELEASE_UPLOAD_SLOW_DURATION:
+            logger.warning('Slow release upload %s', message)
+        else:
+            logger.info('Release upload %s', message)
+
+        for stage in self.stages.values():
+            add_to_histogram(stage.name, stage.duration, stage.bytes,
+                             stage.queries)
+        add_to_histogram(TOTAL, duration, sum(
+            stage.bytes for stage in self.stages.values()), sum(
+            stage.queries for stage in self.stages.values()))
+
+
+def _increment(key: str, delta: int) -> None:
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # evicted in the meantime
+            cache.set(key, delta, None)
+
+
+def add_to_histogram(stage: str, duration: float, size: int,
+                     queries: int) -> None:
+    """
+    :param stage: the stage name
+    :param duration: the duration of the stage in seconds
+    :param size: the number of processed bytes
+    :param queries: the number of database queries
+    """
+    index = len(DURATION_BUCKETS)
+    for i, bound in enumerate(DURATION_BUCKETS):
+        if duration <= bound:
+            index = i
+            break
+    _increment(metric_key(stage, bucket_name(index)), 1)
+    _increment(metric_key(stage, 'count'), 1)
+    _increment(metric_key(stage, 'duration'), int(duration * 10 ** 6))
+    _increment(metric_key(stage, 'bytes'), size)
+    _increment(metric_key(stage, 'queries'), queries)
+
+
+def get_histograms() -> List[Dict[str, Any]]:
+    """
+    :return: the histogram of every stage and of complete uploads, bucket
+    counts are cumulative and include all faster uploads
+    """
+    stages = STAGES + (TOTAL,)
+    values = cache.get_many([metric_key(stage, name)
+                             for stage in stages for name in COUNTERS])
+    result = []
+    for stage in stages:
+        def get(name: str) -> int:
+            return values.get(metric_key(stage, name), 0)
+
+        buckets = []
+        count = 0
+        for i, bound in enumerate(DURATION_BUCKETS + (None,)):
+            count += get(bucket_name(i))
+            buckets.append({'le': bound, 'count': count})
+        result.append({
+            'name': stage,
+            'count': get('count'),
+            'duration': get('duration') / 10 ** 6,
+            'bytes': get('bytes'),
+            'queries': get('queries'),
+            'buckets': buckets,
+        })
+    return result
+
+
+def reset_histograms() -> None:
+    cache.delete_many([metric_key(stage, name)
+                       for stage in STAGES + (TOTAL,) for name in COUNTERS])
@@ -1,6 +1,6 @@
 import re
 import tarfile  # type: ignore
-from functools import reduce
+import threading
 
 import lxml.etree  # type: ignore
 from typing import Dict, Any, Tuple, List, Set
@@ -8,6 +8,8 @@ from typing import Dict, Any, Tuple, List, Set
 from semantic_version import Version
 
 from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.streams import read_bounded, \
+    SizeLimitExceededException
 from nextcloudappstore.core.versioning import pad_max_version, \
     pad_min_version, raw_version
 from rest_framework.exceptions import ParseError, \
@@ -67,31 +69,60 @@ class GunZipAppMetadataExtractor:
         return result
 
     def _parse_archive(self, tar: Any) -> Metadata:
-        app_id = self._find_app_id(tar)
-        info = self._get_contents('%s/appinfo/info.xml' % app_id, tar)
+        members = self._index_members(tar)
+        app_id = self._find_app_id(members)
+        info = self._get_contents('%s/appinfo/info.xml' % app_id, tar,
+                                  members)
         changelog = {}  # type: Dict[str, str]
         changelog['en'] = self._get_contents('%s/CHANGELOG.md' % app_id, tar,
-                                             '')
-        for code, _ in self.config.languages:
-            trans_changelog = self._get_contents(
-                '%s/CHANGELOG.%s.md' % (app_id, code), tar, ''
-            )
+                                             members, '')
+        for code, path in self._find_changelogs(app_id, members).items():
+            trans_changelog = self._get_contents(path, tar, members, '')
             if trans_changelog:
                 changelog[code] = trans_changelog
 
         return info, app_id, changelog
 
-    def _get_contents(self, path: str, tar: Any, default: Any = None) -> str:
+    def _index_members(self, tar: Any) -> Dict[str, Any]:
+        """
+        Builds an index of all members in one pass over the archive. If a
+        path occurs more than once the last member wins like in
+        TarFile.getmember
+        :param tar: the tar file
+        :return: the members by path
+        """
+        return {member.name: member for member in tar.getmembers()}
+
+    def _find_changelogs(self, app_id: str,
+                         members: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Finds the translated changelogs of the configured languages
+        :param app_id: the app id
+        :param members: the member index
+        :return: the changelog paths by language code
+        """
+        codes = {code for code, _ in self.config.languages}
+        regex = re.compile(r'^%s/CHANGELOG\.([^/]+)\.md$' % re.escape(app_id))
+        result = {}  # type: Dict[str, str]
+        for path in members:
+            match = regex.match(path)
+            if match and match.group(1) in codes:
+                result[match.group(1)] = path
+        return result
+
+    def _get_contents(self, path: str, tar: Any, members: Dict[str, Any],
+                      default: Any = None) -> str:
         """
         Reads the contents of a file
         :param path: the path to the target file
         :param tar: the tar file
+        :param members: the member index
         :param default: default if file is not found in the directory
         :raises InvalidAppPackageStructureException: if the path does not exist
          and the default is None
         :return: the contents of the file if found or the default
         """
-        member = self._find_member(path, tar)
+        member = self._find_member(path, members)
         if member is None:
             if default is None:
                 msg = 'Path %s does not exist in package' % path
@@ -101,58 +132,34 @@ class GunZipAppMetadataExtractor:
         file = tar.extractfile(member)
         return self._stream_read_file(file, self.config.max_info_size)
 
-    def _find_member(self, path: str, tar: Any) -> Any:
+    def _find_member(self, path: str, members: Dict[str, Any]) -> Any:
         """
         Validates that the path to the target member and the member itself
         is not a symlink to prevent abitrary file inclusion, then returns
         the member in question
-        :param info_member: the target member to check
-        :param tar: tge tar file
+        :param path: the path of the target member
+        :param members: the member index
         :raises InvalidAppPackageStructureException: if links are found
         :return: the member if found, otherwise None
         """
-
-        def build_paths(prev: List[str], curr: str) -> List[str]:
-            """Builds a List of paths to the target from a list of path
-            fragments, e.g.: ['a', 'a/path'], 'tofile' is being turned into
-            ['a', 'a/path', 'a/path/tofile']
-            :param prev: the previous result list
-            :param curr: the current result
-            :return: the previous list with the new result which was
-            constructed from the last element and the current element
-            """
-            if len(prev) > 0:
-                return prev + ['%s/%s' % (prev[-1], curr)]
-            else:
-                return [curr]
-
-        def check_member(path: str) -> Any:
-            """Tries to get a member for a path or None if not found"""
-            try:
-                return tar.getmember(path)
-            except KeyError:
-                return None
-
-        default = []  # type: List[str]
-        member_paths = reduce(build_paths, path.split('/'), default)
-        checked_members = [check_member(m) for m in member_paths]
-
-        for member in filter(lambda m: m is not None, checked_members):
-            if member.issym() or member.islnk():
+        parts = path.split('/')
+        for i in range(1, len(parts) + 1):
+            member = members.get('/'.join(parts[:i]))
+            if member is not None and (member.issym() or member.islnk()):
                 msg = 'Symlinks and hard links can not be used for %s' % \
                       member
                 raise ForbiddenLinkException(msg)
-        return check_member(path)
+        return members.get(path)
 
-    def _find_app_id(self, tar: Any) -> str:
+    def _find_app_id(self, members: Dict[str, Any]) -> str:
         """
         Finds and returns the app id by looking at the first level folder
         :raises InvalidAppPackageStructureException: if there is no valid or
          to many app folders
-        :param tar: the archive
+        :param members: the member index
         :return: the app id
         """
-        folders = self._find_app_folders(tar.getnames())
+        folders = self._find_app_folders(list(members))
         if len(folders) > 1:
             msg = 'More than one possible app folder found'
             raise InvalidAppPackageStructureException(msg)
@@ -182,22 +189,11 @@ class GunZipAppMetadataExtractor:
         :raises MaxSizeAppMetadataXmlException if the maximum size was reached
         :return: the parsed info.xml
         """
-        # FIXME: If someone finds a less ugly version, please feel free to
-        #        improve it
-        size = 0
-        result = b''
-        while True:
-            size += 1024
-            if size > max_info_size:
-                msg = 'info.xml was bigger than allowed %i bytes' % \
-                      max_info_size
-                raise MaxSizeAppMetadataXmlException(msg)
-
-            chunk = info_file.read(1024)
-            if not chunk:
-                break
-            result += chunk
-
+        try:
+            result = read_bounded(info_file, max_info_size)
+        except SizeLimitExceededException:
+            msg = 'info.xml was bigger than allowed %i bytes' % max_info_size
+            raise MaxSizeAppMetadataXmlException(msg)
         return result.decode('utf-8')
 
 
@@ -227,6 +223,103 @@ def element_to_dict(element: Any) -> Dict:
         return {key: element.text}
 
 
+def create_xml_parser() -> Any:
+    return lxml.etree.XMLParser(  # type: ignore
+        resolve_entities=False, no_network=True,  # type: ignore
+        remove_comments=True, load_dtd=False,  # type: ignore
+        remove_blank_text=True, dtd_validation=False  # type: ignore
+    )  # type: ignore
+
+
+class CompiledMetadataPipeline:
+    """
+    The info.xml schema and transformations compiled once and reused for
+    every upload. lxml parsers, schemas and XSLTs must not be used by more
+    than one thread at a time, so every thread compiles its own copy on
+    first use
+    """
+
+    def __init__(self, schema: str, pre_xslt: str, xslt: str) -> None:
+        """
+        :argument schema the schema xml as string
+        :argument pre_xslt xslt which is run before validation to ensure that
+        everything is in the correct order and that unknown elements are
+        excluded
+        :argument xslt the xslt to transform it to a matching structure
+        """
+        self.schema = schema
+        self.pre_xslt = pre_xslt
+        self.xslt = xslt
+        self._local = threading.local()
+
+    def warm_up(self) -> None:
+        """Compiles the schema and transformations for the current thread"""
+        self._get_compiled()
+
+    def _get_compiled(self) -> Tuple[Any, Any, Any, Any]:
+        compiled = getattr(self._local, 'compiled', None)
+        if compiled is None:
+            parser = create_xml_parser()
+            pre_transform = lxml.etree.XSLT(  # type: ignore
+                lxml.etree.XML(self.pre_xslt))  # type: ignore
+            schema_doc = lxml.etree.fromstring(
+                bytes(self.schema, encoding='utf-8'), parser)
+            schema = lxml.etree.XMLSchema(schema_doc)  # type: ignore
+            transform = lxml.etree.XSLT(  # type: ignore
+                lxml.etree.XML(self.xslt))  # type: ignore
+            compiled = (parser, pre_transform, schema, transform)
+            self._local.compiled = compiled
+        return compiled
+
+    def parse(self, xml: str) -> Dict:
+        """
+        Parses, validates and maps the xml onto a dict
+        :argument xml the info.xml string to parse
+        :raises InvalidAppMetadataXmlException if the schema does not validate
+        :return the parsed xml as dict
+        """
+        parser, pre_transform, schema, transform = self._get_compiled()
+        try:
+            doc = lxml.etree.fromstring(bytes(xml, encoding='utf-8'), parser)
+        except lxml.etree.XMLSyntaxError as e:
+            msg = 'info.xml contains malformed xml: %s' % e
+            raise XMLSyntaxError(msg)
+        for _ in doc.iter(lxml.etree.Entity):  # type: ignore
+            raise InvalidAppMetadataXmlException('Must not contain entities')
+        pre_transformed_doc = pre_transform(doc)
+        try:
+            schema.assertValid(pre_transformed_doc)  # type: ignore
+        except lxml.etree.DocumentInvalid as e:
+            msg = 'info.xml did not validate: %s' % e
+            raise InvalidAppMetadataXmlException(msg)
+        transformed_doc = transform(pre_transformed_doc)  # type: ignore
+        mapped = element_to_dict(transformed_doc.getroot())  # type: ignore
+        validate_english_present(mapped)
+        validate_pre_11(mapped, doc)
+        fix_partial_translations(mapped)
+        return mapped
+
+
+_pipelines = {}  # type: Dict[Tuple[str, str, str], CompiledMetadataPipeline]
+_pipelines_lock = threading.Lock()
+
+
+def get_metadata_pipeline(schema: str, pre_xslt: str,
+                          xslt: str) -> CompiledMetadataPipeline:
+    """
+    Returns the process wide pipeline for the schema and transformations
+    :argument schema the schema xml as string
+    :argument pre_xslt xslt which is run before validation
+    :argument xslt the xslt to transform it to a matching structure
+    :return the pipeline
+    """
+    key = (schema, pre_xslt, xslt)
+    with _pipelines_lock:
+        if key not in _pipelines:
+            _pipelines[key] = CompiledMetadataPipeline(schema, pre_xslt, xslt)
+        return _pipelines[key]
+
+
 def parse_app_metadata(xml: str, schema: str, pre_xslt: str,
                        xslt: str) -> Dict:
     """
@@ -239,34 +332,7 @@ def parse_app_metadata(xml: str, schema: str, pre_xslt: str,
     :raises InvalidAppMetadataXmlException if the schema does not validate
     :return the parsed xml as dict
     """
-    parser = lxml.etree.XMLParser(  # type: ignore
-        resolve_entities=False, no_network=True,  # type: ignore
-        remove_comments=True, load_dtd=False,  # type: ignore
-        remove_blank_text=True, dtd_validation=False  # type: ignore
-    )  # type: ignore
-    try:
-        doc = lxml.etree.fromstring(bytes(xml, encoding='utf-8'), parser)
-    except lxml.etree.XMLSyntaxError as e:
-        msg = 'info.xml contains malformed xml: %s' % e
-        raise XMLSyntaxError(msg)
-    for _ in doc.iter(lxml.etree.Entity):  # type: ignore
-        raise InvalidAppMetadataXmlException('Must not contain entities')
-    pre_transform = lxml.etree.XSLT(lxml.etree.XML(pre_xslt))  # type: ignore
-    pre_transformed_doc = pre_transform(doc)
-    schema_doc = lxml.etree.fromstring(bytes(schema, encoding='utf-8'), parser)
-    schema = lxml.etree.XMLSchema(schema_doc)  # type: ignore
-    try:
-        schema.assertValid(pre_transformed_doc)  # type: ignore
-    except lxml.etree.DocumentInvalid as e:
-        msg = 'info.xml did not validate: %s' % e
-        raise InvalidAppMetadataXmlException(msg)
-    transform = lxml.etree.XSLT(lxml.etree.XML(xslt))  # type: ignore
-    transformed_doc = transform(pre_transformed_doc)  # type: ignore
-    mapped = element_to_dict(transformed_doc.getroot())  # type: ignore
-    validate_english_present(mapped)
-    validate_pre_11(mapped, doc)
-    fix_partial_translations(mapped)
-    return mapped
+    return get_metadata_pipeline(schema, pre_xslt, xslt).parse(xml)
 
 
 def validate_pre_11(info: Dict, doc: Any) -> None:
@@ -1,9 +1,15 @@
+import os
+
 from nextcloudappstore.core.api.v1.release import ReleaseConfig
 from nextcloudappstore.core.api.v1.release.downloader import \
-    AppReleaseDownloader
+    AppReleaseDownloader, DownloadValidators, ReleaseDownload
+from nextcloudappstore.core.api.v1.release.metrics import UploadMetrics, \
+    DOWNLOAD_STAGE, STORE_STAGE, EXTRACT_STAGE, PARSE_STAGE
 from nextcloudappstore.core.api.v1.release.parser import \
-    GunZipAppMetadataExtractor, parse_app_metadata, parse_changelog
-from typing import Dict, Tuple
+    GunZipAppMetadataExtractor, get_metadata_pipeline, parse_changelog
+from nextcloudappstore.core.api.v1.release.store import \
+    ReleaseMetadataStore, STORE_DIGEST
+from typing import Dict, NamedTuple, Optional
 
 from rest_framework.exceptions import ValidationError
 
@@ -12,28 +18,111 @@ class InvalidAppDirectoryException(ValidationError):
     pass
 
 
-Release = Tuple[Dict, str]
+# the parsed metadata, the digests of the archive by algorithm name, the
+# download whose validators are stored once the release was validated or None
+# and whether the metadata is stored already
+Release = NamedTuple('Release', [('info', Dict), ('digests', Dict[str, bytes]),
+                                 ('download', Optional[ReleaseDownload]),
+                                 ('is_stored', bool)])
 
 
 class AppReleaseProvider:
     def __init__(self, downloader: AppReleaseDownloader,
                  extractor: GunZipAppMetadataExtractor,
-                 config: ReleaseConfig) -> None:
+                 config: ReleaseConfig, store: ReleaseMetadataStore) -> None:
         self.config = config
+        self.store = store
         self.extractor = extractor
         self.downloader = downloader
+        self.metadata = get_metadata_pipeline(config.info_schema,
+                                              config.pre_info_xslt,
+                                              config.info_xslt)
+
+    def get_release_info(self, url: str, is_nightly: bool = False,
+                         metrics: Optional[UploadMetrics] = None) -> Release:
+        """
+        Downloads the archive and parses its metadata unless the same
+        archive was parsed before. If the metadata of the previous download
+        of the url is known, the archive is only downloaded if it changed.
+        Nothing is stored until store_release_info() is called for the
+        validated release
+        :param url: the download url of the archive
+        :param is_nightly: whether the release is a nightly
+        :param metrics: the metrics of the upload to which the download,
+        store, extract and parse stages are added
+        :return: the release
+        """
+        if metrics is None:
+            metrics = UploadMetrics()
+        with metrics.measure(STORE_STAGE):
+            validators = self.store.get_validators(url, is_nightly)
+        release = self._get_release_info(url, is_nightly, validators,
+                                         metrics)
+        if release is None:
+            # the metadata was evicted after the validators were looked up
+            release = self._get_release_info(url, is_nightly, None, metrics)
+        return release
+
+    def _get_release_info(self, url: str, is_nightly: bool,
+                          validators: Optional[DownloadValidators],
+                          metrics: UploadMetrics) -> Optional[Release]:
+        """
+        :return: the release or None if the archive was not modified but
+        its metadata is not stored anymore
+        """
+        with metrics.measure(DOWNLOAD_STAGE) as stage:
+            download = self.downloader.get_archive(
+                url, self.config.download_root,
+                self.config.download_max_timeout,
+                self.config.download_max_redirects,
+                self.config.download_max_size, self.config.download_digests,
+                validators, self.config.download_chunk_size)
+            if download.is_modified:
+                stage.bytes += os.path.getsize(download.filename)
+        with download:
+            digest = download.digests[STORE_DIGEST]
+            with metrics.measure(STORE_STAGE):
+                info = self.store.get(digest, is_nightly)
+            is_stored = info is not None
+            if not is_stored:
+                if not download.is_modified:
+                    return None
+                info = self._parse_archive(download.filename, is_nightly,
+                                           metrics)
+        return Release(info, download.digests, download, is_stored)
 
-    def get_release_info(self, url: str, is_nightly: bool = False) -> Release:
-        data = None
-        with self.downloader.get_archive(
-            url, self.config.download_root, self.config.download_max_timeout,
-            self.config.download_max_redirects, self.config.download_max_size
-        ) as download:
+    def store_release_info(self, url: str, is_nightly: bool,
+                           release: Release,
+                           metrics: Optional[UploadMetrics] = None) -> None:
+        """
+        Stores the metadata and the validators of a release once its
+        signature was validated so unverified archives never end up in the
+        store. Needs to be called before the metadata is changed
+        :param url: the download url of the archive
+        :param is_nightly: whether the release is a nightly
+        :param release: the release returned by get_release_info()
+        :param metrics: the metrics of the upload to which the store stage
+        is added
+        """
+        if metrics is None:
+            metrics = UploadMetrics()
+        with metrics.measure(STORE_STAGE):
+            if not release.is_stored:
+                self.store.put(release.digests[STORE_DIGEST], is_nightly,
+                               release.info)
+            if release.download is not None:
+                self.store.put_validators(url, release.download)
+
+    def _parse_archive(self, filename: str, is_nightly: bool,
+                       metrics: UploadMetrics) -> Dict:
+        with metrics.measure(EXTRACT_STAGE) as stage:
             xml, app_id, changelog = self.extractor.extract_app_metadata(
-                download.filename)
-            info = parse_app_metadata(xml, self.config.info_schema,
-                                      self.config.pre_info_xslt,
-                                      self.config.info_xslt)
+                filename)
+            stage.bytes += len(xml.encode()) + sum(
+                len(value.encode()) for value in changelog.values())
+        with metrics.measure(PARSE_STAGE) as stage:
+            info = self.metadata.parse(xml)
+            stage.bytes += len(xml.encode())
             info_app_id = info['app']['id']
             if app_id != info_app_id:
                 msg = 'Archive app folder is %s but info.xml reports id %s' \
@@ -47,7 +136,4 @@ class AppReleaseProvider:
             for code, value in changelog.items():
                 release['changelog'][code] = parse_changelog(value, version,
                                                              is_nightly)
-
-            with open(download.filename, 'rb') as f:
-                data = f.read()
-        return info, data
+        return info
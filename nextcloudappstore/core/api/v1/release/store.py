@@ -0,0 +1,127 @@
+"""
+Content addressed store of parsed release metadata. Developers and CI
+pipelines upload the same archives over and over again so the parsed info.xml
+and changelogs are kept by the SHA-256 digest of the archive. A repeated
+upload of the same bytes only needs to verify the signature and import the
+metadata again.
+
+The HTTP validators of each download url are kept as well so an archive
+whose metadata is known is only downloaded again if it changed.
+"""
+import json
+from hashlib import sha256
+from typing import Dict, Optional
+
+from django.db.models import F
+from django.utils import timezone
+
+from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.downloader import \
+    DownloadValidators, ReleaseDownload
+from nextcloudappstore.core.models import AppReleaseMetadata, \
+    AppReleaseOrigin
+
+# the digest of the downloaded archive which identifies its metadata
+STORE_DIGEST = 'sha256'
+
+
+def parser_version(config: ReleaseConfig) -> str:
+    """
+    Metadata depends on the schema, the transformations and the languages
+    whose changelogs are extracted so a change of them invalidates it
+    :param config: the release config
+    :return: a digest of everything the parsed metadata depends on
+    """
+    version = sha256()
+    for part in (config.info_schema, config.pre_info_xslt, config.info_xslt,
+                 repr(config.languages)):
+        version.update(part.encode('utf-8'))
+        version.update(b'\0')
+    return version.hexdigest()
+
+
+class ReleaseMetadataStore:
+    def __init__(self, config: ReleaseConfig) -> None:
+        self.max_size = config.metadata_store_max_size
+        self.parser = parser_version(config)
+
+    def get(self, digest: bytes, is_nightly: bool) -> Optional[Dict]:
+        """
+        :param digest: the SHA-256 digest of the archive
+        :param is_nightly: nightlies use a different changelog
+        :return: the parsed metadata or None if the archive is unknown
+        """
+        if not self.max_size:
+            return None
+        entries = AppReleaseMetadata.objects.filter(
+            digest=digest.hex(), is_nightly=is_nightly, parser=self.parser)
+        entry = entries.only('info').first()
+        if entry is None:
+            return None
+        entries.update(hits=F('hits') + 1, last_used=timezone.now())
+        return json.loads(entry.info)
+
+    def put(self, digest: bytes, is_nightly: bool, info: Dict) -> None:
+        """
+        Stores the metadata and evicts the least recently used metadata if
+        the store is full
+        :param digest: the SHA-256 digest of the archive
+        :param is_nightly: nightlies use a different changelog
+        :param info: the parsed metadata
+        """
+        if not self.max_size:
+            return
+        data = json.dumps(info)
+        size = len(data.encode('utf-8'))
+        if size > self.max_size:
+            return
+        AppReleaseMetadata.objects.update_or_create(
+            digest=digest.hex(), is_nightly=is_nightly, parser=self.parser,
+            defaults={
+                'app_id': info['app']['id'],
+                'version': info['app']['release']['version'],
+                'info': data,
+                'size': size,
+                'last_used': timezone.now(),
+            })
+        AppReleaseMetadata.objects.prune(self.max_size)
+
+    def get_validators(self, url: str,
+                       is_nightly: bool) -> Optional[DownloadValidators]:
+        """
+        :param url: the download url
+        :param is_nightly: nightlies use a different changelog
+        :return: the validators of the previous download of the url or None
+        if the url is unknown or the metadata of its archive is not stored
+        """
+        if not self.max_size:
+            return None
+        origin = AppReleaseOrigin.objects.filter(url=url).first()
+        if origin is None or not AppReleaseMetadata.objects.filter(
+                digest=origin.digest, is_nightly=is_nightly,
+                parser=self.parser).exists():
+            return None
+        digests = {name: bytes.fromhex(digest) for name, digest
+                   in json.loads(origin.digests).items()}
+        return DownloadValidators(origin.etag, origin.last_modified, digests)
+
+    def put_validators(self, url: str, download: ReleaseDownload) -> None:
+        """
+        Remembers the validators of a download whose metadata is stored
+        :param url: the download url
+        :param download: the download
+        """
+        if not self.max_size:
+            return
+        if not download.etag and not download.last_modified:
+            AppReleaseOrigin.objects.filter(url=url).delete()
+            return
+        digests = {name: digest.hex()
+                   for name, digest in download.digests.items()}
+        AppReleaseOrigin.objects.update_or_create(url=url, defaults={
+            'etag': download.etag,
+            'last_modified': download.last_modified,
+            'digest': digests[STORE_DIGEST],
+            'digests': json.dumps(digests),
+            'last_used': timezone.now(),
+        })
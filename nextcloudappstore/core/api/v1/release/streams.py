@@ -0,0 +1,60 @@
+"""
+Size limited reading of untrusted streams like downloaded archives and
+archive members. Data beyond the limit is never read into memory.
+"""
+from io import BytesIO
+from typing import Any, Iterable, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class SizeLimitExceededException(Exception):
+    def __init__(self, max_size: int) -> None:
+        super().__init__('Stream is bigger than the allowed %i bytes'
+                         % max_size)
+        self.max_size = max_size
+
+
+def iter_bounded(chunks: Iterable[bytes], max_size: int) -> Iterator[bytes]:
+    """
+    Passes chunks through until more than max_size bytes were seen. A stream
+    of exactly max_size bytes is allowed
+    :param chunks: the chunks of the stream
+    :param max_size: maximum stream size in bytes
+    :raises SizeLimitExceededException: before the chunk which exceeds the
+    limit is yielded
+    :return: the chunks
+    """
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_size:
+            raise SizeLimitExceededException(max_size)
+        yield chunk
+
+
+def read_bounded(file: Any, max_size: int,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> bytes:
+    """
+    Reads a binary file object without reading more than max_size + 1 bytes
+    from it. Instead of concatenating bytes, which copies the result for
+    every chunk, chunks are written into a growing buffer
+    :param file: binary file object
+    :param max_size: maximum file size in bytes, a file of exactly this size
+    is allowed
+    :param chunk_size: maximum number of bytes which are read at once
+    :raises SizeLimitExceededException: if the file is bigger than max_size
+    :return: the contents
+    """
+    result = BytesIO()
+    # one byte more than allowed is enough to detect files which are too big
+    remaining = max_size + 1
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        result.write(chunk)
+        remaining -= len(chunk)
+    if remaining <= 0:
+        raise SizeLimitExceededException(max_size)
+    return result.getvalue()
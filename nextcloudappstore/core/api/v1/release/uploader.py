@@ -0,0 +1,255 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from django.conf import settings  # type: ignore
+from django.db import transaction, connection
+from requests import HTTPError
+from rest_framework.exceptions import ValidationError, PermissionDenied, \
+    APIException
+
+from nextcloudappstore.core.api.v1.release.importer import AppImporter
+from nextcloudappstore.core.api.v1.release.metrics import UploadMetrics, \
+    DOWNLOAD_STAGE, PERMISSION_STAGE, VALIDATION_STAGE, IMPORT_STAGE
+from nextcloudappstore.core.api.v1.release.provider import AppReleaseProvider
+from nextcloudappstore.core.certificate.validator import CertificateValidator
+from nextcloudappstore.core.facades import read_file_contents
+from nextcloudappstore.core.models import App, AppRelease
+
+UploadResult = namedtuple('UploadResult', ['status', 'app_id', 'version',
+                                           'changes'])
+# a downloaded and validated release which still needs to be imported
+PreparedUpload = namedtuple('PreparedUpload', ['info', 'certificate',
+                                               'is_nightly'])
+
+
+def ignore_stage(stage: str) -> None:
+    pass
+
+
+def upload_status(result: Union[UploadResult, Exception]) -> int:
+    """
+    :param result: the result or the error of an upload
+    :return: the response status of the upload
+    """
+    if isinstance(result, UploadResult):
+        return result.status
+    elif isinstance(result, APIException):
+        error = result  # type: APIException
+        return error.status_code
+    return 500
+
+
+def error_body(error: APIException) -> Any:
+    """
+    :param error: the error of a failed upload
+    :return: the response body of the failed upload
+    """
+    if isinstance(error.detail, (list, dict)):
+        return error.detail
+    return {'detail': error.detail}
+
+
+class AppReleaseUploader:
+    """
+    Downloads, validates and imports an app release. Used by the upload API
+    and by the worker which processes queued uploads
+    """
+
+    def __init__(self, provider: AppReleaseProvider,
+                 validator: CertificateValidator,
+                 importer: AppImporter) -> None:
+        self.provider = provider
+        self.validator = validator
+        self.importer = importer
+
+    def upload(self, user: Any, url: str, signature: str, is_nightly: bool,
+               report_stage: Callable[[str], None] = ignore_stage,
+               metrics: Optional[UploadMetrics] = None) -> UploadResult:
+        """
+        Downloading, parsing and validating the release can take a while so
+        no transaction is held open during these stages. Only the final
+        permission check and the import run in a transaction
+        :param user: the user who uploads the release
+        :param url: the download url of the release archive
+        :param signature: the signature of the archive
+        :param is_nightly: whether the release is a nightly
+        :param report_stage: called with the name of every stage before it
+        is run
+        :param metrics: collects the metrics of the stages which are logged
+        and added to the histograms once the upload finished
+        :raises ValidationError: if the release is invalid
+        :raises PermissionDenied: if the user may not upload the release
+        :return: the response status, 201 if the release was created and 200
+        if it was updated, the app id, the version and the summary of the
+        changes
+        """
+        if metrics is None:
+            metrics = UploadMetrics()
+        try:
+            prepared = self.prepare(user, url, signature, is_nightly,
+                                    report_stage, metrics)
+            result = self.apply(user, prepared, report_stage, metrics)
+        except Exception as e:
+            self._record(url, metrics, e)
+            raise
+        self._record(url, metrics, result)
+        return result
+
+    def upload_batch(self, user: Any, releases: List[Tuple[str, str, bool]],
+                     max_workers: int
+                     ) -> List[Union[UploadResult, Exception]]:
+        """
+        Downloads and validates releases on a thread pool and imports them
+        one after another in the given order as soon as they are ready
+        :param user: the user who uploads the releases
+        :param releases: the download url, signature and nightly flag of
+        each release
+        :param max_workers: maximum number of releases which are downloaded
+        and validated at the same time
+        :return: the upload result or the error of each release
+        """
+        results = []  # type: List[Union[UploadResult, Exception]]
+        metrics = [UploadMetrics() for _ in releases]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._prepare_in_thread, user, *release,
+                                       metrics=release_metrics)
+                       for release, release_metrics in zip(releases, metrics)]
+            for release, release_metrics, future in zip(releases, metrics,
+                                                        futures):
+                result = None  # type: Union[UploadResult, Exception]
+                try:
+                    result = self.apply(user, future.result(),
+                                        metrics=release_metrics)
+                except Exception as e:
+                    result = e
+                self._record(release[0], release_metrics, result)
+                results.append(result)
+        return results
+
+    def prepare(self, user: Any, url: str, signature: str, is_nightly: bool,
+                report_stage: Callable[[str], None] = ignore_stage,
+                metrics: Optional[UploadMetrics] = None) -> PreparedUpload:
+        """
+        Runs every stage except the import, no transaction is held open
+        :param user: the user who uploads the release
+        :param url: the download url of the release archive
+        :param signature: the signature of the archive
+        :param is_nightly: whether the release is a nightly
+        :param report_stage: called with the name of every stage before it
+        is run
+        :param metrics: collects the metrics of the stages
+        :raises ValidationError: if the release is invalid
+        :raises PermissionDenied: if the user may not upload the release
+        :return: the release which can be imported
+        """
+        if metrics is None:
+            metrics = UploadMetrics()
+        report_stage(DOWNLOAD_STAGE)
+        try:
+            release = self.provider.get_release_info(url, is_nightly,
+                                                     metrics)
+        except HTTPError as e:
+            raise ValidationError(e)
+        info = release.info
+        app_id = info['app']['id']
+
+        # fail early before the certificates are checked
+        report_stage(PERMISSION_STAGE)
+        with metrics.measure(PERMISSION_STAGE):
+            app = self._get_app(user, app_id)
+
+        # verify certs and signature
+        report_stage(VALIDATION_STAGE)
+        with metrics.measure(VALIDATION_STAGE):
+            chain = read_file_contents(
+                settings.NEXTCLOUD_CERTIFICATE_LOCATION)
+            crl = read_file_contents(settings.NEXTCLOUD_CRL_LOCATION)
+            if settings.VALIDATE_CERTIFICATES:
+                self.validator.validate_certificate(app.certificate, chain,
+                                                    crl)
+                digest = release.digests[settings.CERTIFICATE_DIGEST]
+                self.validator.validate_digest_signature(app.certificate,
+                                                         signature, digest)
+                self.validator.validate_app_id(app.certificate, app_id)
+        self.provider.store_release_info(url, is_nightly, release, metrics)
+
+        # populate metadata from request
+        info['app']['release']['signature'] = signature
+        info['app']['release']['download'] = url
+        return PreparedUpload(info, app.certificate, is_nightly)
+
+    def apply(self, user: Any, prepared: PreparedUpload,
+              report_stage: Callable[[str], None] = ignore_stage,
+              metrics: Optional[UploadMetrics] = None) -> UploadResult:
+        """
+        Imports a prepared release in a transaction
+        :param user: the user who uploads the release
+        :param prepared: the downloaded and validated release
+        :param report_stage: called with the name of every stage before it
+        is run
+        :param metrics: collects the metrics of the stages
+        :raises ValidationError: if the app changed in the meantime
+        :raises PermissionDenied: if the user may not upload the release
+        anymore
+        :return: the response status, 201 if the release was created and 200
+        if it was updated, the app id, the version and the summary of the
+        changes
+        """
+        info = prepared.info
+        app_id = info['app']['id']
+        version = info['app']['release']['version']
+
+        if metrics is None:
+            metrics = UploadMetrics()
+        report_stage(IMPORT_STAGE)
+        with metrics.measure(IMPORT_STAGE), transaction.atomic():
+            # the app could have been changed while the release was checked
+            app = self._get_app(user, app_id, lock=True)
+            if app.certificate != prepared.certificate:
+                raise ValidationError('The certificate of app %s changed '
+                                      'during the upload' % app_id)
+            exists = AppRelease.objects.filter(
+                version=version, app=app,
+                is_nightly=prepared.is_nightly).exists()
+            changes = self.importer.import_data('app', info['app'], None)
+        return UploadResult(200 if exists else 201, app_id, version,
+                            changes.as_dict())
+
+    def _prepare_in_thread(self, user: Any, url: str, signature: str,
+                           is_nightly: bool,
+                           metrics: UploadMetrics) -> PreparedUpload:
+        try:
+            return self.prepare(user, url, signature, is_nightly,
+                                metrics=metrics)
+        finally:
+            # pool threads open their own database connections
+            connection.close()
+
+    def _record(self, url: str, metrics: UploadMetrics,
+                result: Union[UploadResult, Exception]) -> None:
+        if isinstance(result, Exception):
+            metrics.record(url, upload_status(result))
+        else:
+            metrics.record(url, result.status, result.app_id, result.version)
+
+    def _get_app(self, user: Any, app_id: str, lock: bool = False) -> App:
+        """
+        :param user: the user who uploads the release
+        :param app_id: the app id of the release
+        :param lock: lock the app until the transaction ends so releases of
+        the same app are imported one after another
+        :raises ValidationError: if the app is not registered
+        :raises PermissionDenied: if the user may not upload releases
+        :return: the app
+        """
+        apps = App.objects.select_for_update() if lock else App.objects
+        try:
+            app = apps.get(pk=app_id)
+        except App.DoesNotExist:
+            raise ValidationError('App %s does not exist, you need to register'
+                                  'it first' % app_id)
+        # owners and co-maintainers may create and update releases
+        if not app.can_update(user):
+            raise PermissionDenied()
+        return app
@@ -1,14 +1,29 @@
+import json
+
 from nextcloudappstore.core.models import PhpExtensionDependency, \
     DatabaseDependency, Category, AppAuthor, AppRelease, Screenshot, \
-    AppRating, App
+    AppRating, App, AppReleaseJob
 from nextcloudappstore.core.validators import HttpsUrlValidator
+from nextcloudappstore.core.versioning import SEMVER_REGEX
 from parler_rest.fields import TranslatedFieldsField
 from parler_rest.serializers import TranslatableModelSerializer
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField, DateTimeField
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
 
+def select_fields(serializer, fields):
+    """
+    Removes all fields which were not selected from a serializer
+    :param serializer: the serializer
+    :param fields: the names of the selected fields or None to keep all
+    """
+    if fields is not None:
+        for name in set(serializer.fields) - set(fields):
+            serializer.fields.pop(name)
+
+
 class PhpExtensionDependencySerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='php_extension.id')
     version_spec = SerializerMethodField()
@@ -104,8 +119,20 @@ class AppSerializer(serializers.ModelSerializer):
     last_modified = DateTimeField(source='last_release')
 
     def __init__(self, *args, **kwargs):
+        """
+        :param version: the platform version of the listed releases
+        :param fields: if given, only these fields are serialized
+        :param release_fields: if given, only these release fields are
+                               serialized
+        """
         self.version = kwargs.pop('version')
+        fields = kwargs.pop('fields', None)
+        release_fields = kwargs.pop('release_fields', None)
         super().__init__(*args, **kwargs)
+        select_fields(self, fields)
+        # one release serializer is shared by all apps of a list
+        self.release_serializer = AppReleaseSerializer(read_only=True)
+        select_fields(self.release_serializer, release_fields)
 
     class Meta:
         model = App
@@ -118,19 +145,19 @@ class AppSerializer(serializers.ModelSerializer):
         )
 
     def get_releases(self, obj):
-        releases = obj.releases.prefetch_related(
-            'translations',
-            'databases',
-            'licenses',
-            'phpextensiondependencies__php_extension',
-            'databasedependencies__database',
-            'shell_commands',
-        ).all()
+        """
+        Serializes the releases of an app. Relies on the releases and their
+        relations being prefetched, e.g. by App.objects.get_compatible() which
+        also already filtered the compatible releases
+        :param obj: the app
+        :return: the serialized releases
+        """
         if self.version:
-            data = [r for r in releases if r.is_compatible(self.version)]
+            data = obj.all_compatible_releases(self.version, inclusive=False)
         else:
-            data = releases
-        return AppReleaseSerializer(data, many=True, read_only=True).data
+            data = obj.releases.all()
+        return [self.release_serializer.to_representation(release)
+                for release in data]
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -154,6 +181,51 @@ class AppReleaseDownloadSerializer(serializers.Serializer):
     nightly = serializers.BooleanField(required=False, default=False)
 
 
+class AppReleaseBatchSerializer(serializers.Serializer):
+    releases = AppReleaseDownloadSerializer(many=True)
+
+    def validate_releases(self, value):
+        if not value:
+            raise serializers.ValidationError('At least one release is '
+                                              'required')
+        if len(value) > settings.RELEASE_BATCH_MAX_SIZE:
+            msg = 'At most %i releases can be uploaded at once' % \
+                  settings.RELEASE_BATCH_MAX_SIZE
+            raise serializers.ValidationError(msg)
+        return value
+
+
+class AppReleaseJobSerializer(serializers.ModelSerializer):
+    error = SerializerMethodField()
+
+    class Meta:
+        model = AppReleaseJob
+        fields = ('id', 'state', 'stage', 'attempts', 'status_code', 'error',
+                  'app_id', 'version', 'is_nightly', 'created',
+                  'last_modified', 'started', 'finished')
+
+    def get_error(self, obj):
+        # errors are stored as the JSON body of the upload API response
+        return json.loads(obj.error) if obj.error else None
+
+
 class AppRegisterSerializer(serializers.Serializer):
     certificate = serializers.CharField()
     signature = serializers.CharField()
+
+
+class InstalledAppSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=256)
+    version = serializers.RegexField(r'^' + SEMVER_REGEX + r'$')
+
+
+class AppUpdateCheckSerializer(serializers.Serializer):
+    apps = InstalledAppSerializer(many=True)
+    unstable = serializers.BooleanField(required=False, default=False)
+
+    def validate_apps(self, value):
+        if len(value) > settings.UPDATE_CHECK_MAX_APPS:
+            msg = 'At most %i apps can be checked at once' % \
+                  settings.UPDATE_CHECK_MAX_APPS
+            raise serializers.ValidationError(msg)
+        return value
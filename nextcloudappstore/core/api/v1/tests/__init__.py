@@ -4,3 +4,12 @@ from .test_parser import *
 from .test_release_importer import *
 from .test_app_release_provider import *
 from .test_app_register import *
+from .test_app_changes import *
+from .test_app_updates import *
+from .test_app_release_job import *
+from .test_app_release_uploader import *
+from .test_app_release_downloader import *
+from .test_streams import *
+from .test_release_metadata_store import *
+from .test_app_release_batch import *
+from .test_release_metrics import *
@@ -1,6 +1,7 @@
 import base64
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework import HTTP_HEADER_ENCODING
 from rest_framework.authtoken.models import Token
@@ -13,6 +14,7 @@ class ApiTest(TestCase):
                                                          password='test',
                                                          email='test@test.com')
         self.api_client = APIClient()
+        cache.clear()
 
     def _login(self, user='test', password='test'):
         credentials = '%s:%s' % (user, password)
@@ -1,7 +1,18 @@
+import gzip
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from nextcloudappstore.core.api.v1.tests.api import ApiTest
-from nextcloudappstore.core.models import App, AppRelease
+from nextcloudappstore.core.models import App, AppRelease, NextcloudRelease, \
+    AppAuthor, Category, Database, DatabaseDependency, License, PhpExtension, \
+    PhpExtensionDependency, Screenshot, ShellCommand
+
+# maximum number of queries to render apps.json, regardless of the app count
+APPS_QUERY_BUDGET = 22
 
 
 class AppTest(ApiTest):
@@ -61,7 +72,7 @@ class AppTest(ApiTest):
         url = reverse('api:v1:app', kwargs={'version': '9.1.0'})
         response = self.api_client.get(url)
         self.assertEqual(200, response.status_code)
-        self.assertEqual(0, len(response.data))
+        self.assertEqual(0, len(response.json()))
 
     def test_releases_platform_min_max(self):
         app = App.objects.create(pk='news', owner=self.user)
@@ -70,7 +81,7 @@ class AppTest(ApiTest):
         url = reverse('api:v1:app', kwargs={'version': '9.1.2'})
         response = self.api_client.get(url)
         self.assertEqual(200, response.status_code)
-        self.assertEqual(0, len(response.data))
+        self.assertEqual(0, len(response.json()))
 
     def test_releases_platform_max(self):
         app = App.objects.create(pk='news', owner=self.user)
@@ -79,7 +90,7 @@ class AppTest(ApiTest):
         url = reverse('api:v1:app', kwargs={'version': '9.1.2'})
         response = self.api_client.get(url)
         self.assertEqual(200, response.status_code)
-        self.assertEqual(0, len(response.data))
+        self.assertEqual(0, len(response.json()))
 
     def test_releases_platform_max_wildcard(self):
         app = App.objects.create(pk='news', owner=self.user)
@@ -88,7 +99,7 @@ class AppTest(ApiTest):
         url = reverse('api:v1:app', kwargs={'version': '9.1.2'})
         response = self.api_client.get(url)
         self.assertEqual(200, response.status_code)
-        self.assertEqual(1, len(response.data))
+        self.assertEqual(1, len(response.json()))
 
     def test_releases_platform_ok(self):
         app = App.objects.create(pk='news', owner=self.user)
@@ -97,7 +108,268 @@ class AppTest(ApiTest):
         url = reverse('api:v1:app', kwargs={'version': '9.1.1'})
         response = self.api_client.get(url)
         self.assertEqual(200, response.status_code)
-        self.assertEqual(1, len(response.data))
+        self.assertEqual(1, len(response.json()))
+
+    def test_apps_snapshot_reused(self):
+        app = App.objects.create(pk='news', owner=self.user)
+        AppRelease.objects.create(app=app, version='10.1',
+                                  platform_version_spec='>=9.1.1')
+        url = reverse('api:v1:app', kwargs={'version': '9.1.1'})
+        response = self.api_client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.has_header('ETag'))
+        with patch.object(App.objects, 'get_compatible') as get_compatible, \
+                self.assertNumQueries(0):
+            cached = self.api_client.get(url)
+            get_compatible.assert_not_called()
+        self.assertEqual(response.content, cached.content)
+        self.assertEqual(response['ETag'], cached['ETag'])
+
+    def test_apps_compressed(self):
+        app = App.objects.create(pk='news', owner=self.user)
+        AppRelease.objects.create(app=app, version='10.1',
+                                  platform_version_spec='>=9.1.1')
+        url = reverse('api:v1:app', kwargs={'version': '9.1.1'})
+        response = self.api_client.get(url)
+        compressed = self.api_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', compressed['Content-Encoding'])
+        self.assertEqual(response.content, gzip.decompress(compressed.content))
+        self.assertEqual(response['ETag'], compressed['ETag'])
+
+    def test_apps_snapshot_invalidated(self):
+        app = App.objects.create(pk='news', owner=self.user)
+        AppRelease.objects.create(app=app, version='10.1',
+                                  platform_version_spec='>=9.1.1')
+        url = reverse('api:v1:app', kwargs={'version': '9.1.1'})
+        response = self.api_client.get(url)
+        self.assertEqual(1, len(response.json()[0]['releases']))
+        AppRelease.objects.create(app=app, version='10.2',
+                                  platform_version_spec='>=9.1.1')
+        app.save()
+        response = self.api_client.get(url)
+        self.assertEqual(2, len(response.json()[0]['releases']))
+
+    def test_apps_nearest_platform_version(self):
+        NextcloudRelease.objects.create(version='9.1.0')
+        NextcloudRelease.objects.create(version='9.1.2')
+        NextcloudRelease.objects.create(version='11.0.0')
+        app = App.objects.create(pk='news', owner=self.user)
+        AppRelease.objects.create(app=app, version='10.1',
+                                  platform_version_spec='>=9.1.2,<9.2.0')
+        url = reverse('api:v1:app', kwargs={'version': '9.1.5'})
+        response = self.api_client.get(url)
+        self.assertEqual(1, len(response.json()))
+        url = reverse('api:v1:app', kwargs={'version': '9.1.1'})
+        response = self.api_client.get(url)
+        self.assertEqual(0, len(response.json()))
+
+    def test_nearest_platform_version(self):
+        manager = NextcloudRelease.objects
+        self.assertEqual('9.1.5', manager.get_nearest('9.1.5'))
+        NextcloudRelease.objects.create(version='9.1.0')
+        NextcloudRelease.objects.create(version='11.0.0')
+        NextcloudRelease.objects.create(version='10.0.10')
+        self.assertEqual('9.0.0', manager.get_nearest('9.0.0'))
+        self.assertEqual('9.1.0', manager.get_nearest('9.1.5'))
+        self.assertEqual('10.0.10', manager.get_nearest('10.0.10'))
+        self.assertEqual('10.0.9', manager.get_nearest('10.0.9'))
+        self.assertEqual('10.1.0', manager.get_nearest('10.1.0'))
+        self.assertEqual('12.0.0', manager.get_nearest('12.0.0'))
+
+    def test_apps_newer_platform_version(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        NextcloudRelease.objects.create(version='12.0.0')
+        app = App.objects.create(pk='news', owner=self.user)
+        AppRelease.objects.create(app=app, version='1.0.0',
+                                  platform_version_spec='>=12.0.0,<13.0.0')
+        url = reverse('api:v1:app', kwargs={'version': '12.0.0'})
+        self.assertEqual(1, len(self.api_client.get(url).json()))
+        url = reverse('api:v1:app', kwargs={'version': '13.0.0'})
+        self.assertEqual(0, len(self.api_client.get(url).json()))
+        AppRelease.objects.create(app=app, version='2.0.0',
+                                  platform_version_spec='>=13.0.0')
+        app.save()
+        response = self.api_client.get(url).json()
+        self.assertEqual(1, len(response))
+        self.assertEqual(['2.0.0'], [release['version']
+                                     for release in response[0]['releases']])
+
+    def test_apps_query_budget(self):
+        self._create_apps(0, 2)
+        few = self._count_apps_queries('11.0.0')
+        self._create_apps(2, 10)
+        self.assertEqual(few, self._count_apps_queries('11.0.0'))
+        apps = self._get_apps('11.0.0')
+        self.assertEqual(10, len(apps))
+        self.assertEqual(2, len(apps[0]['releases']))
+
+    def test_apps_indexed_query_budget(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        self._create_apps(0, 2)
+        few = self._count_apps_queries('11.0.0')
+        self._create_apps(2, 10)
+        self.assertEqual(few, self._count_apps_queries('11.0.0'))
+        apps = self._get_apps('11.0.0')
+        self.assertEqual(10, len(apps))
+        self.assertEqual(2, len(apps[0]['releases']))
+
+    def test_apps_streaming(self):
+        self._create_apps(0, 5)
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        expected = self.api_client.get(url)
+        with self.settings(APPS_JSON_STREAMING=True,
+                           APPS_JSON_STREAMING_CHUNK_SIZE=2):
+            response = self.api_client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(expected.content,
+                         b''.join(response.streaming_content))
+        self.assertEqual(expected['ETag'], response['ETag'])
+
+    @override_settings(APPS_JSON_STREAMING=True)
+    def test_apps_streaming_empty(self):
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url)
+        self.assertEqual(b'[]', b''.join(response.streaming_content))
+
+    def test_apps_languages(self):
+        self._create_apps(0, 2)
+        for app in App.objects.all():
+            for language in ('en', 'de', 'fr'):
+                app.set_current_language(language)
+                app.name = 'name %s' % language
+                app.save()
+                for release in app.releases.all():
+                    release.set_current_language(language)
+                    release.changelog = 'changelog %s' % language
+                    release.save()
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        default = self.api_client.get(url).content
+        with CaptureQueriesContext(connection) as context:
+            response = self.api_client.get(url, {'languages': 'de,en'})
+        self.assertLessEqual(len(context.captured_queries), APPS_QUERY_BUDGET)
+        apps = response.json()
+        self.assertEqual({'de', 'en'}, set(apps[0]['translations']))
+        self.assertEqual({'de', 'en'},
+                         set(apps[0]['releases'][0]['translations']))
+        self.assertEqual('name de', apps[0]['translations']['de']['name'])
+        self.assertLess(len(response.content), len(default))
+        self.assertEqual(default, self.api_client.get(url).content)
+
+    def test_apps_language_fallback(self):
+        self._create_apps(0, 1)
+        app = App.objects.get()
+        app.set_current_language('en')
+        app.name = 'name en'
+        app.save()
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {'languages': 'de'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('name en',
+                         response.json()[0]['translations']['en']['name'])
+        self.assertEqual(response.content, self.api_client.get(
+            url, {'languages': 'en,de'}).content)
+
+    def test_apps_unknown_languages(self):
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {'languages': 'de,xx'})
+        self.assertEqual(400, response.status_code)
+        response = self.api_client.get(url, {'languages': 'de,' + 'a' * 300})
+        self.assertEqual(400, response.status_code)
+
+    @override_settings(APPS_JSON_MAX_LANGUAGES=2)
+    def test_apps_too_many_languages(self):
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {'languages': 'de,fr'})
+        self.assertEqual(200, response.status_code)
+        response = self.api_client.get(url, {'languages': 'de,fr,it'})
+        self.assertEqual(400, response.status_code)
+
+    def test_apps_fields(self):
+        self._create_apps(0, 2)
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {
+            'fields': 'id,releases,ratingOverall',
+            'releaseFields': 'version,platform_version_spec',
+        })
+        self.assertEqual(200, response.status_code)
+        apps = response.json()
+        self.assertEqual({'id', 'releases', 'ratingOverall'}, set(apps[0]))
+        self.assertEqual({'version', 'platformVersionSpec'},
+                         set(apps[0]['releases'][0]))
+
+        response = self.api_client.get(url, {'fields': 'id'})
+        self.assertEqual([{'id': 'app0'}, {'id': 'app1'}], response.json())
+
+    def test_apps_fields_etag(self):
+        self._create_apps(0, 2)
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {'fields': 'id'})
+        etag = response['ETag']
+        response = self.api_client.get(url, {'fields': ' id,'},
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        response = self.api_client.get(url, {'fields': 'id,releases'},
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()[0]['releases']))
+
+    def test_apps_fields_streaming(self):
+        self._create_apps(0, 3)
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        params = {'fields': 'id,releases', 'releaseFields': 'version',
+                  'languages': 'en'}
+        expected = self.api_client.get(url, params)
+        with self.settings(APPS_JSON_STREAMING=True):
+            response = self.api_client.get(url, params)
+        self.assertEqual(expected.content,
+                         b''.join(response.streaming_content))
+
+    def test_apps_unknown_fields(self):
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        response = self.api_client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(400, response.status_code)
+        response = self.api_client.get(url, {'releaseFields': 'secret'})
+        self.assertEqual(400, response.status_code)
+
+    def _get_apps(self, version):
+        cache.clear()
+        url = reverse('api:v1:app', kwargs={'version': version})
+        response = self.api_client.get(url)
+        self.assertEqual(200, response.status_code)
+        return response.json()
+
+    def _count_apps_queries(self, version):
+        with CaptureQueriesContext(connection) as context:
+            self._get_apps(version)
+        count = len(context.captured_queries)
+        self.assertLessEqual(count, APPS_QUERY_BUDGET)
+        return count
+
+    def _create_apps(self, start, end):
+        database, _ = Database.objects.get_or_create(id='pgsql')
+        extension, _ = PhpExtension.objects.get_or_create(id='libxml')
+        category, _ = Category.objects.get_or_create(id='tools')
+        license, _ = License.objects.get_or_create(id='agpl')
+        command, _ = ShellCommand.objects.get_or_create(name='grep')
+        for i in range(start, end):
+            app = App.objects.create(pk='app%i' % i, owner=self.user)
+            app.categories.add(category)
+            app.authors.add(AppAuthor.objects.create(name='author'))
+            Screenshot.objects.create(app=app, url='https://example.com',
+                                      ordering=1)
+            for version in ('1.0.0', '1.1.0', '2.0.0'):
+                spec = '>=12.0.0' if version == '2.0.0' else '>=11.0.0'
+                release = AppRelease.objects.create(
+                    app=app, version=version, platform_version_spec=spec)
+                release.licenses.add(license)
+                release.shell_commands.add(command)
+                DatabaseDependency.objects.create(app_release=release,
+                                                  database=database)
+                PhpExtensionDependency.objects.create(app_release=release,
+                                                      php_extension=extension)
 
     def tearDown(self):
         self.user.delete()
@@ -0,0 +1,102 @@
+from django.core.urlresolvers import reverse
+from nextcloudappstore.core.api.v1.tests.api import ApiTest
+from nextcloudappstore.core.models import App, AppRelease, NextcloudRelease
+
+
+class AppChangesTest(ApiTest):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api:v1:app-changes', kwargs={'version': '11.0.0'})
+        self.news = App.objects.create(pk='news', owner=self.user)
+        self.news_release = AppRelease.objects.create(
+            app=self.news, version='1.0.0', platform_version_spec='>=11.0.0')
+        self.mail = App.objects.create(pk='mail', owner=self.user)
+        AppRelease.objects.create(app=self.mail, version='1.0.0',
+                                  platform_version_spec='>=11.0.0')
+
+    def test_full(self):
+        response = self.api_client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual({'news', 'mail'}, {a['id'] for a in data['apps']})
+        self.assertEqual([], data['removedApps'])
+        self.assertEqual([], data['removedReleases'])
+
+    def test_newer_platform_version(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        AppRelease.objects.create(app=self.mail, version='1.1.0',
+                                  platform_version_spec='>=11.0.0,<12.0.0')
+        self.news_release.platform_version_spec = '>=12.0.0'
+        self.news_release.save()
+
+        def get_releases(version):
+            url = reverse('api:v1:app-changes', kwargs={'version': version})
+            data = self.api_client.get(url).json()
+            return {app['id']: {r['version'] for r in app['releases']}
+                    for app in data['apps']}
+
+        self.assertEqual({'news': {'1.0.0'}, 'mail': {'1.0.0'}},
+                         get_releases('12.0.0'))
+        self.assertEqual({'mail': {'1.0.0', '1.1.0'}}, get_releases('11.0.2'))
+
+    def test_unchanged(self):
+        cursor = self.api_client.get(self.url).json()['cursor']
+        response = self.api_client.get(self.url, {'since': cursor})
+        data = response.json()
+        self.assertEqual([], data['apps'])
+        self.assertEqual([], data['removedApps'])
+        self.assertEqual([], data['removedReleases'])
+        self.assertGreaterEqual(data['cursor'], cursor)
+
+    def test_new_release(self):
+        cursor = self.api_client.get(self.url).json()['cursor']
+        AppRelease.objects.create(app=self.news, version='1.1.0',
+                                  platform_version_spec='>=11.0.0')
+        data = self.api_client.get(self.url, {'since': cursor}).json()
+        self.assertEqual(['news'], [a['id'] for a in data['apps']])
+        self.assertEqual(2, len(data['apps'][0]['releases']))
+
+    def test_deleted_release(self):
+        AppRelease.objects.create(app=self.news, version='1.1.0',
+                                  platform_version_spec='>=11.0.0')
+        cursor = self.api_client.get(self.url).json()['cursor']
+        self.news_release.delete()
+        data = self.api_client.get(self.url, {'since': cursor}).json()
+        self.assertEqual(['news'], [a['id'] for a in data['apps']])
+        self.assertEqual(1, len(data['apps'][0]['releases']))
+        self.assertEqual([{'app': 'news', 'version': '1.0.0',
+                           'isNightly': False}], data['removedReleases'])
+
+    def test_last_compatible_release_deleted(self):
+        cursor = self.api_client.get(self.url).json()['cursor']
+        self.news_release.delete()
+        data = self.api_client.get(self.url, {'since': cursor}).json()
+        self.assertEqual([], data['apps'])
+        self.assertEqual(['news'], data['removedApps'])
+
+    def test_deleted_app(self):
+        cursor = self.api_client.get(self.url).json()['cursor']
+        self.mail.delete()
+        data = self.api_client.get(self.url, {'since': cursor}).json()
+        self.assertEqual([], data['apps'])
+        self.assertEqual(['mail'], data['removedApps'])
+        self.assertEqual([{'app': 'mail', 'version': '1.0.0',
+                           'isNightly': False}], data['removedReleases'])
+
+    def test_etag_as_cursor(self):
+        etag = self.api_client.get(
+            reverse('api:v1:app', kwargs={'version': '11.0.0'}))['ETag']
+        self.mail.delete()
+        data = self.api_client.get(self.url, {'since': etag}).json()
+        self.assertEqual(['mail'], data['removedApps'])
+
+    def test_selection_etag_as_cursor(self):
+        url = reverse('api:v1:app', kwargs={'version': '11.0.0'})
+        etag = self.api_client.get(url, {'fields': 'id'})['ETag']
+        self.mail.delete()
+        data = self.api_client.get(self.url, {'since': etag}).json()
+        self.assertEqual(['mail'], data['removedApps'])
+
+    def test_invalid_cursor(self):
+        response = self.api_client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(400, response.status_code)
@@ -3,7 +3,8 @@ from unittest.mock import patch
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
 
-from nextcloudappstore.core.api.v1.release.provider import AppReleaseProvider
+from nextcloudappstore.core.api.v1.release.provider import \
+    AppReleaseProvider, Release
 from nextcloudappstore.core.api.v1.tests.api import ApiTest
 from nextcloudappstore.core.models import App, AppRelease
 
@@ -95,7 +96,7 @@ class AppReleaseTest(ApiTest):
         self.create_release(owner)
         self._login()
 
-        get_release_info.return_value = (self.app_args, 'checksum')
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
         response = self.api_client.post(self.create_url, data={
             'download': 'https://download.com',
             'signature': 'sign',
@@ -110,7 +111,7 @@ class AppReleaseTest(ApiTest):
         self.create_release(owner=owner, co_maintainers=[self.user])
         self._login()
 
-        get_release_info.return_value = (self.app_args, 'checksum')
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
         with self.settings(VALIDATE_CERTIFICATES=False):
             response = self.api_client.post(self.create_url, data={
                 'download': 'https://download.com',
@@ -122,7 +123,7 @@ class AppReleaseTest(ApiTest):
     @patch.object(AppReleaseProvider, 'get_release_info')
     def test_no_app(self, get_release_info):
         self._login()
-        get_release_info.return_value = (self.app_args, 'checksum')
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
         with self.settings(VALIDATE_CERTIFICATES=False):
             response = self.api_client.post(self.create_url, data={
                 'download': 'https://download.com',
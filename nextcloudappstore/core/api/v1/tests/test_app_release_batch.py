@@ -0,0 +1,121 @@
+import base64
+from copy import deepcopy
+from threading import Barrier
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TransactionTestCase, override_settings
+from rest_framework import HTTP_HEADER_ENCODING
+from rest_framework.test import APIClient
+
+from nextcloudappstore.core.api.v1.release.provider import \
+    AppReleaseProvider, Release
+from nextcloudappstore.core.api.v1.tests.test_app_release_uploader import \
+    APP_ARGS
+from nextcloudappstore.core.models import App, AppRelease
+from nextcloudappstore.core.throttling import PostThrottle
+
+
+def get_release_info(provider, url, is_nightly, metrics=None):
+    # the last part of the url is used as app id
+    info = deepcopy(APP_ARGS)
+    info['app']['id'] = url.rsplit('/', 1)[-1]
+    return Release(info, {'sha512': b'checksum', 'sha256': b'checksum'},
+                   None, True)
+
+
+@override_settings(VALIDATE_CERTIFICATES=False)
+@patch.object(AppReleaseProvider, 'get_release_info', get_release_info)
+class AppReleaseBatchTest(TransactionTestCase):
+    batch_url = reverse('api:v1:app-release-batch')
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test',
+                                                         password='test',
+                                                         email='test@test.com')
+        self.api_client = APIClient()
+        App.objects.create(id='news', owner=self.user, certificate='news')
+        App.objects.create(id='mail', owner=self.user, certificate='mail')
+        cache.clear()
+
+    def _login(self):
+        credentials = base64.b64encode(b'test:test').decode(
+            HTTP_HEADER_ENCODING)
+        self.api_client.credentials(HTTP_AUTHORIZATION='Basic ' + credentials)
+
+    def _upload(self, *app_ids):
+        self._login()
+        releases = [{'download': 'https://download.com/%s' % app_id,
+                     'signature': 'sign'} for app_id in app_ids]
+        return self.api_client.post(self.batch_url, data={
+            'releases': releases
+        }, format='json')
+
+    def test_batch(self):
+        response = self._upload('news', 'unknown', 'mail')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['https://download.com/news',
+                          'https://download.com/unknown',
+                          'https://download.com/mail'],
+                         [result['download'] for result in response.data])
+        self.assertEqual([201, 400, 201],
+                         [result['status'] for result in response.data])
+        self.assertTrue(response.data[0]['body']['release']['created'])
+        self.assertEqual(2, AppRelease.objects.count())
+
+    def test_update(self):
+        self._upload('news')
+        response = self._upload('news', 'news')
+        self.assertEqual([200, 200],
+                         [result['status'] for result in response.data])
+        self.assertEqual(1, AppRelease.objects.count())
+
+    def test_not_allowed(self):
+        owner = get_user_model().objects.create_user(username='owner',
+                                                     password='owner',
+                                                     email='owner@owner.com')
+        App.objects.filter(id='mail').update(owner=owner)
+        response = self._upload('news', 'mail')
+        self.assertEqual([201, 403],
+                         [result['status'] for result in response.data])
+        self.assertFalse(AppRelease.objects.filter(app__id='mail').exists())
+
+    def test_concurrent_downloads(self):
+        # both downloads must be running at the same time to pass the barrier
+        barrier = Barrier(2, timeout=10)
+
+        def download(provider, url, is_nightly, metrics=None):
+            barrier.wait()
+            return get_release_info(provider, url, is_nightly)
+
+        with patch.object(AppReleaseProvider, 'get_release_info', download):
+            response = self._upload('news', 'mail')
+        self.assertEqual([201, 201],
+                         [result['status'] for result in response.data])
+
+    @patch.dict(PostThrottle.THROTTLE_RATES, {'app_upload': '2/day'})
+    def test_throttled(self):
+        response = self._upload('news', 'mail', 'news')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([201, 201, 429],
+                         [result['status'] for result in response.data])
+        response = self._upload('news')
+        self.assertEqual(429, response.data[0]['status'])
+
+    @override_settings(RELEASE_BATCH_MAX_SIZE=1)
+    def test_too_many(self):
+        response = self._upload('news', 'mail')
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(AppRelease.objects.exists())
+
+    def test_empty(self):
+        response = self._upload()
+        self.assertEqual(400, response.status_code)
+
+    def test_unauthenticated(self):
+        response = self.api_client.post(self.batch_url, data={
+            'releases': []
+        }, format='json')
+        self.assertEqual(401, response.status_code)
@@ -0,0 +1,192 @@
+import hashlib
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from pymple import Container
+from requests import Session
+
+from nextcloudappstore.core.api.v1.release.downloader import \
+    AppReleaseDownloader, MaximumDownloadSizeExceededException, \
+    DownloadValidators, DownloadException, create_download_session
+from nextcloudappstore.core.benchmark.download import serve_archive
+
+
+def fake_response(chunks):
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {}
+    response.iter_content.return_value = chunks
+    return response
+
+
+class ArchiveServer:
+    """
+    Local stand-in for the server which hosts release archives. Answers
+    conditional requests with 304 if the archive did not change
+    """
+
+    def __init__(self, content, etag='"1"',
+                 last_modified='Sat, 01 Apr 2017 10:00:00 GMT'):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests = []
+        self.statuses = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                etag = self.headers.get('If-None-Match')
+                since = self.headers.get('If-Modified-Since')
+                if (etag or since) and etag in (None, server.etag) and \
+                        since in (None, server.last_modified):
+                    server.statuses.append(304)
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                server.statuses.append(200)
+                self.send_response(200)
+                if server.etag:
+                    self.send_header('ETag', server.etag)
+                if server.last_modified:
+                    self.send_header('Last-Modified', server.last_modified)
+                self.send_header('Content-Length', str(len(server.content)))
+                self.end_headers()
+                self.wfile.write(server.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%i/app.tar.gz' % self.httpd.server_port
+
+    def __enter__(self):
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class AppReleaseDownloaderTest(TestCase):
+    def setUp(self):
+        self.downloader = Container().resolve(AppReleaseDownloader)
+
+    @patch.object(Session, 'get')
+    def test_digests(self, get):
+        chunks = [b'a' * 1024, b'b' * 1024, b'c' * 10]
+        get.return_value = fake_response(chunks)
+        content = b''.join(chunks)
+        with self.downloader.get_archive('https://download.com',
+                                         None) as download:
+            with open(download.filename, 'rb') as f:
+                self.assertEqual(content, f.read())
+            self.assertEqual(hashlib.sha512(content).digest(),
+                             download.digests['sha512'])
+            self.assertEqual(hashlib.sha256(content).digest(),
+                             download.digests['sha256'])
+        self.assertFalse(os.path.exists(download.filename))
+
+    @patch.object(Session, 'get')
+    def test_selected_digests(self, get):
+        get.return_value = fake_response([b'a'])
+        with self.downloader.get_archive('https://download.com', None,
+                                         digests=['sha256']) as download:
+            self.assertEqual({'sha256': hashlib.sha256(b'a').digest()},
+                             download.digests)
+
+    @patch.object(Session, 'get')
+    def test_too_big(self, get):
+        get.return_value = fake_response([b'a' * 1024, b'b' * 1024])
+        with self.assertRaises(MaximumDownloadSizeExceededException):
+            self.downloader.get_archive('https://download.com', None,
+                                        max_size=1500)
+
+    @patch.object(Session, 'get')
+    def test_exactly_max_size(self, get):
+        get.return_value = fake_response([b'a' * 1024, b'b' * 476])
+        with self.downloader.get_archive('https://download.com', None,
+                                         max_size=1500) as download:
+            self.assertEqual(1500, os.path.getsize(download.filename))
+
+    @patch.object(Session, 'get')
+    def test_chunk_size(self, get):
+        response = fake_response([b'a'])
+        get.return_value = response
+        with self.downloader.get_archive('https://download.com', None,
+                                         chunk_size=4096):
+            response.iter_content.assert_called_once_with(4096)
+        response.close.assert_called_once_with()
+
+    def test_reuses_connections(self):
+        with serve_archive(b'archive') as server:
+            for _ in range(3):
+                with self.downloader.get_archive(server['url'],
+                                                 None) as download:
+                    with open(download.filename, 'rb') as f:
+                        self.assertEqual(b'archive', f.read())
+        self.assertEqual(1, len(server['connections']))
+
+    def test_connections_per_host(self):
+        session = create_download_session(1, 1, 1, 10)
+        with serve_archive(b'archive') as server:
+            first = session.get(server['url'], stream=True)
+            second = Thread(target=lambda: session.get(server['url']).close())
+            second.start()
+            # the second download waits for the connection of the first one
+            second.join(0.5)
+            self.assertTrue(second.is_alive())
+            self.assertEqual(b'archive', first.content)
+            first.close()
+            second.join(10)
+            self.assertFalse(second.is_alive())
+        self.assertEqual(1, len(server['connections']))
+
+    def test_connection_wait_timeout(self):
+        session = create_download_session(1, 1, 1, 0.1)
+        with serve_archive(b'archive') as server, \
+                patch.object(AppReleaseDownloader, '_get_session',
+                             return_value=session):
+            first = session.get(server['url'], stream=True)
+            with self.assertRaises(DownloadException):
+                self.downloader.get_archive(server['url'], None)
+            first.close()
+
+    def test_not_modified(self):
+        with ArchiveServer(b'archive') as server:
+            with self.downloader.get_archive(server.url, None) as download:
+                self.assertTrue(download.is_modified)
+                self.assertEqual('"1"', download.etag)
+                self.assertEqual(server.last_modified, download.last_modified)
+            digests = download.digests
+            validators = DownloadValidators(download.etag,
+                                            download.last_modified, digests)
+            with self.downloader.get_archive(server.url, None,
+                                             validators=validators) as again:
+                self.assertFalse(again.is_modified)
+                self.assertIsNone(again.filename)
+                self.assertEqual(digests, again.digests)
+                self.assertEqual('"1"', again.etag)
+        self.assertEqual([200, 304], server.statuses)
+        self.assertEqual('"1"', server.requests[1]['If-None-Match'])
+        self.assertEqual(server.last_modified,
+                         server.requests[1]['If-Modified-Since'])
+
+    def test_modified(self):
+        with ArchiveServer(b'archive') as server:
+            validators = DownloadValidators('"1"', '', {'sha256': b'old'})
+            server.content = b'changed'
+            server.etag = '"2"'
+            with self.downloader.get_archive(
+                    server.url, None, validators=validators) as download:
+                self.assertTrue(download.is_modified)
+                self.assertEqual('"2"', download.etag)
+                self.assertEqual(hashlib.sha256(b'changed').digest(),
+                                 download.digests['sha256'])
+                with open(download.filename, 'rb') as f:
+                    self.assertEqual(b'changed', f.read())
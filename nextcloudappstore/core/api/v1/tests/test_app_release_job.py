@@ -0,0 +1,203 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+from django.utils import timezone
+
+from nextcloudappstore.core.api.v1.release.provider import \
+    AppReleaseProvider, Release
+from nextcloudappstore.core.api.v1.tests.api import ApiTest
+from nextcloudappstore.core.models import App, AppRelease, AppReleaseJob
+
+
+@override_settings(RELEASE_UPLOAD_ASYNC=True, VALIDATE_CERTIFICATES=False)
+class AppReleaseJobTest(ApiTest):
+    create_url = reverse('api:v1:app-release-create')
+    app_args = {'app': {'id': 'news', 'release': {
+        'version': '9.0.0',
+        'platform_min_version': '9.0.0',
+        'raw_platform_min_version': '9.0.0',
+        'platform_max_version': '*',
+        'raw_platform_max_version': '*',
+        'php_min_version': '5.6.0',
+        'raw_php_min_version': '5.6.0',
+        'php_max_version': '*',
+        'raw_php_max_version': '*',
+    }}}
+
+    def _queue(self, **headers):
+        self._login()
+        return self.api_client.post(self.create_url, data={
+            'download': 'https://download.com',
+            'signature': 'sign',
+        }, format='json', **headers)
+
+    def _process(self):
+        call_command('processreleasejobs', '--once', stdout=StringIO())
+
+    def _get_job(self, response):
+        return self.api_client.get(response['Location'])
+
+    def test_queue(self):
+        response = self._queue(HTTP_PREFER='respond-async')
+        self.assertEqual(202, response.status_code)
+        self.assertEqual('respond-async', response['Preference-Applied'])
+        job = AppReleaseJob.objects.get()
+        self.assertEqual(str(job.pk), str(response.data['id']))
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertEqual(AppReleaseJob.QUEUED, job.state)
+        self.assertEqual('https://download.com', job.download)
+        self.assertEqual(self.user, job.owner)
+
+        response = self._get_job(response)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('queued', response.data['state'])
+        self.assertIsNone(response.data['status_code'])
+
+    def test_queue_invalid(self):
+        self._login()
+        response = self.api_client.post(self.create_url, data={
+            'download': 'http://download.com',
+            'signature': 'sign',
+        }, format='json', HTTP_PREFER='respond-async')
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(AppReleaseJob.objects.exists())
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_sync_without_header(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        App.objects.create(id='news', owner=self.user)
+        response = self._queue()
+        self.assertEqual(201, response.status_code)
+        self.assertFalse(AppReleaseJob.objects.exists())
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_sync_by_default(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        App.objects.create(id='news', owner=self.user)
+        with self.settings(RELEASE_UPLOAD_ASYNC=False):
+            response = self._queue(HTTP_PREFER='respond-async')
+        self.assertEqual(201, response.status_code)
+        self.assertFalse(AppReleaseJob.objects.exists())
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_process(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        App.objects.create(id='news', owner=self.user)
+        response = self._queue(HTTP_PREFER='respond-async')
+        self._process()
+
+        AppRelease.objects.get(version='9.0.0', app__id='news')
+        data = self._get_job(response).data
+        self.assertEqual('succeeded', data['state'])
+        self.assertEqual('import', data['stage'])
+        self.assertEqual(201, data['status_code'])
+        self.assertIsNone(data['error'])
+        self.assertEqual('news', data['app_id'])
+        self.assertEqual('9.0.0', data['version'])
+        self.assertIsNotNone(data['finished'])
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_process_no_app(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        response = self._queue(HTTP_PREFER='respond-async')
+        self._process()
+
+        self.assertFalse(AppRelease.objects.exists())
+        data = self._get_job(response).data
+        self.assertEqual('failed', data['state'])
+        self.assertEqual('permission', data['stage'])
+        self.assertEqual(400, data['status_code'])
+        self.assertIn('does not exist', data['error'][0])
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_process_unauthorized(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        owner = get_user_model().objects.create_user(username='owner',
+                                                     password='owner',
+                                                     email='owner@owner.com')
+        App.objects.create(id='news', owner=owner)
+        response = self._queue(HTTP_PREFER='respond-async')
+        self._process()
+
+        self.assertFalse(AppRelease.objects.exists())
+        data = self._get_job(response).data
+        self.assertEqual('failed', data['state'])
+        self.assertEqual(403, data['status_code'])
+        self.assertIn('detail', data['error'])
+
+    def test_job_of_other_user(self):
+        response = self._queue(HTTP_PREFER='respond-async')
+        get_user_model().objects.create_user(username='other',
+                                             password='other',
+                                             email='other@other.com')
+        self._login('other', 'other')
+        self.assertEqual(404, self._get_job(response).status_code)
+
+    def test_job_unauthenticated(self):
+        response = self._queue(HTTP_PREFER='respond-async')
+        self.api_client.credentials()
+        self.assertEqual(401, self._get_job(response).status_code)
+
+    def test_claim(self):
+        first = AppReleaseJob.objects.create(owner=self.user,
+                                             download='https://a.com',
+                                             signature='sign')
+        second = AppReleaseJob.objects.create(owner=self.user,
+                                              download='https://b.com',
+                                              signature='sign')
+        self.assertEqual(first, AppReleaseJob.objects.claim(60, 3))
+        self.assertEqual(second, AppReleaseJob.objects.claim(60, 3))
+        self.assertIsNone(AppReleaseJob.objects.claim(60, 3))
+        self.assertEqual(AppReleaseJob.RUNNING,
+                         AppReleaseJob.objects.get(pk=first.pk).state)
+
+    def test_claim_abandoned(self):
+        job = AppReleaseJob.objects.create(owner=self.user,
+                                           download='https://a.com',
+                                           signature='sign')
+        AppReleaseJob.objects.claim(60, 3)
+        started = timezone.now() - timedelta(seconds=120)
+        AppReleaseJob.objects.filter(pk=job.pk).update(started=started)
+        claimed = AppReleaseJob.objects.claim(60, 3)
+        self.assertEqual(job, claimed)
+        self.assertGreater(claimed.started, started)
+
+    def test_claim_max_attempts(self):
+        job = AppReleaseJob.objects.create(owner=self.user,
+                                           download='https://a.com',
+                                           signature='sign')
+        started = timezone.now() - timedelta(seconds=120)
+        for attempt in range(1, 3):
+            claimed = AppReleaseJob.objects.claim(60, 2)
+            self.assertEqual(job, claimed)
+            self.assertEqual(attempt, claimed.attempts)
+            # the worker crashed while processing the job
+            AppReleaseJob.objects.filter(pk=job.pk).update(started=started)
+
+        self.assertIsNone(AppReleaseJob.objects.claim(60, 2))
+        job = AppReleaseJob.objects.get(pk=job.pk)
+        self.assertEqual(AppReleaseJob.FAILED, job.state)
+        self.assertEqual(500, job.status_code)
+        self.assertEqual(2, job.attempts)
+        self.assertIsNotNone(job.finished)
+        self._login()
+        url = reverse('api:v1:app-release-job', kwargs={'pk': job.pk})
+        response = self.api_client.get(url)
+        self.assertEqual(2, response.data['attempts'])
+        self.assertIn('detail', response.data['error'])
+
+    def test_error_is_json(self):
+        job = AppReleaseJob.objects.create(owner=self.user,
+                                           download='https://a.com',
+                                           signature='sign')
+        job.finish(400, json.dumps(['invalid']))
+        self.assertEqual(AppReleaseJob.FAILED, job.state)
+        self._login()
+        url = reverse('api:v1:app-release-job', kwargs={'pk': job.pk})
+        self.assertEqual(['invalid'], self.api_client.get(url).data['error'])
@@ -1,21 +1,30 @@
 from unittest.mock import Mock, MagicMock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from nextcloudappstore.core.api.v1.release.downloader import \
     AppReleaseDownloader
+from nextcloudappstore.core.api.v1.release.metrics import UploadMetrics
 from nextcloudappstore.core.api.v1.release.parser import \
     GunZipAppMetadataExtractor
 from nextcloudappstore.core.api.v1.release.provider import \
     AppReleaseProvider, \
     InvalidAppDirectoryException
+from nextcloudappstore.core.api.v1.tests.test_app_release_downloader import \
+    ArchiveServer
 from nextcloudappstore.core.facades import read_relative_file, \
     resolve_file_relative_path
+from nextcloudappstore.core.models import AppReleaseMetadata, \
+    AppReleaseOrigin
 from pymple import Container
 
 
 class FakeDownload:
     filename = resolve_file_relative_path(__file__,
                                           'data/infoxmls/minimal.xml')
+    digests = {'sha512': b'sha512', 'sha256': b'sha256'}
+    is_modified = True
+    etag = ''
+    last_modified = ''
 
     def __enter__(self):
         return self
@@ -33,9 +42,104 @@ class ImporterTest(TestCase):
         downloader = self.container.resolve(AppReleaseDownloader)
         downloader.get_archive = MagicMock(return_value=FakeDownload())
         extractor = self.container.resolve(GunZipAppMetadataExtractor)
-        extractor.extract_app_metadata = MagicMock(return_value=(xml, 'new',
-                                                                 'change'))
+        extractor.extract_app_metadata = MagicMock(return_value=(
+            xml, 'new', {'en': 'change'}))
         provider = self.container.resolve(AppReleaseProvider)
 
         with self.assertRaises(InvalidAppDirectoryException):
             provider.get_release_info('http://google.com')
+
+    def _get_provider(self):
+        xml = read_relative_file(__file__, 'data/infoxmls/minimal.xml')
+        downloader = self.container.resolve(AppReleaseDownloader)
+        downloader.get_archive = MagicMock(return_value=FakeDownload())
+        extractor = self.container.resolve(GunZipAppMetadataExtractor)
+        extractor.extract_app_metadata = MagicMock(return_value=(
+            xml, 'news', {'en': '## 8.8.2\n- fixed'}
+        ))
+        return self.container.resolve(AppReleaseProvider), extractor
+
+    def _get_stored(self, provider, url, is_nightly=False, metrics=None):
+        release = provider.get_release_info(url, is_nightly, metrics)
+        provider.store_release_info(url, is_nightly, release, metrics)
+        return release
+
+    def test_reuse_parsed_archive(self):
+        provider, extractor = self._get_provider()
+        release = self._get_stored(provider, 'https://google.com')
+        self.assertEqual(FakeDownload.digests, release.digests)
+        self.assertFalse(release.is_stored)
+        release.info['app']['release']['signature'] = 'sign'
+
+        again = provider.get_release_info('https://google.com')
+        self.assertTrue(again.is_stored)
+        self.assertEqual(1, extractor.extract_app_metadata.call_count)
+        self.assertNotIn('signature', again.info['app']['release'])
+        self.assertEqual('news', again.info['app']['id'])
+        self.assertEqual('- fixed',
+                         again.info['app']['release']['changelog']['en'])
+
+        # nightlies use the unreleased changelog
+        nightly = self._get_stored(provider, 'https://google.com', True)
+        self.assertEqual(2, extractor.extract_app_metadata.call_count)
+        self.assertTrue(nightly.info['app']['release']['is_nightly'])
+        self.assertEqual('',
+                         nightly.info['app']['release']['changelog']['en'])
+
+    def test_not_stored_before_validation(self):
+        provider, extractor = self._get_provider()
+        provider.get_release_info('https://google.com')
+        provider.get_release_info('https://google.com')
+        self.assertEqual(2, extractor.extract_app_metadata.call_count)
+        self.assertFalse(AppReleaseMetadata.objects.exists())
+
+    def test_metrics(self):
+        provider, extractor = self._get_provider()
+        metrics = UploadMetrics()
+        self._get_stored(provider, 'https://google.com', metrics=metrics)
+        self.assertEqual(['store', 'download', 'extract', 'parse'],
+                         list(metrics.stages))
+        xml = read_relative_file(__file__, 'data/infoxmls/minimal.xml')
+        self.assertEqual(len(xml.encode()),
+                         metrics.stages['download'].bytes)
+        self.assertEqual(len(xml.encode()), metrics.stages['parse'].bytes)
+        self.assertGreater(metrics.stages['store'].queries, 0)
+
+        # stored metadata is neither extracted nor parsed again
+        metrics = UploadMetrics()
+        provider.get_release_info('https://google.com', metrics=metrics)
+        self.assertEqual(['store', 'download'], list(metrics.stages))
+
+    @override_settings(RELEASE_METADATA_STORE_SIZE=0)
+    def test_store_disabled(self):
+        provider, extractor = self._get_provider()
+        self._get_stored(provider, 'https://google.com')
+        self._get_stored(provider, 'https://google.com')
+        self.assertEqual(2, extractor.extract_app_metadata.call_count)
+        self.assertFalse(AppReleaseMetadata.objects.exists())
+
+    def test_conditional_download(self):
+        with open(resolve_file_relative_path(
+                __file__, 'data/archives/full.tar.gz'), 'rb') as f:
+            archive = f.read()
+        extractor = self.container.resolve(GunZipAppMetadataExtractor)
+        extractor.extract_app_metadata = MagicMock(
+            wraps=extractor.extract_app_metadata)
+        provider = self.container.resolve(AppReleaseProvider)
+
+        with ArchiveServer(archive) as server:
+            release = self._get_stored(provider, server.url)
+            again = self._get_stored(provider, server.url)
+            self.assertEqual([200, 304], server.statuses)
+
+            # the archive is needed again once its metadata was evicted
+            AppReleaseMetadata.objects.all().delete()
+            evicted = self._get_stored(provider, server.url)
+            self.assertEqual([200, 304, 200], server.statuses)
+            self.assertNotIn('If-None-Match', server.requests[-1])
+
+        self.assertEqual(release.info, again.info)
+        self.assertEqual(release.info, evicted.info)
+        self.assertEqual(release.digests, again.digests)
+        self.assertEqual(2, extractor.extract_app_metadata.call_count)
+        self.assertEqual('"1"', AppReleaseOrigin.objects.get().etag)
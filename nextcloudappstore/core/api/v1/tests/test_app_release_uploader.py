@@ -0,0 +1,153 @@
+from copy import deepcopy
+from threading import Event, Thread
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from pymple import Container
+
+from nextcloudappstore.core.api.v1.release.provider import \
+    AppReleaseProvider, Release
+from nextcloudappstore.core.api.v1.release.uploader import AppReleaseUploader
+from nextcloudappstore.core.certificate.validator import CertificateValidator
+from nextcloudappstore.core.models import App, AppRelease
+
+APP_ARGS = {'app': {'id': 'news', 'release': {
+    'version': '9.0.0',
+    'platform_min_version': '9.0.0',
+    'raw_platform_min_version': '9.0.0',
+    'platform_max_version': '*',
+    'raw_platform_max_version': '*',
+    'php_min_version': '5.6.0',
+    'raw_php_min_version': '5.6.0',
+    'php_max_version': '*',
+    'raw_php_max_version': '*',
+}}}
+
+
+def get_release_info(provider, url, is_nightly, metrics=None):
+    # the url is used as app id
+    info = deepcopy(APP_ARGS)
+    info['app']['id'] = url
+    return Release(info, {'sha512': b'checksum', 'sha256': b'checksum'},
+                   None, True)
+
+
+@patch.object(AppReleaseProvider, 'get_release_info', get_release_info)
+@patch.object(CertificateValidator, 'validate_digest_signature')
+@patch.object(CertificateValidator, 'validate_app_id')
+class AppReleaseUploaderTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test',
+                                                         password='test',
+                                                         email='test@test.com')
+        self.uploader = Container().resolve(AppReleaseUploader)
+        App.objects.create(id='news', owner=self.user, certificate='news')
+
+    @patch.object(CertificateValidator, 'validate_certificate')
+    def test_no_placeholder_on_failure(self, validate_certificate, *args):
+        validate_certificate.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            self.uploader.upload(self.user, 'news', 'sign', False)
+        self.assertFalse(AppRelease.objects.exists())
+
+    @patch.object(AppReleaseProvider, 'store_release_info')
+    @patch.object(CertificateValidator, 'validate_certificate')
+    def test_store_after_validation(self, validate_certificate,
+                                    store_release_info, *args):
+        validate_certificate.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            self.uploader.upload(self.user, 'news', 'sign', False)
+        store_release_info.assert_not_called()
+
+        def store(url, is_nightly, release, metrics):
+            # the metadata of the request is not stored
+            self.assertNotIn('signature', release.info['app']['release'])
+
+        validate_certificate.side_effect = None
+        store_release_info.side_effect = store
+        self.uploader.upload(self.user, 'news', 'sign', False)
+        self.assertEqual(1, store_release_info.call_count)
+
+    @patch.object(CertificateValidator, 'validate_certificate')
+    def test_update(self, *args):
+        self.uploader.upload(self.user, 'news', 'sign', False)
+        result = self.uploader.upload(self.user, 'news', 'sign', False)
+        self.assertEqual(200, result.status)
+        self.assertEqual({'created': False, 'changed': []}, result.changes)
+        self.assertEqual(1, AppRelease.objects.count())
+
+
+@override_settings(VALIDATE_CERTIFICATES=True)
+@patch.object(AppReleaseProvider, 'get_release_info', get_release_info)
+@patch.object(CertificateValidator, 'validate_digest_signature')
+@patch.object(CertificateValidator, 'validate_app_id')
+class AppReleaseUploaderConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test',
+                                                         password='test',
+                                                         email='test@test.com')
+        App.objects.create(id='news', owner=self.user, certificate='news')
+        App.objects.create(id='mail', owner=self.user, certificate='mail')
+
+    def test_no_transaction_during_download_and_validation(self, *args):
+        in_transaction = []
+
+        def download(provider, url, is_nightly, metrics=None):
+            in_transaction.append(connection.in_atomic_block)
+            return get_release_info(provider, url, is_nightly)
+
+        def validate_certificate(certificate, chain, crl):
+            in_transaction.append(connection.in_atomic_block)
+
+        uploader = Container().resolve(AppReleaseUploader)
+        with patch.object(AppReleaseProvider, 'get_release_info', download), \
+                patch.object(CertificateValidator, 'validate_certificate',
+                             side_effect=validate_certificate):
+            result = uploader.upload(self.user, 'news', 'sign', False)
+        self.assertEqual([False, False], in_transaction)
+        self.assertEqual((201, 'news', '9.0.0'), result[:3])
+
+    def test_parallel_uploads(self, *args):
+        """
+        An upload which is stuck in validation must not block the upload of
+        another app
+        """
+        validating = Event()
+        resume = Event()
+        errors = []
+
+        def validate_certificate(certificate, chain, crl):
+            if certificate == 'news':
+                validating.set()
+                resume.wait(10)
+
+        def upload(app_id):
+            try:
+                uploader = Container().resolve(AppReleaseUploader)
+                uploader.upload(self.user, app_id, 'sign', False)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with patch.object(CertificateValidator, 'validate_certificate',
+                          side_effect=validate_certificate):
+            slow = Thread(target=upload, args=('news',))
+            slow.start()
+            self.assertTrue(validating.wait(10))
+
+            fast = Thread(target=upload, args=('mail',))
+            fast.start()
+            fast.join(10)
+            # mail must be imported while news is still being validated
+            finished_first = not fast.is_alive()
+            resume.set()
+            slow.join(10)
+            fast.join(10)
+
+        self.assertEqual([], errors)
+        self.assertTrue(finished_first)
+        self.assertTrue(AppRelease.objects.filter(app__id='mail').exists())
+        self.assertTrue(AppRelease.objects.filter(app__id='news').exists())
@@ -0,0 +1,100 @@
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from nextcloudappstore.core.api.v1.tests.api import ApiTest
+from nextcloudappstore.core.models import App, AppRelease, NextcloudRelease
+
+
+class AppUpdatesTest(ApiTest):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api:v1:app-updates', kwargs={'version': '11.0.0'})
+        self.news = App.objects.create(pk='news', owner=self.user)
+        for version, spec in (('1.0.0', '>=11.0.0,<12.0.0'),
+                              ('1.1.0', '>=11.0.0,<12.0.0'),
+                              ('1.2.0-beta', '>=11.0.0,<12.0.0'),
+                              ('2.0.0', '>=12.0.0,<13.0.0')):
+            AppRelease.objects.create(app=self.news, version=version,
+                                      platform_version_spec=spec)
+        AppRelease.objects.create(app=self.news, version='1.1.0',
+                                  platform_version_spec='>=11.0.0,<12.0.0',
+                                  is_nightly=True)
+        self.mail = App.objects.create(pk='mail', owner=self.user)
+        AppRelease.objects.create(app=self.mail, version='1.0.0',
+                                  platform_version_spec='>=11.0.0,<12.0.0')
+
+    def test_updates(self):
+        response = self._check([{'id': 'news', 'version': '1.0.0'},
+                                {'id': 'mail', 'version': '1.0.0'}])
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(1, len(data))
+        self.assertEqual('news', data[0]['id'])
+        self.assertEqual('1.0.0', data[0]['installedVersion'])
+        self.assertEqual(['1.1.0'],
+                         [r['version'] for r in data[0]['releases']])
+
+    def test_unstable_updates(self):
+        response = self._check([{'id': 'news', 'version': '1.0.0'}],
+                               unstable=True)
+        releases = response.json()[0]['releases']
+        self.assertEqual([('1.2.0-beta', False), ('1.1.0', True),
+                          ('1.1.0', False)],
+                         [(r['version'], r['isNightly']) for r in releases])
+
+    def test_up_to_date(self):
+        response = self._check([{'id': 'news', 'version': '1.1.0'},
+                                {'id': 'unknown', 'version': '1.0.0'}])
+        self.assertEqual([], response.json())
+
+    def test_indexed(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        response = self._check([{'id': 'news', 'version': '1.0.0'}])
+        releases = response.json()[0]['releases']
+        self.assertEqual(['1.1.0'], [r['version'] for r in releases])
+
+    def test_exact_platform_version(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        NextcloudRelease.objects.create(version='12.0.0')
+        AppRelease.objects.create(app=self.mail, version='1.1.0',
+                                  platform_version_spec='>=11.0.3,<12.0.0')
+        installed = [{'id': 'news', 'version': '1.1.0'},
+                     {'id': 'mail', 'version': '1.0.0'}]
+        self.assertEqual([], self._check(installed).json())
+        self.url = reverse('api:v1:app-updates', kwargs={'version': '11.0.3'})
+        data = self._check(installed).json()
+        self.assertEqual(['mail'], [app['id'] for app in data])
+        self.url = reverse('api:v1:app-updates', kwargs={'version': '13.0.0'})
+        self.assertEqual([], self._check(installed).json())
+
+    def test_queries_independent_of_catalog(self):
+        NextcloudRelease.objects.create(version='11.0.0')
+        installed = [{'id': 'news', 'version': '1.0.0'}]
+        with CaptureQueriesContext(connection) as few:
+            self._check(installed)
+        for i in range(10):
+            app = App.objects.create(pk='app%i' % i, owner=self.user)
+            AppRelease.objects.create(app=app, version='1.0.0',
+                                      platform_version_spec='>=11.0.0')
+        with CaptureQueriesContext(connection) as many:
+            self._check(installed)
+        self.assertEqual(len(few.captured_queries),
+                         len(many.captured_queries))
+
+    def test_invalid(self):
+        response = self._check([{'id': 'news', 'version': 'latest'}])
+        self.assertEqual(400, response.status_code)
+        response = self.api_client.post(self.url, {}, format='json')
+        self.assertEqual(400, response.status_code)
+
+    def test_too_many_apps(self):
+        with self.settings(UPDATE_CHECK_MAX_APPS=1):
+            response = self._check([{'id': 'news', 'version': '1.0.0'},
+                                    {'id': 'mail', 'version': '1.0.0'}])
+        self.assertEqual(400, response.status_code)
+
+    def _check(self, apps, unstable=False):
+        return self.api_client.post(self.url, {
+            'apps': apps,
+            'unstable': unstable,
+        }, format='json')
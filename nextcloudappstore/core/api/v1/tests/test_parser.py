@@ -1,5 +1,11 @@
 import json
+import os
+import tarfile
+import tempfile
 from copy import deepcopy
+from io import BytesIO
+from threading import Thread
+from unittest.mock import patch
 
 from django.test import TestCase
 from nextcloudappstore.core.api.v1.release import ReleaseConfig
@@ -7,7 +13,8 @@ from nextcloudappstore.core.api.v1.release.parser import \
     parse_app_metadata, GunZipAppMetadataExtractor, \
     InvalidAppPackageStructureException, \
     UnsupportedAppArchiveException, InvalidAppMetadataXmlException, \
-    fix_partial_translations, parse_changelog, ForbiddenLinkException
+    fix_partial_translations, parse_changelog, ForbiddenLinkException, \
+    get_metadata_pipeline, MaxSizeAppMetadataXmlException
 from nextcloudappstore.core.facades import resolve_file_relative_path, \
     read_file_contents
 from rest_framework.exceptions import ParseError
@@ -18,6 +25,41 @@ class ParserTest(TestCase):
         self.config = ReleaseConfig()
         self.maxDiff = None
 
+    def test_pipeline_is_reused(self):
+        pipeline = get_metadata_pipeline(self.config.info_schema,
+                                         self.config.pre_info_xslt,
+                                         self.config.info_xslt)
+        self.assertIs(pipeline, get_metadata_pipeline(
+            ReleaseConfig().info_schema, ReleaseConfig().pre_info_xslt,
+            ReleaseConfig().info_xslt))
+        compiled = pipeline._get_compiled()
+        xml = self._get_contents('data/infoxmls/minimal.xml')
+        pipeline.parse(xml)
+        self.assertIs(compiled, pipeline._get_compiled())
+
+    def test_pipeline_threads(self):
+        pipeline = get_metadata_pipeline(self.config.info_schema,
+                                         self.config.pre_info_xslt,
+                                         self.config.info_xslt)
+        xml = self._get_contents('data/infoxmls/full.xml')
+        expected = pipeline.parse(xml)
+        results = []
+        compiled = []
+
+        def parse():
+            for _ in range(5):
+                results.append(pipeline.parse(xml))
+            compiled.append(pipeline._get_compiled())
+
+        threads = [Thread(target=parse) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([expected] * 20, results)
+        # every thread uses its own compiled copy
+        self.assertEqual(4, len(set(map(id, compiled))))
+
     def test_parse_minimal(self):
         xml = self._get_contents('data/infoxmls/minimal.xml')
         result = parse_app_metadata(xml, self.config.info_schema,
@@ -255,6 +297,45 @@ class ParserTest(TestCase):
         with (self.assertRaises(ForbiddenLinkException)):
             extractor.extract_app_metadata(path)
 
+    def test_extract_translated_changelogs(self):
+        path = self._create_archive({
+            'news/appinfo/info.xml': b'<info/>',
+            'news/CHANGELOG.md': b'english',
+            'news/CHANGELOG.de.md': b'deutsch',
+            'news/CHANGELOG.unknown.md': b'unknown',
+            'news/l10n/CHANGELOG.fr.md': b'nested',
+        })
+        extractor = GunZipAppMetadataExtractor(self.config)
+        # members are looked up in the index instead of scanning the archive
+        with patch.object(tarfile.TarFile, 'getmember',
+                          side_effect=AssertionError):
+            info, app_id, changes = extractor.extract_app_metadata(path)
+        self.assertEqual('<info/>', info)
+        self.assertEqual({'en': 'english', 'de': 'deutsch'}, changes)
+
+    def test_extract_translated_changelog_symlink(self):
+        path = self._create_archive({
+            'news/appinfo/info.xml': b'<info/>',
+            'news/CHANGELOG.de.md': '/etc/passwd',
+        })
+        extractor = GunZipAppMetadataExtractor(self.config)
+        with (self.assertRaises(ForbiddenLinkException)):
+            extractor.extract_app_metadata(path)
+
+    def test_extract_info_at_max_size(self):
+        self.config.max_info_size = 2048
+        path = self._create_archive({'news/appinfo/info.xml': b'a' * 2048})
+        extractor = GunZipAppMetadataExtractor(self.config)
+        info, app_id, changes = extractor.extract_app_metadata(path)
+        self.assertEqual('a' * 2048, info)
+
+    def test_extract_info_above_max_size(self):
+        self.config.max_info_size = 2048
+        path = self._create_archive({'news/appinfo/info.xml': b'a' * 2049})
+        extractor = GunZipAppMetadataExtractor(self.config)
+        with (self.assertRaises(MaxSizeAppMetadataXmlException)):
+            extractor.extract_app_metadata(path)
+
     def test_extract_zip(self):
         path = self.get_path('data/archives/empty.zip')
         extractor = GunZipAppMetadataExtractor(self.config)
@@ -527,5 +608,25 @@ class ParserTest(TestCase):
         path = self.get_path(target)
         return read_file_contents(path)
 
+    def _create_archive(self, files):
+        """
+        :param files: file contents as bytes or symlink targets as str by path
+        :return: the path to the created tar.gz archive
+        """
+        fd, path = tempfile.mkstemp(suffix='.tar.gz')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with tarfile.open(path, 'w:gz') as tar:
+            for name, content in files.items():
+                member = tarfile.TarInfo(name)
+                if isinstance(content, str):
+                    member.type = tarfile.SYMTYPE
+                    member.linkname = content
+                    tar.addfile(member)
+                else:
+                    member.size = len(content)
+                    tar.addfile(member, BytesIO(content))
+        return path
+
     def get_path(self, target):
         return resolve_file_relative_path(__file__, target)
@@ -1,15 +1,22 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory
 from nextcloudappstore.core.api.v1.release import ReleaseConfig
 from nextcloudappstore.core.api.v1.release.importer import AppImporter
 from nextcloudappstore.core.api.v1.release.parser import parse_app_metadata
+from nextcloudappstore.core.caching import apps_etag
 from nextcloudappstore.core.facades import read_relative_file
-from nextcloudappstore.core.models import App, Screenshot, Database
+from nextcloudappstore.core.models import App, Screenshot, Database, \
+    AppRelease
+from nextcloudappstore.core.versioning import version_key, MAX_VERSION_KEY
 from pymple import Container
 
 
 class ImporterTest(TestCase):
     def setUp(self):
+        # translations cached by previous tests would be compared
+        cache.clear()
         container = Container()
         self.importer = container.resolve(AppImporter)
         self.config = ReleaseConfig()
@@ -63,6 +70,10 @@ class ImporterTest(TestCase):
         self.assertEqual('*', release.php_version_spec)
         self.assertEqual('>=9,<=9', release.raw_platform_version_spec)
         self.assertEqual('*', release.raw_php_version_spec)
+        self.assertEqual(version_key('9.0.0'),
+                         release.platform_version_min_key)
+        self.assertEqual(version_key('10.0.0'),
+                         release.platform_version_max_key)
         self.assertEqual(32, release.min_int_size)
         self._assert_all_empty(release, ['signature', 'download'])
         self.assertEqual(0, release.php_extensions.count())
@@ -111,8 +122,11 @@ class ImporterTest(TestCase):
                 self.assertEqual('*',
                                  db.releasedependencies.get().raw_version_spec)
             elif db.id == 'pgsql':
-                self.assertEqual('>=9.4.0',
-                                 db.releasedependencies.get().version_spec)
+                dependency = db.releasedependencies.get()
+                self.assertEqual('>=9.4.0', dependency.version_spec)
+                self.assertEqual(version_key('9.4.0'),
+                                 dependency.version_min_key)
+                self.assertEqual(MAX_VERSION_KEY, dependency.version_max_key)
                 self.assertEqual('>=9.4',
                                  db.releasedependencies.get().raw_version_spec)
             elif db.id == 'mysql':
@@ -222,6 +236,136 @@ class ImporterTest(TestCase):
         app = App.objects.get(pk='news')
         self.assertEqual('https://website.com', app.website)
 
+    def test_full_query_count(self):
+        Database.objects.create(id='sqlite')
+        Database.objects.create(id='pgsql')
+        Database.objects.create(id='mysql')
+        result = parse_app_metadata(self.full, self.config.info_schema,
+                                    self.config.pre_info_xslt,
+                                    self.config.info_xslt)
+        # authors can only be inserted at once if the database returns the
+        # created ids, otherwise each of the 3 authors needs one query
+        if connection.features.can_return_ids_from_bulk_insert:
+            queries = 53
+        else:
+            queries = 55
+        with self.assertNumQueries(queries):
+            self.importer.import_data('app', result['app'], None)
+
+    def test_reimport_unchanged(self):
+        Database.objects.create(id='sqlite')
+        Database.objects.create(id='pgsql')
+        Database.objects.create(id='mysql')
+        summary = self.importer.import_data('app', self._parse_full(), None)
+        self.assertTrue(summary.changes['release'].created)
+        app = App.objects.get(pk='news')
+        release = AppRelease.objects.get(app=app)
+        screenshots = list(app.screenshots.values_list('pk', flat=True))
+        authors = list(app.authors.values_list('pk', flat=True))
+        etag = apps_etag(RequestFactory().get('/'), '9.0.0')
+
+        summary = self.importer.import_data('app', self._parse_full(), None)
+        self.assertFalse(summary)
+        self.assertEqual({'created': False, 'changed': []}, summary.as_dict())
+        self.assertEqual(etag, apps_etag(RequestFactory().get('/'), '9.0.0'))
+        self.assertEqual(app.last_modified,
+                         App.objects.get(pk='news').last_modified)
+        self.assertEqual(app.last_release,
+                         App.objects.get(pk='news').last_release)
+        self.assertEqual(release.last_modified,
+                         AppRelease.objects.get(app=app).last_modified)
+        self.assertEqual(screenshots,
+                         list(app.screenshots.values_list('pk', flat=True)))
+        self.assertEqual(authors,
+                         list(app.authors.values_list('pk', flat=True)))
+
+    def test_reimport_changed(self):
+        Database.objects.create(id='sqlite')
+        Database.objects.create(id='pgsql')
+        Database.objects.create(id='mysql')
+        self.importer.import_data('app', self._parse_full(), None)
+        app = App.objects.get(pk='news')
+        kept = app.screenshots.get(ordering=1)
+
+        result = self._parse_full()
+        result['website'] = 'https://example.com'
+        result['description']['de'] = 'Neue Beschreibung'
+        result['screenshots'] = result['screenshots'][:1]
+        release = result['release']
+        release['php_extensions'] = release['php_extensions'][:2]
+        release['min_int_size'] = 32
+        summary = self.importer.import_data('app', result, None).as_dict()
+        self.assertEqual({'website', 'description', 'screenshots', 'release'},
+                         set(summary['changed']))
+        self.assertFalse(summary['release']['created'])
+        self.assertEqual({'php_extensions', 'min_int_size'},
+                         set(summary['release']['changed']))
+
+        app = App.objects.get(pk='news')
+        self.assertEqual('https://example.com', app.website)
+        app.set_current_language('de')
+        self.assertEqual('Neue Beschreibung', app.description)
+        self.assertEqual('Nachrichten', app.name)
+        self.assertEqual([kept.pk],
+                         list(app.screenshots.values_list('pk', flat=True)))
+        release = app.releases.get()
+        self.assertEqual(32, release.min_int_size)
+        self.assertEqual(2, release.php_extensions.count())
+        self.assertEqual(3, release.databases.count())
+
+    def test_reimport_removed_language(self):
+        Database.objects.create(id='sqlite')
+        Database.objects.create(id='pgsql')
+        Database.objects.create(id='mysql')
+        self.importer.import_data('app', self._parse_full(), None)
+        result = self._parse_full()
+        for field in ['name', 'summary', 'description']:
+            del result[field]['de']
+        summary = self.importer.import_data('app', result, None)
+        self.assertEqual(['languages'], summary.as_dict()['changed'])
+        app = App.objects.get(pk='news')
+        self.assertEqual(['en'], list(app.get_available_languages()))
+
+    def test_reimport_changed_authors(self):
+        def change(result):
+            result['authors'][0]['author']['name'] = 'Someone Else'
+
+        self._assert_reimport_saves_app(change, 'authors')
+
+    def test_reimport_changed_categories(self):
+        def change(result):
+            result['categories'] = result['categories'][:1]
+
+        self._assert_reimport_saves_app(change, 'categories')
+
+    def test_reimport_changed_screenshots(self):
+        def change(result):
+            result['screenshots'] = result['screenshots'][:1]
+
+        self._assert_reimport_saves_app(change, 'screenshots')
+
+    def _assert_reimport_saves_app(self, change, key):
+        Database.objects.create(id='sqlite')
+        Database.objects.create(id='pgsql')
+        Database.objects.create(id='mysql')
+        self.importer.import_data('app', self._parse_full(), None)
+        last_modified = App.objects.get(pk='news').last_modified
+        etag = apps_etag(RequestFactory().get('/'), '9.0.0')
+
+        result = self._parse_full()
+        change(result)
+        summary = self.importer.import_data('app', result, None)
+        self.assertEqual([key], summary.as_dict()['changed'])
+        self.assertNotEqual(etag, apps_etag(RequestFactory().get('/'),
+                                            '9.0.0'))
+        self.assertLess(last_modified,
+                        App.objects.get(pk='news').last_modified)
+
+    def _parse_full(self):
+        return parse_app_metadata(self.full, self.config.info_schema,
+                                  self.config.pre_info_xslt,
+                                  self.config.info_xslt)['app']
+
     def _assert_all_empty(self, obj, attribs):
         for attrib in attribs:
             self.assertEqual('', getattr(obj, attrib), attrib)
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.store import ReleaseMetadataStore
+from nextcloudappstore.core.models import AppReleaseMetadata
+
+
+def get_info(app_id, description=''):
+    return {'app': {'id': app_id, 'description': {'en': description},
+                    'release': {'version': '1.0.0'}}}
+
+
+class ReleaseMetadataStoreTest(TestCase):
+    def setUp(self):
+        self.store = ReleaseMetadataStore(ReleaseConfig())
+
+    def test_get(self):
+        self.assertIsNone(self.store.get(b'digest', False))
+        self.store.put(b'digest', False, get_info('news'))
+        self.assertEqual(get_info('news'), self.store.get(b'digest', False))
+        self.assertIsNone(self.store.get(b'digest', True))
+        self.assertIsNone(self.store.get(b'other', False))
+
+        entry = AppReleaseMetadata.objects.get()
+        self.assertEqual(b'digest'.hex(), entry.digest)
+        self.assertEqual('news', entry.app_id)
+        self.assertEqual('1.0.0', entry.version)
+        self.assertEqual(1, entry.hits)
+
+    def test_parser_changed(self):
+        self.store.put(b'digest', False, get_info('news'))
+        self.store.parser = 'changed'
+        self.assertIsNone(self.store.get(b'digest', False))
+
+    def test_evict_least_recently_used(self):
+        self.store.put(b'first', False, get_info('news', 'x' * 100))
+        size = AppReleaseMetadata.objects.total_size()
+        self.store.max_size = size * 2
+        self.store.put(b'second', False, get_info('news', 'x' * 100))
+        AppReleaseMetadata.objects.filter(digest=b'second'.hex()).update(
+            last_used=timezone.now() - timedelta(days=1))
+        self.store.put(b'third', False, get_info('news', 'x' * 100))
+
+        self.assertIsNone(self.store.get(b'second', False))
+        self.assertIsNotNone(self.store.get(b'first', False))
+        self.assertIsNotNone(self.store.get(b'third', False))
+        self.assertLessEqual(AppReleaseMetadata.objects.total_size(),
+                             self.store.max_size)
+
+    def test_too_big(self):
+        self.store.max_size = 10
+        self.store.put(b'digest', False, get_info('news'))
+        self.assertFalse(AppReleaseMetadata.objects.exists())
+
+    def test_command(self):
+        self.store.put(b'first', False, get_info('first'))
+        self.store.put(b'second', False, get_info('second'))
+        AppReleaseMetadata.objects.filter(digest=b'first'.hex()).update(
+            last_used=timezone.now() - timedelta(days=1))
+
+        out = StringIO()
+        call_command('releasemetadata', '--list', stdout=out)
+        self.assertIn('2 entries', out.getvalue())
+        self.assertIn(b'first'.hex(), out.getvalue())
+
+        size = AppReleaseMetadata.objects.get(digest=b'second'.hex()).size
+        out = StringIO()
+        call_command('releasemetadata', '--prune', '--max-size', str(size),
+                     stdout=out)
+        self.assertIn('Deleted 1 entries', out.getvalue())
+        self.assertEqual(['second'], list(
+            AppReleaseMetadata.objects.values_list('app_id', flat=True)))
+
+        call_command('releasemetadata', '--clear', stdout=StringIO())
+        self.assertFalse(AppReleaseMetadata.objects.exists())
@@ -0,0 +1,185 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase, override_settings
+
+from nextcloudappstore.core.api.v1.release.metrics import UploadMetrics, \
+    get_histograms, DURATION_BUCKETS, QueryCounter
+from nextcloudappstore.core.api.v1.release.provider import \
+    AppReleaseProvider, Release
+from nextcloudappstore.core.api.v1.tests.api import ApiTest
+from nextcloudappstore.core.models import App
+
+
+def get_stage(histograms, name):
+    return next(stage for stage in histograms if stage['name'] == name)
+
+
+class UploadMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_measure(self):
+        metrics = UploadMetrics()
+        with metrics.measure('download') as stage:
+            stage.bytes += 10
+            App.objects.exists()
+        with metrics.measure('parse'):
+            pass
+        with metrics.measure('download') as stage:
+            stage.bytes += 5
+        self.assertEqual(['download', 'parse'], list(metrics.stages))
+        self.assertEqual(15, metrics.stages['download'].bytes)
+        self.assertEqual(1, metrics.stages['download'].queries)
+        self.assertEqual(0, metrics.stages['parse'].queries)
+        self.assertGreater(metrics.stages['download'].duration, 0)
+
+    def test_measure_without_debug_cursor(self):
+        metrics = UploadMetrics()
+        with metrics.measure('import'):
+            self.assertFalse(connection.queries_logged)
+            App.objects.exists()
+            list(App.objects.all())
+        self.assertEqual(2, metrics.stages['import'].queries)
+        self.assertEqual(0, len(connection.queries_log))
+        # the connection is restored
+        App.objects.exists()
+        self.assertEqual(2, metrics.stages['import'].queries)
+
+    def test_nested_query_counters(self):
+        with QueryCounter() as outer:
+            with QueryCounter() as inner:
+                App.objects.exists()
+            App.objects.exists()
+        App.objects.exists()
+        self.assertEqual(1, inner.count)
+        self.assertEqual(2, outer.count)
+        self.assertNotIn('cursor', vars(connections[DEFAULT_DB_ALIAS]))
+
+    def test_keeps_replaced_cursor(self):
+        db = connections[DEFAULT_DB_ALIAS]
+        cursor = MagicMock(wraps=db.cursor)
+        db.cursor = cursor
+        try:
+            with QueryCounter() as queries:
+                App.objects.exists()
+            self.assertIs(cursor, db.cursor)
+        finally:
+            del db.cursor
+        self.assertEqual(1, queries.count)
+        self.assertEqual(1, cursor.call_count)
+
+    def test_measure_failure(self):
+        metrics = UploadMetrics()
+        with self.assertRaises(ValueError):
+            with metrics.measure('download'):
+                raise ValueError()
+        self.assertIn('download', metrics.stages)
+
+    def test_server_timing(self):
+        metrics = UploadMetrics()
+        with metrics.measure('download') as stage:
+            stage.bytes = 1024
+        metrics.stages['download'].duration = 0.25
+        with metrics.measure('import'):
+            pass
+        metrics.stages['import'].duration = 0.0015
+        self.assertEqual('download;dur=250.0;desc="1024 bytes, 0 queries", '
+                         'import;dur=1.5;desc="0 bytes, 0 queries"',
+                         metrics.server_timing())
+
+    def test_record(self):
+        with self.assertLogs('nextcloudappstore.core.api.v1.release.metrics',
+                             'INFO') as logs:
+            for duration in (0.005, 0.3, 100):
+                metrics = UploadMetrics()
+                with metrics.measure('download') as stage:
+                    stage.bytes = 100
+                metrics.stages['download'].duration = duration
+                metrics.record('https://download.com', 201, 'news', '1.0.0')
+
+        self.assertEqual(['INFO', 'INFO', 'WARNING'],
+                         [record.levelname for record in logs.records])
+        message = logs.records[-1].getMessage()
+        data = json.loads(message[message.index('{'):])
+        self.assertEqual('news', data['app_id'])
+        self.assertEqual(201, data['status'])
+        self.assertEqual([{'name': 'download', 'duration': 100,
+                           'bytes': 100, 'queries': 0}], data['stages'])
+
+        histograms = get_histograms()
+        download = get_stage(histograms, 'download')
+        self.assertEqual(3, download['count'])
+        self.assertEqual(300, download['bytes'])
+        self.assertAlmostEqual(100.305, download['duration'])
+        self.assertEqual(len(DURATION_BUCKETS) + 1, len(download['buckets']))
+        self.assertEqual({'le': 0.01, 'count': 1}, download['buckets'][0])
+        self.assertEqual({'le': 0.5, 'count': 2}, download['buckets'][4])
+        self.assertEqual({'le': None, 'count': 3}, download['buckets'][-1])
+        self.assertEqual(3, get_stage(histograms, 'total')['count'])
+        self.assertEqual(0, get_stage(histograms, 'import')['count'])
+
+
+@override_settings(VALIDATE_CERTIFICATES=False)
+class UploadMetricsApiTest(ApiTest):
+    create_url = reverse('api:v1:app-release-create')
+    metrics_url = reverse('api:v1:app-release-metrics')
+    app_args = {'app': {'id': 'news', 'release': {
+        'version': '9.0.0',
+        'platform_min_version': '9.0.0',
+        'raw_platform_min_version': '9.0.0',
+        'platform_max_version': '*',
+        'raw_platform_max_version': '*',
+        'php_min_version': '5.6.0',
+        'raw_php_min_version': '5.6.0',
+        'php_max_version': '*',
+        'raw_php_max_version': '*',
+    }}}
+
+    def _upload(self):
+        self._login()
+        return self.api_client.post(self.create_url, data={
+            'download': 'https://download.com',
+            'signature': 'sign',
+        }, format='json')
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_server_timing(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        App.objects.create(id='news', owner=self.user)
+        response = self._upload()
+        self.assertEqual(201, response.status_code)
+        timing = response['Server-Timing']
+        for stage in ('permission', 'validation', 'import'):
+            self.assertIn('%s;dur=' % stage, timing)
+        self.assertEqual(1, get_stage(get_histograms(), 'import')['count'])
+
+    @patch.object(AppReleaseProvider, 'get_release_info')
+    def test_server_timing_failure(self, get_release_info):
+        get_release_info.return_value = Release(self.app_args, {}, None, True)
+        response = self._upload()
+        self.assertEqual(400, response.status_code)
+        self.assertIn('permission;dur=', response['Server-Timing'])
+        self.assertEqual(1, get_stage(get_histograms(), 'total')['count'])
+
+    def test_metrics_staff_only(self):
+        self._login()
+        response = self.api_client.get(self.metrics_url)
+        self.assertEqual(403, response.status_code)
+
+    def test_metrics(self):
+        self.user.is_staff = True
+        self.user.save()
+        UploadMetrics().record('https://download.com', 201)
+        self._login()
+        response = self.api_client.get(self.metrics_url)
+        self.assertEqual(200, response.status_code)
+        total = get_stage(response.data['stages'], 'total')
+        self.assertEqual(1, total['count'])
+
+        response = self.api_client.delete(self.metrics_url)
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(0, get_stage(get_histograms(), 'total')['count'])
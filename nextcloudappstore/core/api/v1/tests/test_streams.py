@@ -0,0 +1,62 @@
+from io import BytesIO
+
+from django.test import TestCase
+
+from nextcloudappstore.core.api.v1.release.streams import iter_bounded, \
+    read_bounded, SizeLimitExceededException
+
+
+class CountingReader(BytesIO):
+    def __init__(self, content):
+        super().__init__(content)
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+class StreamsTest(TestCase):
+    def test_read_below_limit(self):
+        self.assertEqual(b'a' * 99, read_bounded(BytesIO(b'a' * 99), 100))
+
+    def test_read_at_limit(self):
+        self.assertEqual(b'a' * 100, read_bounded(BytesIO(b'a' * 100), 100))
+
+    def test_read_above_limit(self):
+        with self.assertRaises(SizeLimitExceededException):
+            read_bounded(BytesIO(b'a' * 101), 100)
+
+    def test_read_empty(self):
+        self.assertEqual(b'', read_bounded(BytesIO(b''), 100))
+        self.assertEqual(b'', read_bounded(BytesIO(b''), 0))
+        with self.assertRaises(SizeLimitExceededException):
+            read_bounded(BytesIO(b'a'), 0)
+
+    def test_read_chunk_sizes(self):
+        content = bytes(range(256)) * 4
+        for chunk_size in (1, 3, 7, 1024, 1025, 4096):
+            self.assertEqual(content, read_bounded(BytesIO(content), 1024,
+                                                   chunk_size))
+            with self.assertRaises(SizeLimitExceededException):
+                read_bounded(BytesIO(content), 1023, chunk_size)
+
+    def test_read_stops_after_limit(self):
+        reader = CountingReader(b'a' * 10000)
+        with self.assertRaises(SizeLimitExceededException):
+            read_bounded(reader, 100, 64)
+        self.assertEqual(101, reader.read_bytes)
+
+    def test_iter_at_limit(self):
+        chunks = [b'a' * 40, b'b' * 40, b'c' * 20]
+        self.assertEqual(chunks, list(iter_bounded(chunks, 100)))
+
+    def test_iter_above_limit(self):
+        chunks = [b'a' * 40, b'b' * 40, b'c' * 21]
+        result = []
+        with self.assertRaises(SizeLimitExceededException):
+            for chunk in iter_bounded(chunks, 100):
+                result.append(chunk)
+        # the chunk which exceeds the limit is never passed on
+        self.assertEqual(chunks[:2], result)
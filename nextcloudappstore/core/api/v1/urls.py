@@ -2,7 +2,8 @@ from django.conf.urls import url
 from django.views.decorators.http import etag
 from nextcloudappstore.core.api.v1.views import AppView, AppReleaseView, \
     CategoryView, SessionObtainAuthToken, RegenerateAuthToken, AppRatingView, \
-    AppRegisterView
+    AppRegisterView, AppChangesView, AppUpdatesView, AppReleaseJobView, \
+    AppReleaseBatchView, AppReleaseMetricsView
 from nextcloudappstore.core.caching import app_ratings_etag, categories_etag, \
     apps_etag
 from nextcloudappstore.core.versioning import SEMVER_REGEX
@@ -10,8 +11,18 @@ from nextcloudappstore.core.versioning import SEMVER_REGEX
 urlpatterns = [
     url(r'^platform/(?P<version>\d+\.\d+\.\d+)/apps\.json$',
         etag(apps_etag)(AppView.as_view()), name='app'),
+    url(r'^platform/(?P<version>\d+\.\d+\.\d+)/apps/changes\.json$',
+        AppChangesView.as_view(), name='app-changes'),
+    url(r'^platform/(?P<version>\d+\.\d+\.\d+)/apps/updates\.json$',
+        AppUpdatesView.as_view(), name='app-updates'),
     url(r'^apps/releases/?$', AppReleaseView.as_view(),
         name='app-release-create'),
+    url(r'^apps/releases/batch/?$', AppReleaseBatchView.as_view(),
+        name='app-release-batch'),
+    url(r'^apps/releases/metrics\.json$', AppReleaseMetricsView.as_view(),
+        name='app-release-metrics'),
+    url(r'^apps/releases/jobs/(?P<pk>[0-9a-f-]+)/?$',
+        AppReleaseJobView.as_view(), name='app-release-job'),
     url(r'^apps/?$', AppRegisterView.as_view(), name='app-register'),
     url(r'^apps/(?P<pk>[a-z0-9_]+)/?$', AppView.as_view(), name='app-delete'),
     url(r'^ratings.json$',
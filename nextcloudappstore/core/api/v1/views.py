@@ -1,42 +1,92 @@
+import logging
+from datetime import timedelta
+
 import requests
-from django.db import transaction
-from django.http import Http404
+from django.db.models import Q
+from django.core.urlresolvers import reverse
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
-from requests import HTTPError
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
 from pymple import Container
 from rest_framework import authentication, parsers, renderers  # type: ignore
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.generics import DestroyAPIView, \
-    get_object_or_404, ListAPIView  # type: ignore
-from rest_framework.permissions import IsAuthenticated  # type: ignore
+    get_object_or_404, ListAPIView, RetrieveAPIView  # type: ignore
+from rest_framework.permissions import IsAuthenticated, \
+    IsAdminUser  # type: ignore
 from rest_framework.response import Response  # type: ignore
 from rest_framework.views import APIView
-from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.exceptions import ValidationError, PermissionDenied, \
+    APIException, Throttled
 
-from nextcloudappstore.core.api.v1.release.importer import AppImporter
-from nextcloudappstore.core.api.v1.release.provider import AppReleaseProvider
+from nextcloudappstore.core.api.v1.release.metrics import UploadMetrics, \
+    get_histograms, reset_histograms
+from nextcloudappstore.core.api.v1.release.uploader import \
+    AppReleaseUploader, error_body, upload_status
 from nextcloudappstore.core.api.v1.serializers import AppSerializer, \
     AppReleaseDownloadSerializer, CategorySerializer, AppRatingSerializer, \
-    AppRegisterSerializer
+    AppRegisterSerializer, AppReleaseSerializer, AppUpdateCheckSerializer, \
+    AppReleaseJobSerializer, AppReleaseBatchSerializer
+from nextcloudappstore.core.caching import apps_etag, get_snapshot, \
+    snapshot_response, categories_etag, app_ratings_etag, \
+    get_platform_versions, parse_apps_selection, apps_selection_key, \
+    APPS_SELECTION_PARAMS
 from nextcloudappstore.core.certificate.validator import CertificateValidator
 from nextcloudappstore.core.facades import read_file_contents
-from nextcloudappstore.core.models import App, AppRelease, Category, AppRating
+from nextcloudappstore.core.generations import generation_time
+from nextcloudappstore.core.models import App, AppRelease, Category, \
+    AppRating, NextcloudRelease, AppReleaseDeleteLog, AppReleaseJob
 from nextcloudappstore.core.permissions import UpdateDeletePermission
 from nextcloudappstore.core.throttling import PostThrottle
+from nextcloudappstore.core.versioning import nearest_version
+
+logger = logging.getLogger(__name__)
+
+ETAG_CURSOR_MARGIN = timedelta(minutes=1)
+
+
+class SnapshotMixin:
+    """Serves rendered JSON from a cached snapshot which is only rendered and
+    compressed again once the etag changes"""
+
+    def get_snapshot_response(self, request, key, etag, get_data):
+        def render():
+            return CamelCaseJSONRenderer().render(get_data())
+
+        snapshot = get_snapshot(key, etag, render)
+        return snapshot_response(request, snapshot, 'application/json')
 
 
-class CategoryView(ListAPIView):
+class CategoryView(SnapshotMixin, ListAPIView):
     queryset = Category.objects.prefetch_related('translations').all()
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        def get_data():
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_serializer(queryset, many=True).data
 
-class AppRatingView(ListAPIView):
+        return self.get_snapshot_response(request, 'categories',
+                                          categories_etag(request), get_data)
+
+
+class AppRatingView(SnapshotMixin, ListAPIView):
     queryset = AppRating.objects.all()
     serializer_class = AppRatingSerializer
 
+    def list(self, request, *args, **kwargs):
+        def get_data():
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_serializer(queryset, many=True).data
+
+        return self.get_snapshot_response(request, 'ratings',
+                                          app_ratings_etag(request), get_data)
 
-class AppView(DestroyAPIView):
+
+class AppView(SnapshotMixin, DestroyAPIView):
     authentication_classes = (authentication.TokenAuthentication,
                               authentication.BasicAuthentication,)
     permission_classes = (UpdateDeletePermission,)
@@ -44,11 +94,201 @@ class AppView(DestroyAPIView):
     queryset = App.objects.all()
 
     def get(self, request, *args, **kwargs):
-        version = self.kwargs['version']
-        working_apps = App.objects.get_compatible(version)
-        serializer = self.get_serializer(working_apps, many=True,
-                                         version=version)
-        return Response(serializer.data)
+        """
+        Serves a pre-rendered snapshot of the apps list. Snapshots are keyed
+        by the nearest known Nextcloud release of the same series so clients
+        running the same platform version share one rendered document which
+        is only rendered again once the etag changes. If APPS_JSON_STREAMING
+        is enabled, the list is rendered in chunks on every request instead.
+        Clients can restrict the output to some languages and fields, every
+        combination is kept in its own snapshot
+        """
+        version = nearest_version(self.kwargs['version'],
+                                  get_platform_versions())
+        selection = self._get_selection(request)
+        if settings.APPS_JSON_STREAMING:
+            return StreamingHttpResponse(self._stream_apps(version, selection),
+                                         content_type='application/json')
+
+        def get_data():
+            working_apps = App.objects.get_compatible(
+                version, languages=selection['languages'])
+            return self.get_serializer(
+                working_apps, many=True, version=version,
+                fields=selection['fields'],
+                release_fields=selection['release_fields']).data
+
+        key = 'apps:%s' % version
+        selected = apps_selection_key(selection)
+        if selected:
+            key += ':' + selected
+        return self.get_snapshot_response(request, key,
+                                          apps_etag(request, version),
+                                          get_data)
+
+    def _get_selection(self, request):
+        """
+        Parses and validates the optional languages, fields and
+        releaseFields query parameters. The fallback languages are always
+        selected so apps without the requested languages still return
+        their translations
+        :param request: the request
+        :raises ValidationError: if an unknown language or field or too many
+                                 languages were selected
+        :return: a dict with the sorted selected values or None if all
+                 values are selected
+        """
+        known_values = {
+            'languages': [code for code, name in settings.LANGUAGES],
+            'fields': AppSerializer.Meta.fields,
+            'release_fields': AppReleaseSerializer.Meta.fields,
+        }
+        selection = parse_apps_selection(request.query_params)
+        for param, name in APPS_SELECTION_PARAMS:
+            values = selection[name]
+            if values is None:
+                continue
+            if name == 'languages' and \
+                    len(values) > settings.APPS_JSON_MAX_LANGUAGES:
+                msg = 'At most %i languages can be selected' % \
+                      settings.APPS_JSON_MAX_LANGUAGES
+                raise ValidationError({param: msg})
+            unknown = values - set(known_values[name])
+            if unknown:
+                kind = name if name == 'languages' else 'fields'
+                msg = 'Unknown %s: %s' % (kind, ', '.join(sorted(unknown)))
+                raise ValidationError({param: msg})
+            if name == 'languages':
+                values |= set(settings.PARLER_LANGUAGES['default'][
+                    'fallbacks'])
+            selection[name] = tuple(sorted(values))
+        return selection
+
+    def _stream_apps(self, version, selection):
+        """
+        Renders the apps list chunk by chunk. The output is identical to the
+        rendered snapshot
+        :param version: the platform version
+        :param selection: the selected languages and fields
+        :return: a generator of JSON fragments
+        """
+        renderer = CamelCaseJSONRenderer()
+        chunk_size = settings.APPS_JSON_STREAMING_CHUNK_SIZE
+        separator = b''
+        yield b'['
+        for apps in App.objects.iter_compatible(
+                version, chunk_size=chunk_size,
+                languages=selection['languages']):
+            fragments = []
+            for app in apps:
+                data = self.get_serializer(
+                    app, version=version, fields=selection['fields'],
+                    release_fields=selection['release_fields']).data
+                fragments.append(renderer.render(data))
+            yield separator + b','.join(fragments)
+            separator = b','
+        yield b']'
+
+
+class AppChangesView(APIView):
+    """
+    Returns the changes of the apps list since a cursor which was returned by
+    a previous request. Apps whose data or compatible releases changed are
+    returned in full, apps which were deleted or are no longer compatible are
+    listed by id and deleted releases are listed by app id and version.
+    Without a cursor all compatible apps are returned. Like for the apps
+    list, platform versions are only mapped onto known releases of the same
+    series
+    """
+
+    def get(self, request, version):
+        version = NextcloudRelease.objects.get_nearest(version)
+        cursor = timezone.now()
+        since = self._parse_since(request.query_params.get('since'))
+
+        removed_apps = set()
+        removed_releases = []
+        if since is None:
+            apps = App.objects.get_compatible(version)
+        else:
+            changed = set(App.objects.filter(
+                Q(last_release__gte=since) | Q(last_modified__gte=since)
+            ).values_list('id', flat=True))
+            changed |= set(AppRelease.objects.filter(
+                last_modified__gte=since).values_list('app_id', flat=True))
+            for deletion in AppReleaseDeleteLog.objects.since(since):
+                if deletion.is_app_deletion:
+                    removed_apps.add(deletion.app_id)
+                else:
+                    changed.add(deletion.app_id)
+                    removed_releases.append(deletion)
+            apps = App.objects.get_compatible(version, app_ids=changed)
+            removed_apps |= changed
+            removed_apps -= {app.id for app in apps}
+
+        serializer = AppSerializer(apps, many=True, version=version)
+        return Response({
+            'cursor': cursor,
+            'apps': serializer.data,
+            'removed_apps': sorted(removed_apps),
+            'removed_releases': [{
+                'app': deletion.app_id,
+                'version': deletion.version,
+                'is_nightly': deletion.is_nightly,
+            } for deletion in removed_releases],
+        })
+
+    def _parse_since(self, value):
+        """
+        Parses the cursor, which is a timestamp. The etag of a previously
+        fetched apps.json is accepted as well
+        :param value: the cursor or None
+        :raises ValidationError: if the cursor is not a valid timestamp
+        :return: the timestamp or None if no cursor was given
+        """
+        if not value:
+            return None
+        value = value.strip('"')
+        # etags of selected representations end with the selection's hash
+        generations = value.split(':')[0].split('-')
+        if all(generation.isdigit() for generation in generations):
+            # documents may miss changes which were committed shortly after
+            # the generation was bumped
+            since = generation_time(max(map(int, generations)))
+            return since - ETAG_CURSOR_MARGIN
+        try:
+            since = parse_datetime(value)
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({'since': 'Invalid cursor %s' % value})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.utc)
+        return since
+
+
+class AppUpdatesView(APIView):
+    """
+    Returns the newer compatible releases of the installed apps of a
+    Nextcloud server. Only the releases of the installed apps are queried so
+    the cost does not depend on the size of the catalog
+    """
+
+    def post(self, request, version):
+        serializer = AppUpdateCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        installed = {app['id']: app['version']
+                     for app in serializer.validated_data['apps']}
+        unstable = serializer.validated_data['unstable']
+        updates = App.objects.get_updates(version, installed, unstable)
+
+        release_serializer = AppReleaseSerializer(read_only=True)
+        return Response([{
+            'id': app_id,
+            'installed_version': installed[app_id],
+            'releases': [release_serializer.to_representation(release)
+                         for release in releases],
+        } for app_id, releases in updates.items()])
 
 
 class AppRegisterView(APIView):
@@ -130,71 +370,48 @@ class AppReleaseView(DestroyAPIView):
     permission_classes = (UpdateDeletePermission, IsAuthenticated)
     throttle_classes = (PostThrottle,)
     throttle_scope = 'app_upload'
+    # metrics of a synchronous upload which are sent in the response
+    metrics = None
 
     def post(self, request):
         serializer = AppReleaseDownloadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        with(transaction.atomic()):
-            url = serializer.validated_data['download']
-            signature = serializer.validated_data['signature']
-            is_nightly = serializer.validated_data['nightly']
-
-            # download the latest release and create or update the models
-            container = Container()
-            provider = container.resolve(AppReleaseProvider)
-            try:
-                info, data = provider.get_release_info(url, is_nightly)
-            except HTTPError as e:
-                raise ValidationError(e)
-
-            # populate metadata from request
-            info['app']['release']['signature'] = signature
-            info['app']['release']['download'] = url
-
-            app_id = info['app']['id']
-            version = info['app']['release']['version']
-
-            status, app = self._check_permission(request, app_id, version,
-                                                 is_nightly)
-
-            # verify certs and signature
-            validator = container.resolve(CertificateValidator)
-            chain = read_file_contents(settings.NEXTCLOUD_CERTIFICATE_LOCATION)
-            crl = read_file_contents(settings.NEXTCLOUD_CRL_LOCATION)
-            if settings.VALIDATE_CERTIFICATES:
-                validator.validate_certificate(app.certificate, chain, crl)
-                validator.validate_signature(app.certificate, signature, data)
-                validator.validate_app_id(app.certificate, app_id)
-
-            importer = container.resolve(AppImporter)
-            importer.import_data('app', info['app'], None)
-        return Response(status=status)
-
-    def _check_permission(self, request, app_id, version, is_nightly):
-        try:
-            app = App.objects.get(pk=app_id)
-        except App.DoesNotExist:
-            raise ValidationError('App %s does not exist, you need to register'
-                                  'it first' % app_id)
-
-        # if an app release does not exist, it must be checked if the
-        # user is allowed to create it first
-        try:
-            release = AppRelease.objects.filter(version=version, app=app,
-                                                is_nightly=is_nightly)
-            release = get_object_or_404(release)
-            self.check_object_permissions(self.request, release)
-            status = 200
-        except Http404:
-            release = AppRelease()
-            release.version = version
-            release.app = app
-            release.is_nightly = is_nightly
-            self.check_object_permissions(request, release)
-            release.save()
-            status = 201
-
-        return status, app
+        url = serializer.validated_data['download']
+        signature = serializer.validated_data['signature']
+        is_nightly = serializer.validated_data['nightly']
+
+        if settings.RELEASE_UPLOAD_ASYNC and self._prefers_async(request):
+            job = AppReleaseJob.objects.create(owner=request.user,
+                                               download=url,
+                                               signature=signature,
+                                               is_nightly=is_nightly)
+            job_url = request.build_absolute_uri(
+                reverse('api:v1:app-release-job', kwargs={'pk': job.pk}))
+            response = Response({'id': job.pk, 'url': job_url}, status=202)
+            response['Location'] = job_url
+            response['Preference-Applied'] = 'respond-async'
+            return response
+
+        # download the latest release and create or update the models
+        uploader = Container().resolve(AppReleaseUploader)
+        self.metrics = UploadMetrics()
+        result = uploader.upload(request.user, url, signature, is_nightly,
+                                 metrics=self.metrics)
+        return Response(result.changes, status=result.status)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        # failed uploads are timed as well
+        if self.metrics is not None:
+            response['Server-Timing'] = self.metrics.server_timing()
+        return response
+
+    def _prefers_async(self, request):
+        header = request.META.get('HTTP_PREFER', '')
+        preferences = [value.split(';')[0].strip().lower()
+                       for value in header.split(',')]
+        return 'respond-async' in preferences
 
     def get_object(self):
         is_nightly = self.kwargs['nightly'] is not None
@@ -206,6 +423,85 @@ class AppReleaseView(DestroyAPIView):
         return release
 
 
+class AppReleaseBatchView(APIView):
+    """Uploads several releases at once. Every release is throttled and
+    permission checked like an upload to AppReleaseView"""
+    authentication_classes = (authentication.TokenAuthentication,
+                              authentication.BasicAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    # each release counts as one upload, see post
+    throttle_classes = ()
+    throttle_scope = 'app_upload'
+
+    def post(self, request):
+        serializer = AppReleaseBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        releases = serializer.validated_data['releases']
+
+        results = [None] * len(releases)
+        accepted = []
+        throttle = PostThrottle()
+        for index, release in enumerate(releases):
+            if throttle.allow_request(request, self):
+                accepted.append(index)
+            else:
+                results[index] = Throttled(throttle.wait())
+
+        uploader = Container().resolve(AppReleaseUploader)
+        uploads = [(releases[index]['download'], releases[index]['signature'],
+                    releases[index]['nightly']) for index in accepted]
+        uploaded = uploader.upload_batch(request.user, uploads,
+                                         settings.RELEASE_BATCH_WORKERS)
+        for index, result in zip(accepted, uploaded):
+            results[index] = result
+
+        return Response([self._to_response(release['download'], result)
+                         for release, result in zip(releases, results)])
+
+    def _to_response(self, url, result):
+        """
+        :return: the status code and body which a single upload of the
+        release would have been answered with
+        """
+        if isinstance(result, APIException):
+            body = error_body(result)
+        elif isinstance(result, Exception):
+            logger.error('Batch upload of %s failed', url, exc_info=result)
+            body = {'detail': 'Internal error'}
+        else:
+            body = result.changes
+        return {'download': url, 'status': upload_status(result),
+                'body': body}
+
+
+class AppReleaseMetricsView(APIView):
+    """Histograms of the durations, processed bytes and database queries of
+    the release upload stages for operators"""
+    authentication_classes = (authentication.TokenAuthentication,
+                              authentication.SessionAuthentication,
+                              authentication.BasicAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({'stages': get_histograms()})
+
+    def delete(self, request):
+        reset_histograms()
+        return Response(status=204)
+
+
+class AppReleaseJobView(RetrieveAPIView):
+    """Shows the state of a queued release upload to the user who queued
+    it"""
+    authentication_classes = (authentication.TokenAuthentication,
+                              authentication.BasicAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = AppReleaseJobSerializer
+
+    def get_queryset(self):
+        return AppReleaseJob.objects.filter(owner=self.request.user)
+
+
 class SessionObtainAuthToken(APIView):
     """Modified version of rest_framework.authtoken.views.ObtainAuthToken.
 
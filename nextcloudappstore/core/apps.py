@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     name = 'nextcloudappstore.core'
     verbose_name = 'Core'
+
+    def ready(self):
+        # compile the info.xml schema and transformations before the first
+        # upload instead of during it
+        from nextcloudappstore.core.api.v1.release import ReleaseConfig
+        from nextcloudappstore.core.api.v1.release.parser import \
+            get_metadata_pipeline
+        config = ReleaseConfig()
+        get_metadata_pipeline(config.info_schema, config.pre_info_xslt,
+                              config.info_xslt).warm_up()
@@ -0,0 +1,107 @@
+from random import Random
+
+from django.contrib.auth import get_user_model
+
+from nextcloudappstore.core.models import App, AppRelease, Category, \
+    Database, DatabaseDependency, License, PhpExtension, \
+    PhpExtensionDependency, ShellCommand, AppAuthor, AppRating, Screenshot
+
+LANGUAGES = ('en', 'de', 'fr', 'es', 'it', 'nl', 'pt', 'ru', 'ja', 'zh-hans')
+PLATFORM_VERSIONS = ('9', '10', '11', '12')
+DATABASES = ('pgsql', 'mysql', 'sqlite')
+PHP_EXTENSIONS = ('libxml', 'curl', 'gd', 'zip')
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+
+def generate_catalog(apps: int, releases: int = 3, languages: int = 2,
+                     seed: int = 0, ratings: int = 0,
+                     screenshots: int = 0) -> None:
+    """
+    Creates a deterministic synthetic catalog of apps. Apps are named
+    benchmark0, benchmark1 and so on; apps which already exist are skipped so
+    a catalog can be grown step by step
+    :param apps: the number of apps
+    :param releases: the number of releases per app
+    :param languages: the number of languages of translated fields
+    :param seed: the seed for the random generator
+    :param ratings: the maximum number of ratings per app
+    :param screenshots: the number of screenshots per app
+    """
+    user, _ = get_user_model().objects.get_or_create(
+        username='benchmark', defaults={'email': 'benchmark@example.com'})
+    raters = [get_user_model().objects.get_or_create(
+        username='benchmark-rater%i' % i,
+        defaults={'email': 'rater%i@example.com' % i})[0]
+        for i in range(ratings)]
+    category, created = Category.objects.get_or_create(id='benchmark')
+    if created:
+        category.set_current_language('en')
+        category.name = 'Benchmark'
+        category.description = 'Synthetic benchmark apps'
+        category.save()
+    license, _ = License.objects.get_or_create(id='agpl')
+    databases = [Database.objects.get_or_create(id=id)[0]
+                 for id in DATABASES]
+    extensions = [PhpExtension.objects.get_or_create(id=id)[0]
+                  for id in PHP_EXTENSIONS]
+    command, _ = ShellCommand.objects.get_or_create(name='grep')
+    codes = LANGUAGES[:languages]
+
+    for i in range(apps):
+        # every app has its own generator so growing a catalog results in the
+        # same apps as creating it in one go
+        random = Random('%s-%i' % (seed, i))
+        app_id = 'benchmark%i' % i
+        if App.objects.filter(id=app_id).exists():
+            continue
+        app = App.objects.create(id=app_id, owner=user, ocsid=i + 1,
+                                 certificate=LOREM * 10,
+                                 website='https://example.com/%s' % app_id)
+        for code in codes:
+            app.set_current_language(code)
+            app.name = '%s %s' % (app_id, code)
+            app.summary = LOREM[:random.randint(20, len(LOREM))]
+            app.description = LOREM * random.randint(1, 20)
+            app.save()
+        app.categories.add(category)
+        app.authors.add(AppAuthor.objects.create(
+            name='Author %i' % i, mail='author%i@example.com' % i,
+            homepage=app.website))
+        for j in range(screenshots):
+            Screenshot.objects.create(
+                app=app, ordering=j,
+                url='https://example.com/%s/%i.png' % (app_id, j),
+                small_thumbnail='https://example.com/%s/%i-small.png' % (
+                    app_id, j))
+
+        for j in range(releases):
+            platform = random.choice(PLATFORM_VERSIONS)
+            release = AppRelease(
+                app=app, version='1.%i.0' % j, download=app.website,
+                platform_version_spec='>=%s.0.0,<%i.0.0' % (
+                    platform, int(platform) + 1),
+                raw_platform_version_spec='>=%s,<=%s' % (platform, platform),
+                php_version_spec='>=5.6.0', raw_php_version_spec='>=5.6',
+                signature=LOREM * 5)
+            for code in codes:
+                release.set_current_language(code)
+                release.changelog = LOREM * random.randint(1, 5)
+                release.save()
+            release.licenses.add(license)
+            release.shell_commands.add(command)
+            for database in random.sample(databases, random.randint(1, 2)):
+                DatabaseDependency.objects.create(
+                    app_release=release, database=database,
+                    version_spec='>=9.4.0', raw_version_spec='>=9.4')
+            for extension in random.sample(extensions, random.randint(1, 3)):
+                PhpExtensionDependency.objects.create(
+                    app_release=release, php_extension=extension,
+                    version_spec='*', raw_version_spec='*')
+
+        for rater in raters[:random.randint(0, ratings)]:
+            rating = AppRating(app=app, user=rater,
+                               rating=random.choice((0.0, 0.5, 1.0)))
+            rating.set_current_language(codes[0] if codes else 'en')
+            rating.comment = LOREM[:random.randint(0, len(LOREM))]
+            rating.save()
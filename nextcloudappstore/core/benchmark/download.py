@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+from time import perf_counter
+from typing import Any, Dict, Iterator, List
+
+from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.downloader import \
+    AppReleaseDownloader, create_download_session
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@contextmanager
+def serve_archive(content: bytes) -> Iterator[Dict[str, Any]]:
+    """
+    Serves an archive over HTTP/1.1 with keep-alive from a local server
+    :param content: the archive
+    :return: the url of the archive and the list of accepted connections
+    """
+    connections = []  # type: List[Any]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self) -> None:
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/gzip')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        yield {
+            'url': 'http://127.0.0.1:%i/app.tar.gz' % httpd.server_port,
+            'connections': connections,
+        }
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class UnpooledDownloader(AppReleaseDownloader):
+    """The downloader before sessions were shared, one session per call"""
+
+    def _get_session(self, max_redirects: int) -> Any:
+        self.session = create_download_session(
+            max_redirects, 1, 1, self.config.download_pool_timeout)
+        return self.session
+
+
+def measure_download(size: int, repeat: int,
+                     chunk_size: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measures the throughput of downloading an archive from a local server
+    :param size: the archive size in bytes
+    :param repeat: number of downloads per variant
+    :param chunk_size: the chunk size of the pooled downloader
+    :return: the seconds per download, the throughput in MiB per second and
+    the number of opened connections when using a new session and 1 KiB
+    chunks for every download and when using the pooled session
+    """
+    config = ReleaseConfig()
+    content = b'a' * size
+
+    def unpooled(url: str) -> None:
+        downloader = UnpooledDownloader(config)
+        with downloader.get_archive(url, None, max_size=size,
+                                    chunk_size=1024):
+            pass
+        downloader.session.close()
+
+    def pooled(url: str) -> None:
+        with AppReleaseDownloader(config).get_archive(
+                url, None, max_size=size, chunk_size=chunk_size):
+            pass
+
+    result = {}
+    for name, download in (('unpooled', unpooled), ('pooled', pooled)):
+        with serve_archive(content) as server:
+            download(server['url'])  # warm up
+            del server['connections'][:]
+            start = perf_counter()
+            for _ in range(repeat):
+                download(server['url'])
+            duration = (perf_counter() - start) / repeat
+            result[name] = {
+                'duration': duration,
+                'throughput': size / (1024 ** 2) / duration,
+                'connections': len(server['connections']),
+            }
+    return result
@@ -0,0 +1,67 @@
+import multiprocessing
+import resource
+import traceback
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Any, Iterator
+
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+
+
+@contextmanager
+def benchmark_database() -> Iterator[None]:
+    """
+    Runs the block against a newly created test database which is destroyed
+    afterwards so benchmarks never touch production data
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure_in_child(func: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Runs a function in a forked child process so its peak memory usage is
+    not influenced by previous runs
+    :param func: the function to measure, its return value must be
+    picklable
+    :return: the wall time in seconds, the resident set size in KiB before
+    and after running the function (ru_maxrss, bytes on macOS) and the
+    result of the function
+    """
+    # children must open their own database connections
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+
+    def run() -> None:
+        try:
+            baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = perf_counter()
+            result = func()
+            duration = perf_counter() - start
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            queue.put({
+                'duration': duration,
+                'baseline_rss': baseline,
+                'peak_rss': peak,
+                'result': result,
+            })
+        except BaseException:
+            queue.put({'error': traceback.format_exc()})
+
+    process = context.Process(target=run)
+    process.start()
+    measurement = queue.get()
+    process.join()
+    if 'error' in measurement:
+        raise RuntimeError('Measurement failed:\n%s' % measurement['error'])
+    return measurement
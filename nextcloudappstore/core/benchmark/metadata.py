@@ -0,0 +1,77 @@
+from io import BytesIO
+from time import perf_counter
+from typing import Any, Callable, Dict
+
+from nextcloudappstore.core.api.v1 import release
+from nextcloudappstore.core.api.v1.release import ReleaseConfig
+from nextcloudappstore.core.api.v1.release.parser import \
+    CompiledMetadataPipeline, get_metadata_pipeline
+from nextcloudappstore.core.api.v1.release.streams import read_bounded
+from nextcloudappstore.core.facades import read_relative_file
+
+
+def time_per_call(func: Callable[[], None], repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+def measure_metadata_parsing(xml: str, repeat: int) -> Dict[str, float]:
+    """
+    Measures how long parsing an info.xml takes per upload
+    :param xml: the info.xml
+    :param repeat: number of parsed documents per variant
+    :return: the seconds per document when the schema and transformations
+    are read and compiled for every upload and when the compiled pipeline
+    is reused
+    """
+
+    def uncompiled() -> None:
+        schema = read_relative_file(release.__file__, 'info.xsd')
+        pre_xslt = read_relative_file(release.__file__, 'pre-info.xslt')
+        xslt = read_relative_file(release.__file__, 'info.xslt')
+        CompiledMetadataPipeline(schema, pre_xslt, xslt).parse(xml)
+
+    config = ReleaseConfig()
+    pipeline = get_metadata_pipeline(config.info_schema,
+                                     config.pre_info_xslt, config.info_xslt)
+    pipeline.warm_up()
+    return {
+        'uncompiled': time_per_call(uncompiled, repeat),
+        'compiled': time_per_call(lambda: pipeline.parse(xml), repeat),
+    }
+
+
+def concatenating_read(file: Any, max_size: int) -> bytes:
+    """The info.xml reader which was used before read_bounded"""
+    size = 0
+    result = b''
+    while True:
+        size += 1024
+        if size > max_size:
+            raise ValueError('File is too big')
+        chunk = file.read(1024)
+        if not chunk:
+            break
+        result += chunk
+    return result
+
+
+def measure_bounded_read(size: int, repeat: int) -> Dict[str, float]:
+    """
+    Measures how long reading an archive member of the given size takes
+    :param size: the member size in bytes
+    :param repeat: number of reads per variant
+    :return: the seconds per read when concatenating 1 KiB chunks and when
+    using read_bounded
+    """
+    content = b'a' * size
+    # the old reader rejected files at the limit
+    limit = size + 1024
+    return {
+        'concatenating': time_per_call(
+            lambda: concatenating_read(BytesIO(content), limit), repeat),
+        'bounded': time_per_call(
+            lambda: read_bounded(BytesIO(content), limit), repeat),
+    }
@@ -0,0 +1,127 @@
+from statistics import median
+from time import perf_counter
+from typing import Any, Dict, List, Tuple
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from nextcloudappstore.core.benchmark.measure import measure_in_child
+
+# name, url name, url kwargs and query string of the measured pages
+SCENARIOS = (
+    ('api.v1.apps', 'api:v1:app', {'version': '{platform_version}'}, ''),
+    ('home', 'home', {}, ''),
+    ('category', 'category-app-list', {'id': 'benchmark'}, ''),
+    ('app.detail', 'app-detail', {'id': '{app}'}, ''),
+    ('app.releases', 'app-releases', {'id': '{app}'}, ''),
+    ('api.v0.categories', 'api:v0:categories', {}, ''),
+    ('api.v0.apps', 'api:v0:apps', {}, 'version=9x1'),
+    ('api.v0.app', 'api:v0:app', {'id': '1'}, 'version=9x1'),
+    ('feeds.rss', 'feeds-releases-rss', {}, ''),
+    ('feeds.atom', 'feeds-releases-atom', {}, ''),
+)
+
+
+def scenario_urls(platform_version: str, app: str) -> List[Tuple[str, str]]:
+    """
+    :param platform_version: the platform version of apps.json
+    :param app: the app id of the detail and releases pages
+    :return: the names and urls of the measured pages
+    """
+    result = []
+    for name, url_name, kwargs, query in SCENARIOS:
+        kwargs = {key: value.format(platform_version=platform_version,
+                                    app=app)
+                  for key, value in kwargs.items()}
+        url = reverse(url_name, kwargs=kwargs)
+        if query:
+            url += '?' + query
+        result.append((name, url))
+    return result
+
+
+def fetch(client: Client, url: str) -> Tuple[int, int]:
+    response = client.get(url, follow=True)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def measure_url(url: str, repeat: int) -> Dict[str, Any]:
+    """
+    Requests a url once with an empty cache and then repeat times with the
+    warm cache
+    :param url: the url
+    :param repeat: the number of warm requests
+    :return: the status, the response size, the durations in seconds and the
+    query counts of the cold and the warm requests
+    """
+    cache.clear()
+    client = Client()
+    result = {}  # type: Dict[str, Any]
+    durations = []
+    queries = []
+    for i in range(repeat + 1):
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            result['status'], result['bytes'] = fetch(client, url)
+            durations.append(perf_counter() - start)
+        queries.append(len(context.captured_queries))
+    result['cold_duration'] = durations[0]
+    result['cold_queries'] = queries[0]
+    if repeat > 0:
+        result['warm_duration'] = median(durations[1:])
+        result['warm_queries'] = max(queries[1:])
+    return result
+
+
+def run_benchmarks(platform_version: str, app: str,
+                   repeat: int = 5) -> List[Dict[str, Any]]:
+    """
+    Measures every scenario in its own process so the peak memory usage of
+    a page is not influenced by the previously measured pages
+    :param platform_version: the platform version of apps.json
+    :param app: the app id of the detail and releases pages
+    :param repeat: the number of warm requests per page
+    :return: one result per scenario
+    """
+    results = []
+    for name, url in scenario_urls(platform_version, app):
+        measurement = measure_in_child(lambda: measure_url(url, repeat))
+        result = {'name': name, 'url': url}
+        result.update(measurement['result'])
+        result['baseline_rss'] = measurement['baseline_rss']
+        result['peak_rss'] = measurement['peak_rss']
+        results.append(result)
+    return results
+
+
+def compare_reports(previous: Dict[str, Any],
+                    current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compares the results of two reports
+    :param previous: the report of a previous run, e.g. of another commit
+    :param current: the current report
+    :return: the relative change of the durations and the peak memory usage
+    and the change of the query counts per scenario found in both reports
+    """
+    before = {result['name']: result for result in previous['results']}
+    changes = []
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None:
+            continue
+        change = {'name': result['name']}
+        for key in ('cold_duration', 'warm_duration', 'peak_rss'):
+            if old.get(key) and key in result:
+                change[key] = result[key] / old[key] - 1
+        for key in ('cold_queries', 'warm_queries'):
+            if key in old and key in result:
+                change[key] = result[key] - old[key]
+        changes.append(change)
+    return changes
@@ -1,26 +1,194 @@
-from typing import List, Tuple, Any
-from django.db.models import Max, QuerySet
-from nextcloudappstore.core.models import App, AppReleaseDeleteLog, Category, \
-    AppRating
+import gzip
+import hashlib
+import time
+from collections import namedtuple
+from typing import List, Any, Callable, Dict, Optional, Set
 
+import brotli
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from djangorestframework_camel_case.util import camel_to_underscore
+from nextcloudappstore.core.generations import ALL_PLATFORMS, \
+    PLATFORM_VERSIONS_KEY, get_generations, platform_generation
+from nextcloudappstore.core.models import App, NextcloudRelease
 
-def create_etag(pairs: List[Tuple[QuerySet, str]]) -> str:
+Snapshot = namedtuple('Snapshot', ['etag', 'content', 'encodings'])
+
+# supported content encodings in order of preference, brotli's highest
+# qualities take seconds for the complete catalog whereas 5 is about as fast
+# as gzip and still compresses better
+SNAPSHOT_ENCODINGS = (
+    ('br', lambda content: brotli.compress(content, quality=5)),
+    ('gzip', lambda content: gzip.compress(content, compresslevel=9)),
+)
+
+# seconds after which the lock of a snapshot which is being built expires,
+# e.g. because the building process died
+SNAPSHOT_LOCK_TIMEOUT = 60
+# seconds to wait for a snapshot which is built by another process
+SNAPSHOT_WAIT = 10
+SNAPSHOT_POLL_INTERVAL = 0.1
+
+# query parameters which select a representation of the apps list and the
+# names of the selections
+APPS_SELECTION_PARAMS = (
+    ('languages', 'languages'),
+    ('fields', 'fields'),
+    ('releaseFields', 'release_fields'),
+)
+
+
+def get_snapshot(key: str, etag: str, render: Callable[[], bytes]) -> Snapshot:
+    """
+    Returns a pre-rendered response body from the cache. The body and its
+    compressed encodings are only rendered again if the cached snapshot was
+    rendered for a different etag. Only one process builds a snapshot at a
+    time, the others wait for it and render an uncompressed body without
+    caching it if it takes too long
+    :param key: identifies the snapshot, e.g. the document and its parameters
+    :param etag: the etag of the current content
+    :param render: function which renders the current content to bytes
+    :return: the snapshot
+    """
+    cache_key = 'snapshot:%s' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+    snapshot = cache.get(cache_key)
+    if snapshot is not None and snapshot.etag == etag:
+        return snapshot
+
+    lock_key = '%s:lock:%s' % (cache_key, etag)
+    if cache.add(lock_key, True, SNAPSHOT_LOCK_TIMEOUT):
+        try:
+            content = render()
+            encodings = {name: compress(content)
+                         for name, compress in SNAPSHOT_ENCODINGS}
+            snapshot = Snapshot(etag, content, encodings)
+            cache.set(cache_key, snapshot, None)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+
+    deadline = time.monotonic() + SNAPSHOT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SNAPSHOT_POLL_INTERVAL)
+        snapshot = cache.get(cache_key)
+        if snapshot is not None and snapshot.etag == etag:
+            return snapshot
+    return Snapshot(etag, render(), {})
+
+
+def get_accepted_encodings(request: Any) -> List[str]:
+    """
+    Parses the Accept-Encoding header
+    :param request: the request
+    :return: all encodings which were not rejected with a q value of 0
+    """
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    result = []
+    for value in header.split(','):
+        encoding, *params = [part.strip() for part in value.split(';')]
+        rejected = False
+        for param in params:
+            name, _, quality = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    rejected = float(quality) == 0
+                except ValueError:
+                    rejected = True
+        if encoding and not rejected:
+            result.append(encoding.lower())
+    return result
+
+
+def snapshot_response(request: Any, snapshot: Snapshot,
+                      content_type: str) -> HttpResponse:
     """
-    Turn a list of queryset and timestamp pairs into an etag. The latest
-    timestamp will be chosen as the etag
-    :param pairs: a list of queryset and attribute which holds a timestamp
-    :return: an etag
+    Serves a snapshot using the best content encoding that the client accepts
+    and the snapshot contains
+    :param request: the request
+    :param snapshot: the snapshot
+    :param content_type: the content type of the uncompressed content
+    :return: the response
     """
-    result = map(lambda p: p[0].aggregate(m=Max(p[1]))['m'], pairs)
-    result = filter(lambda r: r is not None, result)
-    return str(max(result, default=''))
+    accepted = get_accepted_encodings(request)
+    for name, _ in SNAPSHOT_ENCODINGS:
+        if name in snapshot.encodings and (name in accepted or
+                                           '*' in accepted):
+            response = HttpResponse(snapshot.encodings[name],
+                                    content_type=content_type)
+            response['Content-Encoding'] = name
+            break
+    else:
+        response = HttpResponse(snapshot.content, content_type=content_type)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def get_platform_versions() -> List[str]:
+    """
+    Returns the known Nextcloud releases from the cache
+    :return: the versions which are kept in the compatibility index
+    """
+    versions = cache.get(PLATFORM_VERSIONS_KEY)
+    if versions is None:
+        versions = NextcloudRelease.objects.get_indexable_versions()
+        cache.set(PLATFORM_VERSIONS_KEY, versions, None)
+    return versions
+
+
+def parse_apps_selection(query: Any) -> Dict[str, Optional[Set[str]]]:
+    """
+    Normalizes the languages, fields and releaseFields query parameters of
+    the apps list. Languages are lower cased, field names can be given in
+    camel case like in the output or with underscores
+    :param query: the query parameters of the request
+    :return: a dict with the selected values or None if all values are
+    selected
+    """
+    selection = {}  # type: Dict[str, Optional[Set[str]]]
+    for param, name in APPS_SELECTION_PARAMS:
+        value = query.get(param)
+        if value is None:
+            selection[name] = None
+            continue
+        values = {v.strip() for v in value.split(',') if v.strip()}
+        if name == 'languages':
+            selection[name] = {v.lower() for v in values}
+        else:
+            selection[name] = {camel_to_underscore(v) for v in values}
+    return selection
+
+
+def apps_selection_key(selection: Dict[str, Any]) -> str:
+    """
+    :param selection: the selected values, see parse_apps_selection
+    :return: a string which identifies the selection, empty if all values
+    are selected
+    """
+    if all(values is None for values in selection.values()):
+        return ''
+    return ':'.join(
+        '%s=%s' % (name, '*' if values is None else ','.join(sorted(values)))
+        for name, values in sorted(selection.items()))
 
 
 def apps_etag(request: Any, version: str) -> str:
-    return create_etag([
-        (App.objects.all(), 'last_release'),
-        (AppReleaseDeleteLog.objects.all(), 'last_modified'),
-    ])
+    """
+    The apps of a platform version only change if an app or release which
+    is compatible with its main version changes. Versions are only mapped
+    onto known releases of the same series, so the main version is the one
+    which was requested. Each selection of languages and fields is its own
+    representation, its hash is appended to the generations. Costs one cache
+    lookup
+    :param version: the requested platform version
+    :return: the etag
+    """
+    names = [platform_generation(version), ALL_PLATFORMS]
+    etag = '-'.join(map(str, get_generations(names)))
+    selection = apps_selection_key(parse_apps_selection(request.GET))
+    if selection:
+        etag += ':' + hashlib.sha1(selection.encode('utf-8')).hexdigest()
+    return etag
 
 
 def app_etag(request: Any, id: str) -> str:
@@ -28,12 +196,12 @@ def app_etag(request: Any, id: str) -> str:
 
 
 def app_rating_etag(request: Any, id: str) -> str:
-    return create_etag([(AppRating.objects.filter(app__id=id), 'rated_at')])
+    return str(get_generations(['ratings:%s' % id])[0])
 
 
 def categories_etag(request: Any) -> str:
-    return create_etag([(Category.objects.all(), 'last_modified')])
+    return str(get_generations(['categories'])[0])
 
 
 def app_ratings_etag(request: Any) -> str:
-    return create_etag([(AppRating.objects.all(), 'rated_at')])
+    return str(get_generations(['ratings'])[0])
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.test import TestCase
 from pymple import Container
 
@@ -62,6 +64,28 @@ class ValidatorTest(TestCase):
         with (self.assertRaises(InvalidSignatureException)):
             self.validator.validate_signature(cert, sign, checksum)
 
+    def test_digest_signature(self) -> None:
+        cert = self._read_cert('news-old.crt')
+        sign = self._read_cert('news-old-minimal.sig')
+        archive = self._read_bin_file('data/archives/minimal.tar.gz')
+        digest = hashlib.sha512(archive).digest()
+        self.validator.validate_digest_signature(cert, sign, digest)
+
+    def test_bad_digest_signature(self) -> None:
+        cert = self._read_cert('news-old.crt')
+        sign = self._read_cert('bad-news-old-minimal.sig')
+        archive = self._read_bin_file('data/archives/minimal.tar.gz')
+        digest = hashlib.sha512(archive).digest()
+        with (self.assertRaises(InvalidSignatureException)):
+            self.validator.validate_digest_signature(cert, sign, digest)
+
+    def test_digest_signature_wrong_digest(self) -> None:
+        cert = self._read_cert('news-old.crt')
+        sign = self._read_cert('news-old-minimal.sig')
+        digest = hashlib.sha512(b'other').digest()
+        with (self.assertRaises(InvalidSignatureException)):
+            self.validator.validate_digest_signature(cert, sign, digest)
+
     def test_validate_cert_signed_not_on_crl(self) -> None:
         cert = self._read_cert('imaginary-revoked1.crt')
         chain = self._read_cert('imaginary.chain')
@@ -2,6 +2,12 @@ import logging
 from base64 import b64decode
 
 import pem
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.x509 import load_pem_x509_certificate
 from OpenSSL.crypto import FILETYPE_PEM, load_certificate, verify, X509, \
     X509Store, X509StoreContext, load_crl, X509StoreFlags
 from django.conf import settings  # type: ignore
@@ -56,6 +62,39 @@ class CertificateValidator:
         except Exception as e:
             raise InvalidSignatureException('%s: %s' % (err_msg, str(e)))
 
+    def validate_digest_signature(self, certificate: str, signature: str,
+                                  digest: bytes) -> None:
+        """
+        Same as validate_signature but checks the signature against a digest
+        of the signed data which was computed beforehand, e.g. while the
+        data was downloaded. The digest must use the configured algorithm
+        :param certificate: the certificate to use as string
+        :param signature: the signature base64 encoded string to test
+        :param digest: the digest of the binary file content that was signed
+        :raises: InvalidSignatureException if the signature is invalid
+        :return: None
+        """
+        err_msg = 'Signature is invalid'
+        try:
+            cert = load_pem_x509_certificate(certificate.encode(),
+                                             default_backend())
+        except Exception as e:
+            msg = '%s: %s' % ('Invalid certificate', str(e))
+            raise InvalidCertificateException(msg)
+        try:
+            algorithm = getattr(hashes, self.config.digest.upper())()
+            prehashed = Prehashed(algorithm)
+            key = cert.public_key()
+            sig = b64decode(signature.encode())
+            if isinstance(key, rsa.RSAPublicKey):
+                key.verify(sig, digest, padding.PKCS1v15(), prehashed)
+            elif isinstance(key, ec.EllipticCurvePublicKey):
+                key.verify(sig, digest, ec.ECDSA(prehashed))
+            else:
+                raise InvalidSignature('Unsupported key type')
+        except Exception as e:
+            raise InvalidSignatureException('%s: %s' % (err_msg, str(e)))
+
     def validate_certificate(self, certificate: str, chain: str,
                              crl: str = None) -> None:
         """
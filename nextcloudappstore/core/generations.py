@@ -0,0 +1,128 @@
+"""
+Generation counters which are bumped whenever cached documents become stale.
+Etags are built from them so checking an etag only costs a cache lookup
+instead of database queries.
+
+Generations are microsecond timestamps which are increased on every bump. A
+counter which was evicted from the cache is therefore initialized with a
+value that is bigger than all values it held before and no etag is reused.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from nextcloudappstore.core.versioning import MAX_VERSION_KEY, \
+    VERSION_KEY_PART_LIMIT, parse_min_version
+
+# generation of the documents which depend on every platform version
+ALL_PLATFORMS = 'apps:*'
+# cache key of the list of known Nextcloud releases
+PLATFORM_VERSIONS_KEY = 'platform_versions'
+# releases which span more main versions are tracked as ALL_PLATFORMS
+MAX_GENERATION_SPAN = 32
+
+
+def generation_key(name: str) -> str:
+    return 'generation:%s' % name
+
+
+def platform_generation(version: str) -> str:
+    """
+    :param version: a platform version, e.g. 11.0.2
+    :return: the name of the generation which tracks the main version
+    """
+    return 'apps:%i' % parse_min_version(version).major
+
+
+def release_generations(spec: str, min_key: Optional[int],
+                        max_key: Optional[int]) -> Set[str]:
+    """
+    Returns the generations which are affected by a release
+    :param spec: the platform version spec of the release
+    :param min_key: the encoded minimum platform version
+    :param max_key: the encoded exclusive maximum platform version
+    :return: the generation names, ALL_PLATFORMS if the range can not be
+    enumerated
+    """
+    if not spec:
+        # releases are created before their metadata is imported
+        return set()
+    if min_key is None or max_key is None or max_key == MAX_VERSION_KEY:
+        return {ALL_PLATFORMS}
+    if max_key <= min_key:
+        return set()
+    first = min_key // VERSION_KEY_PART_LIMIT ** 2
+    last = (max_key - 1) // VERSION_KEY_PART_LIMIT ** 2
+    if last - first >= MAX_GENERATION_SPAN:
+        return {ALL_PLATFORMS}
+    return {'apps:%i' % main for main in range(first, last + 1)}
+
+
+def _now() -> int:
+    return int(time.time() * 10 ** 6)
+
+
+def generation_time(generation: int) -> datetime:
+    """
+    :param generation: a generation value
+    :return: the approximate time at which the generation was bumped
+    """
+    return datetime.fromtimestamp(generation / 10 ** 6, timezone.utc)
+
+
+def get_generations(names: List[str],
+                    cached: Dict[str, Any] = None) -> List[int]:
+    """
+    Returns the current generations. Missing generations are initialized
+    :param names: the generation names
+    :param cached: result of a cache.get_many() call which already included
+    the generation keys, saves another cache lookup
+    :return: the generations in the same order as the names
+    """
+    keys = [generation_key(name) for name in names]
+    if cached is None:
+        cached = cache.get_many(keys)
+    result = []
+    for key in keys:
+        value = cached.get(key)
+        if value is None:
+            value = _now()
+            if not cache.add(key, value, None):
+                value = cache.get(key, value)
+        result.append(value)
+    return result
+
+
+def bump_generations(names: Iterable[str]) -> None:
+    """
+    Bumps the generations right away so the current connection sees fresh
+    etags and once more after the transaction was committed so documents
+    which were rendered by others during the transaction are discarded
+    :param names: the generation names
+    """
+    keys = [generation_key(name) for name in set(names)]
+    if not keys:
+        return
+
+    def bump():
+        current = cache.get_many(keys)
+        now = _now()
+        cache.set_many({key: max(now, current.get(key, 0) + 1)
+                        for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_platform_versions() -> None:
+    """
+    Forgets the known Nextcloud releases after they changed and invalidates
+    all documents since the releases are mapped onto them
+    """
+    cache.delete(PLATFORM_VERSIONS_KEY)
+    transaction.on_commit(lambda: cache.delete(PLATFORM_VERSIONS_KEY))
+    bump_generations([ALL_PLATFORMS])
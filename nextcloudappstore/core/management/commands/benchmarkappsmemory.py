@@ -0,0 +1,75 @@
+import json
+
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.core.urlresolvers import reverse
+from django.test import Client
+from django.test.utils import override_settings
+
+from nextcloudappstore.core.benchmark.catalog import generate_catalog
+from nextcloudappstore.core.benchmark.measure import measure_in_child, \
+    benchmark_database
+
+
+def fetch_apps(url):
+    cache.clear()
+    response = Client().get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return {'status': response.status_code, 'size': size}
+
+
+class Command(BaseCommand):
+    help = ('Measures the peak memory usage of rendering apps.json with and '
+            'without streaming for growing synthetic catalogs. Runs against '
+            'a newly created test database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[100, 500, 1000],
+                            help='Catalog sizes (number of apps) to measure')
+        parser.add_argument('--releases', type=int, default=3,
+                            help='Releases per app')
+        parser.add_argument('--languages', type=int, default=2,
+                            help='Languages per translated field')
+        parser.add_argument('--platform-version', default='11.0.0')
+        parser.add_argument('--output', help='Write the results as JSON '
+                                             'into this file')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = self._measure(options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=4)
+        msg = 'Measured %i catalog sizes' % len(options['sizes'])
+        self.stdout.write(self.style.SUCCESS(msg))
+
+    def _measure(self, options):
+        url = reverse('api:v1:app',
+                      kwargs={'version': options['platform_version']})
+        results = []
+        self.stdout.write('apps  streaming  bytes  seconds  '
+                          'baseline RSS (KiB)  peak RSS (KiB)')
+        for size in sorted(options['sizes']):
+            generate_catalog(size, options['releases'], options['languages'])
+            for streaming in (False, True):
+                with override_settings(DEBUG=False,
+                                       APPS_JSON_STREAMING=streaming):
+                    measurement = measure_in_child(lambda: fetch_apps(url))
+                result = {
+                    'apps': size,
+                    'streaming': streaming,
+                    'bytes': measurement['result']['size'],
+                    'duration': measurement['duration'],
+                    'baseline_rss': measurement['baseline_rss'],
+                    'peak_rss': measurement['peak_rss'],
+                }
+                results.append(result)
+                self.stdout.write('%(apps)i  %(streaming)s  %(bytes)i  '
+                                  '%(duration).3f  %(baseline_rss)i  '
+                                  '%(peak_rss)i' % result)
+        return results
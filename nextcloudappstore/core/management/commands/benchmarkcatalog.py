@@ -0,0 +1,92 @@
+import json
+import subprocess
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management import BaseCommand, call_command
+from django.test.utils import override_settings
+
+from nextcloudappstore.core.benchmark.catalog import generate_catalog
+from nextcloudappstore.core.benchmark.measure import benchmark_database
+from nextcloudappstore.core.benchmark.runner import run_benchmarks, \
+    compare_reports
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=settings.BASE_DIR,
+                                         stderr=subprocess.DEVNULL)
+        return output.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Measures wall time, query count and peak memory usage of the '
+            'apps list, app pages, v0 API and feeds for a synthetic catalog. '
+            'Runs against a newly created test database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apps', type=int, default=500,
+                            help='Number of apps')
+        parser.add_argument('--releases', type=int, default=3,
+                            help='Releases per app')
+        parser.add_argument('--languages', type=int, default=2,
+                            help='Languages per translated field')
+        parser.add_argument('--ratings', type=int, default=5,
+                            help='Maximum number of ratings per app')
+        parser.add_argument('--screenshots', type=int, default=2,
+                            help='Screenshots per app')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random generator')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Requests per page with a warm cache')
+        parser.add_argument('--platform-version', default='11.0.0')
+        parser.add_argument('--output', help='Write the report as JSON into '
+                                             'this file')
+        parser.add_argument('--compare', help='Report of a previous run to '
+                                              'compare the results with')
+
+    def handle(self, *args, **options):
+        catalog = {name: options[name] for name in (
+            'apps', 'releases', 'languages', 'ratings', 'screenshots', 'seed')}
+        with benchmark_database():
+            call_command('loaddata', 'categories', 'licenses', 'databases',
+                         'nextcloudreleases', verbosity=0)
+            generate_catalog(**catalog)
+            with override_settings(DEBUG=False):
+                results = run_benchmarks(options['platform_version'],
+                                         'benchmark0', options['repeat'])
+        report = {
+            'commit': get_commit(),
+            'created': datetime.utcnow().isoformat() + 'Z',
+            'catalog': catalog,
+            'platform_version': options['platform_version'],
+            'repeat': options['repeat'],
+            'results': results,
+        }
+
+        self.stdout.write('page  status  bytes  cold s  cold queries  '
+                          'warm s  warm queries  peak RSS (KiB)')
+        for result in results:
+            self.stdout.write('%s  %i  %i  %.3f  %i  %.3f  %i  %i' % (
+                result['name'], result['status'], result['bytes'],
+                result['cold_duration'], result['cold_queries'],
+                result.get('warm_duration', 0),
+                result.get('warm_queries', 0), result['peak_rss']))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write('\nChanges compared to %s' %
+                              (previous.get('commit') or options['compare']))
+            for change in compare_reports(previous, report):
+                self.stdout.write('%s  %s' % (change.pop('name'), ', '.join(
+                    '%s %+.3g' % item for item in sorted(change.items()))))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=4)
+        msg = 'Measured %i pages' % len(results)
+        self.stdout.write(self.style.SUCCESS(msg))
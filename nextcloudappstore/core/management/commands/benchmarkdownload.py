@@ -0,0 +1,43 @@
+import json
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from nextcloudappstore.core.benchmark.download import measure_download
+
+
+class Command(BaseCommand):
+    help = ('Measures the throughput of downloading a release archive from a '
+            'local HTTP server with a new session and 1 KiB chunks for every '
+            'download compared to the pooled session and the configured '
+            'chunk size')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int,
+                            default=settings.MAX_DOWNLOAD_SIZE,
+                            help='Archive size in bytes, defaults to '
+                                 'MAX_DOWNLOAD_SIZE')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Downloads per variant')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.DOWNLOAD_CHUNK_SIZE,
+                            help='Chunk size of the pooled downloader in '
+                                 'bytes, defaults to DOWNLOAD_CHUNK_SIZE')
+        parser.add_argument('--output', help='Write the results as JSON '
+                                             'into this file')
+
+    def handle(self, *args, **options):
+        result = measure_download(options['size'], options['repeat'],
+                                  options['chunk_size'])
+        self.stdout.write('Downloading %i bytes' % options['size'])
+        for name, measurement in result.items():
+            self.stdout.write('  %s: %.3f ms per download, %.1f MiB/s, '
+                              '%i connections' % (
+                                  name, measurement['duration'] * 1000,
+                                  measurement['throughput'],
+                                  measurement['connections']))
+        self.stdout.write(self.style.SUCCESS('  Speedup: %.1fx' % (
+            result['unpooled']['duration'] / result['pooled']['duration'])))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=4)
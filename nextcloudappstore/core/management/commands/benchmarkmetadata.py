@@ -0,0 +1,52 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from nextcloudappstore.core.benchmark.metadata import \
+    measure_metadata_parsing, measure_bounded_read
+
+
+class Command(BaseCommand):
+    help = ('Measures the time it takes to parse an info.xml when the schema '
+            'and transformations are compiled for every upload compared to '
+            'reusing the compiled pipeline and the time it takes to read an '
+            'info.xml of the maximum size from an archive')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='info.xml to parse, defaults to '
+                                           'the full test info.xml',
+                            default=os.path.join(
+                                settings.BASE_DIR, 'nextcloudappstore/core/'
+                                'api/v1/tests/data/infoxmls/full.xml'))
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Parsed documents per variant')
+        parser.add_argument('--read-size', type=int,
+                            default=settings.MAX_DOWNLOAD_INFO_XML_SIZE,
+                            help='Size of the info.xml which is read in '
+                                 'bytes')
+        parser.add_argument('--output', help='Write the results as JSON '
+                                             'into this file')
+
+    def handle(self, *args, **options):
+        with open(options['file'], encoding='utf-8') as f:
+            xml = f.read()
+        parsing = measure_metadata_parsing(xml, options['repeat'])
+        self._write('Parsing', parsing, 'uncompiled', 'compiled')
+        reading = measure_bounded_read(options['read_size'],
+                                       options['repeat'])
+        self._write('Reading %i bytes' % options['read_size'], reading,
+                    'concatenating', 'bounded')
+        result = {'parsing': parsing, 'reading': reading}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=4)
+
+    def _write(self, title, result, before, after):
+        self.stdout.write(title)
+        for name, duration in result.items():
+            line = '  %s: %.3f ms per upload' % (name, duration * 1000)
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            '  Speedup: %.1fx' % (result[before] / result[after])))
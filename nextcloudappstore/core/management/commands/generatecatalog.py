@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from nextcloudappstore.core.benchmark.catalog import generate_catalog
+
+
+class Command(BaseCommand):
+    help = ('Creates a deterministic synthetic catalog of apps named '
+            'benchmark0, benchmark1 and so on in the configured database. '
+            'Existing benchmark apps are kept so a catalog can be grown')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apps', type=int, default=100,
+                            help='Number of apps')
+        parser.add_argument('--releases', type=int, default=3,
+                            help='Releases per app')
+        parser.add_argument('--languages', type=int, default=2,
+                            help='Languages per translated field')
+        parser.add_argument('--ratings', type=int, default=5,
+                            help='Maximum number of ratings per app')
+        parser.add_argument('--screenshots', type=int, default=2,
+                            help='Screenshots per app')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random generator')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            generate_catalog(options['apps'], options['releases'],
+                             options['languages'], options['seed'],
+                             options['ratings'], options['screenshots'])
+        msg = 'Generated a catalog of %i apps' % options['apps']
+        self.stdout.write(self.style.SUCCESS(msg))
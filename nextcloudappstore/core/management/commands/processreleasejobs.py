@@ -0,0 +1,58 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+from pymple import Container
+from rest_framework.exceptions import APIException
+
+from nextcloudappstore.core.api.v1.release.uploader import \
+    AppReleaseUploader, error_body
+from nextcloudappstore.core.models import AppReleaseJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Processes release uploads which were queued by the REST API. '
+            'Multiple workers can be run at the same time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='Exit once the queue is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait before polling an empty '
+                                 'queue again')
+
+    def handle(self, *args, **options):
+        uploader = Container().resolve(AppReleaseUploader)
+        while True:
+            job = AppReleaseJob.objects.claim(
+                settings.RELEASE_JOB_TIMEOUT,
+                settings.RELEASE_JOB_MAX_ATTEMPTS)
+            if job is not None:
+                self._process(uploader, job)
+            elif options['once']:
+                break
+            else:
+                # don't keep idle connections open between polls
+                close_old_connections()
+                time.sleep(options['interval'])
+
+    def _process(self, uploader, job):
+        try:
+            result = uploader.upload(job.owner, job.download, job.signature,
+                                     job.is_nightly, job.set_stage)
+        except APIException as e:
+            # same body as the response of a synchronous upload
+            job.finish(e.status_code, json.dumps(error_body(e)))
+        except Exception:
+            logger.exception('Release job %s failed', job.pk)
+            job.finish(500, json.dumps({'detail': 'Internal error'}))
+        else:
+            job.app_id = result.app_id
+            job.version = result.version
+            job.finish(result.status)
+        self.stdout.write('%s %s %s' % (job.pk, job.state, job.status_code))
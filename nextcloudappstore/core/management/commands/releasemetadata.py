@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from nextcloudappstore.core.models import AppReleaseMetadata, \
+    AppReleaseOrigin
+
+
+class Command(BaseCommand):
+    help = ('Shows the parsed metadata of uploaded release archives which is '
+            'kept to skip parsing the same archive again and removes it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', default=False,
+                            help='List the entries, least recently used '
+                                 'first')
+        parser.add_argument('--prune', action='store_true', default=False,
+                            help='Delete the least recently used entries '
+                                 'until the store fits into its maximum '
+                                 'size')
+        parser.add_argument('--max-size', type=int,
+                            default=settings.RELEASE_METADATA_STORE_SIZE,
+                            help='Maximum size in bytes used by --prune, '
+                                 'defaults to RELEASE_METADATA_STORE_SIZE')
+        parser.add_argument('--clear', action='store_true', default=False,
+                            help='Delete all entries and the stored download '
+                                 'validators')
+
+    def handle(self, *args, **options):
+        entries = AppReleaseMetadata.objects.all()
+        if options['clear']:
+            deleted, _ = entries.delete()
+            AppReleaseOrigin.objects.all().delete()
+            self.stdout.write('Deleted %i entries' % deleted)
+        elif options['prune']:
+            deleted = AppReleaseMetadata.objects.prune(options['max_size'])
+            self.stdout.write('Deleted %i entries' % deleted)
+
+        if options['list']:
+            for entry in entries.order_by('last_used').defer('info'):
+                self.stdout.write(
+                    '%s %s %s nightly=%s size=%i hits=%i last_used=%s'
+                    % (entry.digest, entry.app_id, entry.version,
+                       entry.is_nightly, entry.size, entry.hits,
+                       entry.last_used.isoformat()))
+        self.stdout.write('%i entries, %i of %i bytes used' % (
+            entries.count(), AppReleaseMetadata.objects.total_size(),
+            settings.RELEASE_METADATA_STORE_SIZE))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 01:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from semantic_version import Version, Spec
+
+from nextcloudappstore.core.versioning import AppSemVer, group_by_main_version
+
+
+def is_compatible(release, version):
+    try:
+        return Version(version) in Spec(release.platform_version_spec)
+    except ValueError:
+        return False
+
+
+def latest(releases):
+    return max(releases, default=None, key=lambda r: AppSemVer(
+        r.version, r.is_nightly, r.last_modified))
+
+
+def build_compatibility_index(apps, schema_editor):
+    AppRelease = apps.get_model('core', 'AppRelease')
+    NextcloudRelease = apps.get_model('core', 'NextcloudRelease')
+    AppReleaseCompatibility = apps.get_model('core',
+                                             'AppReleaseCompatibility')
+    AppLatestRelease = apps.get_model('core', 'AppLatestRelease')
+
+    versions = []
+    for version in NextcloudRelease.objects.values_list('version', flat=True):
+        try:
+            Version(version)
+            versions.append(version)
+        except ValueError:
+            pass
+
+    by_app = {}
+    for release in AppRelease.objects.all():
+        compatible = [v for v in versions if is_compatible(release, v)]
+        AppReleaseCompatibility.objects.bulk_create([
+            AppReleaseCompatibility(app_release=release, nextcloud_release_id=v)
+            for v in compatible
+        ])
+        for version in compatible:
+            by_app.setdefault(release.app_id, {}).setdefault(
+                version, []).append(release)
+
+    for app_id, releases in by_app.items():
+        for version, grouped in group_by_main_version(releases).items():
+            unstable = [r for r in grouped if r.is_nightly or '-' in r.version]
+            stable = [r for r in grouped if r not in unstable]
+            AppLatestRelease.objects.create(
+                app_id=app_id, platform_version=version,
+                stable=latest(stable), unstable=latest(unstable))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_auto_20161128_1902'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppLatestRelease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform_version', models.CharField(max_length=100, verbose_name='Nextcloud main version')),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_releases', to='core.App', verbose_name='App')),
+                ('stable', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.AppRelease', verbose_name='Latest stable release')),
+                ('unstable', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.AppRelease', verbose_name='Latest unstable release')),
+            ],
+            options={
+                'verbose_name': 'Latest app release',
+                'verbose_name_plural': 'Latest app releases',
+            },
+        ),
+        migrations.CreateModel(
+            name='AppReleaseCompatibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilities', to='core.AppRelease', verbose_name='App release')),
+                ('nextcloud_release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilities', to='core.NextcloudRelease', verbose_name='Nextcloud release')),
+            ],
+            options={
+                'verbose_name': 'App release compatibility',
+                'verbose_name_plural': 'App release compatibilities',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='appreleasecompatibility',
+            unique_together=set([('nextcloud_release', 'app_release')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='applatestrelease',
+            unique_together=set([('app', 'platform_version')]),
+        ),
+        migrations.RunPython(build_compatibility_index,
+                             migrations.RunPython.noop),
+    ]
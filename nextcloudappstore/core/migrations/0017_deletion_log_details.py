@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 01:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_compatibility_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appreleasedeletelog',
+            name='app_id',
+            field=models.CharField(blank=True, db_index=True, max_length=256, verbose_name='App id'),
+        ),
+        migrations.AddField(
+            model_name='appreleasedeletelog',
+            name='is_nightly',
+            field=models.BooleanField(default=False, verbose_name='Nightly'),
+        ),
+        migrations.AddField(
+            model_name='appreleasedeletelog',
+            name='version',
+            field=models.CharField(blank=True, max_length=256, verbose_name='Version'),
+        ),
+    ]
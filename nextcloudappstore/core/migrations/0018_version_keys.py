@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 01:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from nextcloudappstore.core.versioning import spec_bounds
+
+
+def spec_keys(spec):
+    try:
+        return spec_bounds(spec)
+    except ValueError:
+        return None, None
+
+
+def encode_version_bounds(apps, schema_editor):
+    AppRelease = apps.get_model('core', 'AppRelease')
+    for release in AppRelease.objects.all():
+        min_key, max_key = spec_keys(release.platform_version_spec)
+        AppRelease.objects.filter(pk=release.pk).update(
+            platform_version_min_key=min_key,
+            platform_version_max_key=max_key)
+
+    for name in ('DatabaseDependency', 'PhpExtensionDependency'):
+        Dependency = apps.get_model('core', name)
+        for dependency in Dependency.objects.all():
+            min_key, max_key = spec_keys(dependency.version_spec)
+            Dependency.objects.filter(pk=dependency.pk).update(
+                version_min_key=min_key, version_max_key=max_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_deletion_log_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apprelease',
+            name='platform_version_max_key',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Encoded exclusive maximum platform version'),
+        ),
+        migrations.AddField(
+            model_name='apprelease',
+            name='platform_version_min_key',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Encoded minimum platform version'),
+        ),
+        migrations.AddField(
+            model_name='databasedependency',
+            name='version_max_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Encoded exclusive maximum database version'),
+        ),
+        migrations.AddField(
+            model_name='databasedependency',
+            name='version_min_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Encoded minimum database version'),
+        ),
+        migrations.AddField(
+            model_name='phpextensiondependency',
+            name='version_max_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Encoded exclusive maximum extension version'),
+        ),
+        migrations.AddField(
+            model_name='phpextensiondependency',
+            name='version_min_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Encoded minimum extension version'),
+        ),
+        migrations.RunPython(encode_version_bounds,
+                             migrations.RunPython.noop),
+    ]
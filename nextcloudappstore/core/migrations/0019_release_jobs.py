@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 01:54
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0018_version_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppReleaseJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('download', models.URLField(max_length=256, verbose_name='Archive download Url')),
+                ('signature', models.TextField(verbose_name='Signature')),
+                ('is_nightly', models.BooleanField(default=False, verbose_name='Nightly')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16, verbose_name='State')),
+                ('stage', models.CharField(blank=True, max_length=32, verbose_name='Stage')),
+                ('status_code', models.IntegerField(blank=True, null=True, verbose_name='Status code')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('app_id', models.CharField(blank=True, max_length=256, verbose_name='App id')),
+                ('version', models.CharField(blank=True, max_length=256, verbose_name='Version')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Created at')),
+                ('last_modified', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='app_release_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Owner')),
+            ],
+            options={
+                'verbose_name': 'App release job',
+                'verbose_name_plural': 'App release jobs',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
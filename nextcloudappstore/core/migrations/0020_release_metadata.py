@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 02:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_release_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppReleaseMetadata',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, verbose_name='SHA-256 digest')),
+                ('is_nightly', models.BooleanField(default=False, verbose_name='Nightly')),
+                ('parser', models.CharField(help_text='Metadata which was parsed using a different schema or transformation is not used', max_length=64, verbose_name='Parser version')),
+                ('app_id', models.CharField(max_length=256, verbose_name='App id')),
+                ('version', models.CharField(max_length=256, verbose_name='Version')),
+                ('info', models.TextField(verbose_name='Parsed metadata as JSON')),
+                ('size', models.PositiveIntegerField(verbose_name='Size in bytes')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Hits')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last used at')),
+            ],
+            options={
+                'verbose_name': 'App release metadata',
+                'verbose_name_plural': 'App release metadata',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='appreleasemetadata',
+            unique_together=set([('digest', 'is_nightly', 'parser')]),
+        ),
+    ]
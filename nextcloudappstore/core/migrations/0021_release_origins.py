@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 02:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_release_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppReleaseOrigin',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=256, unique=True, verbose_name='Archive download Url')),
+                ('etag', models.CharField(blank=True, max_length=256, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('digest', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 digest')),
+                ('digests', models.TextField(verbose_name='Digests by algorithm as JSON')),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Last used at')),
+            ],
+            options={
+                'verbose_name': 'App release origin',
+                'verbose_name_plural': 'App release origins',
+            },
+        ),
+    ]
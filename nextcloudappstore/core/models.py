@@ -1,29 +1,46 @@
 import datetime
+import json
+from collections import OrderedDict
 from functools import reduce
-from itertools import chain
-from typing import Tuple
+from typing import Tuple, Dict, List
+from uuid import uuid4
 
 from django.conf import settings  # type: ignore
 from django.contrib.auth.models import User  # type: ignore
-from django.db.models import Manager
+from django.db.models import Manager, Prefetch, Sum, F
 from django.db.models import ManyToManyField, ForeignKey, \
     URLField, IntegerField, CharField, CASCADE, TextField, \
     DateTimeField, Model, BooleanField, EmailField, Q, \
-    FloatField, OneToOneField  # type: ignore
+    FloatField, OneToOneField, SET_NULL, BigIntegerField, \
+    UUIDField, PositiveIntegerField  # type: ignore
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _  # type: ignore
 from parler.models import TranslatedFields, TranslatableModel, \
     TranslatableManager  # type: ignore
-from semantic_version import Version, Spec
 
 from nextcloudappstore.core.facades import distinct
 from nextcloudappstore.core.rating import compute_rating
 from nextcloudappstore.core.versioning import pad_min_version, \
-    pad_max_inc_version, AppSemVer, group_by_main_version
-from django.db.models.signals import post_delete
+    AppSemVer, group_by_main_version, parse_min_version, parse_spec, \
+    parse_max_inc_version, parse_version, spec_bounds, version_key, \
+    pad_max_inc_version, nearest_version
+from nextcloudappstore.core.generations import bump_generations, \
+    bump_platform_versions, release_generations, ALL_PLATFORMS
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
+# relations of releases which are serialized by the API
+RELEASE_LOOKUPS = (
+    'databases',
+    'licenses',
+    'phpextensiondependencies__php_extension',
+    'databasedependencies__database',
+    'shell_commands',
+)
+
+
 class AppManager(TranslatableManager):
     def search(self, terms, lang):
         queryset = self.get_queryset().active_translations(lang).language(
@@ -35,26 +52,118 @@ class AppManager(TranslatableManager):
         query = reduce(lambda x, y: x & y, predicates, Q())
         return queryset.filter(query)
 
-    def get_compatible(self, platform_version, inclusive=False):
-        apps = App.objects.prefetch_related(
-            'releases',
-            'releases__translations',
-            'releases__databases',
-            'releases__licenses',
-            'releases__phpextensiondependencies__php_extension',
-            'releases__databasedependencies__database',
-            'releases__shell_commands',
-            'translations',
-            'screenshots'
-        ).all()
-
-        def app_filter(app):
-            for release in app.releases.all():
-                if release.is_compatible(platform_version, inclusive):
-                    return True
-            return False
+    def get_compatible(self, platform_version, inclusive=False,
+                       app_ids=None, languages=None):
+        """Returns all apps which have at least one release that is compatible
+        with the platform version. The compatible releases and their
+        relations are prefetched
 
-        return list(filter(app_filter, apps))
+        :param app_ids: if given, only these apps are taken into account
+        :param languages: if given, only translations for these language
+                          codes are prefetched
+        """
+        def translations(model, prefix=''):
+            if languages is None:
+                return prefix + 'translations'
+            queryset = model._parler_meta.root_model.objects.filter(
+                language_code__in=languages)
+            return Prefetch(prefix + 'translations', queryset=queryset)
+
+        release_lookups = RELEASE_LOOKUPS
+        app_lookups = ('screenshots', 'authors', 'categories')
+        indexed, releases = self._get_compatible_releases(platform_version,
+                                                          inclusive)
+        # only apps and releases which are compatible are loaded in the first
+        # place
+        apps = App.objects.filter(releases__in=releases.values('id'))
+        if app_ids is not None:
+            apps = apps.filter(id__in=app_ids)
+        apps = apps.distinct().order_by('id').prefetch_related(
+            Prefetch('releases', queryset=releases,
+                     to_attr='matching_releases'),
+            translations(AppRelease, 'matching_releases__'),
+            *(['matching_releases__%s' % l for l in release_lookups] +
+              [translations(App)] + list(app_lookups))
+        )
+
+        # remember the compatible releases on the app so serializers and
+        # templates do not have to filter them again
+        compatible_apps = []
+        for app in apps:
+            if indexed:
+                releases = app.matching_releases
+            else:
+                releases = check_compatible(app.matching_releases,
+                                            platform_version, inclusive)
+            if releases:
+                app.cache_compatible_releases(platform_version, inclusive,
+                                              releases)
+                compatible_apps.append(app)
+        return compatible_apps
+
+    def iter_compatible(self, platform_version, inclusive=False,
+                        chunk_size=100, languages=None):
+        """Same as get_compatible() but only loads chunk_size apps at once to
+        keep the memory usage low for big catalogs
+
+        :return: an iterator over lists of compatible apps in the same order
+                 as returned by get_compatible()
+        """
+        indexed, releases = self._get_compatible_releases(platform_version,
+                                                          inclusive)
+        app_ids = list(App.objects.filter(
+            releases__in=releases.values('id')
+        ).distinct().order_by('id').values_list('id', flat=True))
+        for start in range(0, len(app_ids), chunk_size):
+            yield self.get_compatible(platform_version, inclusive,
+                                      app_ids[start:start + chunk_size],
+                                      languages)
+
+    def get_updates(self, platform_version, installed, unstable=False):
+        """Finds the compatible releases which are newer than the installed
+        versions of apps. Only the releases of the installed apps are loaded
+
+        :param platform_version: the platform version
+        :param installed: a dict of installed app ids and their versions
+        :param unstable: if True, nightlies and pre-releases are included
+        :return: a dict of app ids and their newer releases, newest first.
+                 Apps without newer releases are left out
+        """
+        indexed, releases = self._get_compatible_releases(platform_version,
+                                                          False)
+        releases = releases.filter(app_id__in=installed.keys())
+        if not unstable:
+            releases = releases.filter(is_nightly=False)
+        releases = releases.prefetch_related('translations', *RELEASE_LOOKUPS)
+        if not indexed:
+            releases = check_compatible(releases, platform_version)
+
+        updates = OrderedDict()
+        for release in sorted(releases, key=lambda r: r.app_id):
+            if release.is_unstable and not unstable:
+                continue
+            current = AppSemVer(installed[release.app_id])
+            candidate = AppSemVer(release.version, release.is_nightly,
+                                  release.last_modified)
+            # AppSemVer treats equal stable versions as lower than each other
+            if current < candidate and not candidate < current:
+                updates.setdefault(release.app_id, []).append(release)
+        for app_id, newer in updates.items():
+            updates[app_id] = sorted(newer, key=lambda r: AppSemVer(
+                r.version, r.is_nightly, r.last_modified), reverse=True)
+        return updates
+
+    def _get_compatible_releases(self, platform_version, inclusive):
+        """
+        :return: a tuple of whether the compatibility index was used and the
+                 queryset of the (possibly) compatible releases
+        """
+        if NextcloudRelease.objects.is_indexed(platform_version, inclusive):
+            return True, AppRelease.objects.filter(
+                compatibilities__nextcloud_release_id=platform_version)
+        else:
+            return False, AppRelease.objects.compatible(platform_version,
+                                                        inclusive)
 
 
 class App(TranslatableModel):
@@ -120,17 +229,37 @@ class App(TranslatableModel):
     def can_delete(self, user: User) -> bool:
         return self.owner == user
 
-    def _get_grouped_releases(self, get_release_func):
-        releases = NextcloudRelease.objects.all()
-        versions = map(lambda r: r.version, releases)
-        compatible_releases = map(lambda v: (v, get_release_func(v)), versions)
-        grouped_releases = group_by_main_version(dict(compatible_releases))
+    def _get_grouped_releases(self, unstable):
+        releases = self._releases_by_nextcloud_release()
+        compatible_releases = map(
+            lambda p: (p[0], self._sort_releases(
+                filter(lambda r: r.is_unstable == unstable, p[1]))),
+            releases.items())
+        grouped_releases = group_by_main_version(
+            OrderedDict(compatible_releases))
         # deduplicate releases
         result = {}
         for version, releases in grouped_releases.items():
             result[version] = list(distinct(releases, lambda r: r.version))
         return result
 
+    def _releases_by_nextcloud_release(self):
+        """Looks up the compatible releases for every Nextcloud release in the
+        compatibility index using the already loaded releases of this app
+
+        :return an ordered dict of Nextcloud version: [releases]
+        """
+        versions = NextcloudRelease.objects.values_list('version', flat=True)
+        result = OrderedDict((version, []) for version in versions)
+        releases = {release.id: release for release in self.releases.all()}
+        index = AppReleaseCompatibility.objects.filter(
+            app_release__app=self).values_list('nextcloud_release_id',
+                                               'app_release_id')
+        for version, release_id in index:
+            if version in result and release_id in releases:
+                result[version].append(releases[release_id])
+        return result
+
     def releases_by_platform_v(self):
         """Looks up all compatible stable releases for each platform
         version.
@@ -143,7 +272,7 @@ class App(TranslatableModel):
         :return dict with all compatible stable releases for each platform
                 version.
         """
-        return self._get_grouped_releases(self.compatible_releases)
+        return self._get_grouped_releases(False)
 
     def unstable_releases_by_platform_v(self):
         """Looks up all compatible unstable releases for each platform version.
@@ -156,7 +285,7 @@ class App(TranslatableModel):
         :return dict with all compatible unstable releases for each platform
                 version.
         """
-        return self._get_grouped_releases(self.compatible_unstable_releases)
+        return self._get_grouped_releases(True)
 
     def latest_releases_by_platform_v(self):
         """Looks up the latest stable and unstable release for each platform
@@ -175,24 +304,17 @@ class App(TranslatableModel):
         :return dict with the latest stable and unstable release for each
                 platform version.
         """
-        stable = self.releases_by_platform_v()
-        unstable = self.unstable_releases_by_platform_v()
-
-        def filter_latest(pair):
-            version, releases = pair
-            return (version, self._latest(releases))
-
-        latest_stable = dict(map(filter_latest, stable.items()))
-        latest_unstable = dict(map(filter_latest, unstable.items()))
-        all_versions = set(chain(latest_stable.keys(), latest_unstable.keys()))
-
-        def stable_or_unstable_releases(ver):
-            return (ver, {
-                'stable': latest_stable.get(ver, None),
-                'unstable': latest_unstable.get(ver, None)
-            })
-
-        return dict(map(stable_or_unstable_releases, all_versions))
+        versions = NextcloudRelease.objects.values_list('version', flat=True)
+        main_versions = group_by_main_version({v: [] for v in versions})
+        result = {version: {'stable': None, 'unstable': None}
+                  for version in main_versions.keys()}
+        for latest in self.latest_releases.select_related('stable',
+                                                          'unstable'):
+            result[latest.platform_version] = {
+                'stable': latest.stable,
+                'unstable': latest.unstable
+            }
+        return result
 
     def compatible_releases(self, platform_version, inclusive=True):
         """Returns all stable releases of this app that are compatible
@@ -202,14 +324,9 @@ class App(TranslatableModel):
                           AppRelease.is_compatible()).
         :return a sorted list of all compatible stable releases.
         """
-
-        return sorted(
-            filter(
-                lambda r: r.is_compatible(platform_version,
-                                          inclusive) and not r.is_unstable,
-                self.releases.all()),
-            key=lambda r: AppSemVer(r.version, r.is_nightly, r.last_modified),
-            reverse=True)
+        releases = self.all_compatible_releases(platform_version, inclusive)
+        return self._sort_releases(
+            filter(lambda r: not r.is_unstable, releases))
 
     def compatible_unstable_releases(self, platform_version, inclusive=True):
         """Returns all unstable releases of this app that are compatible with
@@ -219,22 +336,49 @@ class App(TranslatableModel):
                           AppRelease.is_compatible()).
         :return a sorted list of all compatible unstable releases.
         """
+        releases = self.all_compatible_releases(platform_version, inclusive)
+        return self._sort_releases(filter(lambda r: r.is_unstable, releases))
 
-        return sorted(
-            filter(
-                lambda r: r.is_compatible(platform_version,
-                                          inclusive) and r.is_unstable,
-                self.releases.all()),
-            key=lambda r: AppSemVer(r.version, r.is_nightly, r.last_modified),
-            reverse=True)
+    def cache_compatible_releases(self, platform_version, inclusive,
+                                  releases):
+        """Remembers the compatible releases for a platform version so
+        subsequent lookups do not hit the database, e.g. after loading them
+        for many apps at once
 
-    def _latest(self, releases):
-        try:
-            return max(releases,
-                       key=lambda r: AppSemVer(r.version, r.is_nightly,
-                                               r.last_modified))
-        except ValueError:
-            return None
+        :param releases: all compatible stable and unstable releases
+        """
+        key = (platform_version, inclusive and platform_version.count('.') < 2)
+        self._compatible_releases_cache[key] = list(releases)
+
+    def all_compatible_releases(self, platform_version, inclusive=True):
+        """Returns all stable and unstable releases of this app that are
+        compatible with the given platform version. Uses the compatibility
+        index for known Nextcloud releases.
+
+        :param inclusive: Use inclusive version check (see
+                          AppRelease.is_compatible()).
+        :return an unsorted list of all compatible releases.
+        """
+        key = (platform_version, inclusive and platform_version.count('.') < 2)
+        if key not in self._compatible_releases_cache:
+            if NextcloudRelease.objects.is_indexed(platform_version,
+                                                   inclusive):
+                releases = self.releases.filter(
+                    compatibilities__nextcloud_release_id=platform_version)
+            else:
+                releases = check_compatible(
+                    self.releases.compatible(platform_version, inclusive),
+                    platform_version, inclusive)
+            return list(releases)
+        return self._compatible_releases_cache[key]
+
+    @cached_property
+    def _compatible_releases_cache(self):
+        return {}
+
+    def _sort_releases(self, releases):
+        return sorted(releases, key=lambda r: AppSemVer(
+            r.version, r.is_nightly, r.last_modified), reverse=True)
 
     def save(self, *args, **kwargs):
         # If the certificate has changed, delete all releases.
@@ -328,7 +472,22 @@ class AppAuthor(Model):
         verbose_name_plural = _('App authors')
 
 
+class AppReleaseManager(TranslatableManager):
+    def compatible(self, platform_version, inclusive=False):
+        """Returns all releases that are compatible with the platform version
+        by comparing the encoded version bounds in the database. Releases
+        whose spec could not be encoded are returned as well and need to be
+        checked with check_compatible()
+
+        :param inclusive: see AppRelease.is_compatible()
+        """
+        query = compatible_keys_query(platform_version, inclusive)
+        query |= Q(platform_version_min_key=None)
+        return self.get_queryset().filter(query)
+
+
 class AppRelease(TranslatableModel):
+    objects = AppReleaseManager()
     version = CharField(max_length=256, verbose_name=_('Version'),
                         help_text=_('Version follows Semantic Versioning'))
     app = ForeignKey('App', on_delete=CASCADE, verbose_name=_('App'),
@@ -370,6 +529,13 @@ class AppRelease(TranslatableModel):
             'The release changelog. Can contain Markdown'), default='')
     )
     is_nightly = BooleanField(verbose_name=_('Nightly'), default=False)
+    # platform_version_spec encoded as range, see versioning.spec_bounds()
+    platform_version_min_key = BigIntegerField(
+        null=True, blank=True, editable=False, db_index=True,
+        verbose_name=_('Encoded minimum platform version'))
+    platform_version_max_key = BigIntegerField(
+        null=True, blank=True, editable=False, db_index=True,
+        verbose_name=_('Encoded exclusive maximum platform version'))
 
     class Meta:
         verbose_name = _('App release')
@@ -386,6 +552,50 @@ class AppRelease(TranslatableModel):
     def __str__(self) -> str:
         return '%s %s' % (self.app, self.version)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_platform()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.former_generations = self._get_saved_generations()
+        self.platform_version_min_key, self.platform_version_max_key = \
+            spec_keys(self.platform_version_spec)
+        super().save(*args, **kwargs)
+        self._remember_platform()
+
+    @property
+    def generations(self):
+        """
+        :return: the generations of the cached documents which include the
+                 release, see generations.release_generations()
+        """
+        return release_generations(self.platform_version_spec,
+                                   self.platform_version_min_key,
+                                   self.platform_version_max_key)
+
+    def _remember_platform(self):
+        # deferred fields must not be loaded here
+        fields = ('platform_version_spec', 'platform_version_min_key',
+                  'platform_version_max_key')
+        if all(field in self.__dict__ for field in fields):
+            self._saved_platform = tuple(self.__dict__[f] for f in fields)
+        else:
+            self._saved_platform = None
+
+    def _get_saved_generations(self):
+        """
+        :return: the generations which included the release as it is stored
+                 in the database, all generations if that is unknown
+        """
+        if self._state.adding:
+            return set()
+        saved = getattr(self, '_saved_platform', None)
+        if saved is None:
+            return {ALL_PLATFORMS}
+        return release_generations(*saved)
+
     def is_compatible(self, platform_version, inclusive=False):
         """Checks if a release is compatible with a platform version
 
@@ -396,10 +606,10 @@ class AppRelease(TranslatableModel):
         :return: True if compatible, otherwise false
         """
 
-        min_version = Version(pad_min_version(platform_version))
-        spec = Spec(self.platform_version_spec)
+        min_version = parse_min_version(platform_version)
+        spec = parse_spec(self.platform_version_spec)
         if inclusive:
-            max_version = Version(pad_max_inc_version(platform_version))
+            max_version = parse_max_inc_version(platform_version)
             return (min_version in spec or max_version in spec)
         else:
             return min_version in spec
@@ -408,6 +618,34 @@ class AppRelease(TranslatableModel):
     def is_unstable(self):
         return self.is_nightly or '-' in self.version
 
+    def update_compatibility(self):
+        """Updates the compatibility index entries of this release for all
+        known Nextcloud releases
+
+        :return: a set of Nextcloud versions whose compatibility changed
+        """
+        versions = NextcloudRelease.objects.values_list('version', flat=True)
+        compatible = set(filter(self._is_indexed_compatible, versions))
+        indexed = set(self.compatibilities.values_list('nextcloud_release_id',
+                                                       flat=True))
+        self.compatibilities.filter(
+            nextcloud_release_id__in=indexed - compatible).delete()
+        AppReleaseCompatibility.objects.bulk_create([
+            AppReleaseCompatibility(app_release=self,
+                                    nextcloud_release_id=version)
+            for version in compatible - indexed
+        ])
+        return indexed ^ compatible
+
+    def _is_indexed_compatible(self, platform_version):
+        if not NextcloudRelease.is_indexable(platform_version):
+            return False
+        try:
+            return self.is_compatible(platform_version)
+        except ValueError:
+            # releases which are still being created do not have a spec yet
+            return False
+
 
 class Screenshot(Model):
     url = URLField(max_length=256, verbose_name=_('Image url'))
@@ -531,11 +769,24 @@ class DatabaseDependency(Model):
                                  verbose_name=_(
                                      'Database version requirement (raw)'))
 
+    # version_spec encoded as range, see versioning.spec_bounds()
+    version_min_key = BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Encoded minimum database version'))
+    version_max_key = BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Encoded exclusive maximum database version'))
+
     class Meta:
         verbose_name = _('Database dependency')
         verbose_name_plural = _('Database dependencies')
         unique_together = (('app_release', 'database', 'version_spec'),)
 
+    def save(self, *args, **kwargs):
+        self.version_min_key, self.version_max_key = \
+            spec_keys(self.version_spec)
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return '%s: %s %s' % (self.app_release, self.database,
                               self.version_spec)
@@ -567,11 +818,24 @@ class PhpExtensionDependency(Model):
                                  verbose_name=_(
                                      'Extension version requirement (raw)'))
 
+    # version_spec encoded as range, see versioning.spec_bounds()
+    version_min_key = BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Encoded minimum extension version'))
+    version_max_key = BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Encoded exclusive maximum extension version'))
+
     class Meta:
         verbose_name = _('PHP extension dependency')
         verbose_name_plural = _('PHP extension dependencies')
         unique_together = (('app_release', 'php_extension', 'version_spec'),)
 
+    def save(self, *args, **kwargs):
+        self.version_min_key, self.version_max_key = \
+            spec_keys(self.version_spec)
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return '%s: %s %s' % (self.app_release.app, self.php_extension,
                               self.version_spec)
@@ -579,26 +843,296 @@ class PhpExtensionDependency(Model):
 
 @receiver(post_delete, sender=App)
 def record_app_delete(sender, **kwargs):
-    AppReleaseDeleteLog.objects.create()
+    AppReleaseDeleteLog.objects.create(app_id=kwargs['instance'].id)
 
 
 @receiver(post_delete, sender=AppRelease)
 def record_app_release_delete(sender, **kwargs):
-    AppReleaseDeleteLog.objects.create()
+    release = kwargs['instance']
+    AppReleaseDeleteLog.objects.create(app_id=release.app_id,
+                                       version=release.version,
+                                       is_nightly=release.is_nightly)
+
+
+def spec_keys(spec):
+    """Encodes a version spec into integer range bounds which can be compared
+    in the database
+
+    :param spec: the version spec, e.g. >=9.0.0,<12.0.0
+    :return: the minimum and exclusive maximum version keys or None, None if
+             the spec can not be expressed as a range
+    """
+    try:
+        return spec_bounds(spec)
+    except ValueError:
+        return None, None
+
+
+def check_compatible(releases, platform_version, inclusive=False):
+    """Checks the releases returned by AppRelease.objects.compatible() whose
+    spec could not be encoded
+
+    :return: a list of the compatible releases
+    """
+    return [release for release in releases
+            if release.platform_version_min_key is not None or
+            release.is_compatible(platform_version, inclusive)]
+
+
+def compatible_keys_query(platform_version, inclusive=False):
+    """Builds a range predicate on the encoded platform version bounds which
+    is equivalent to AppRelease.is_compatible() for releases whose spec could
+    be encoded
+
+    :param platform_version: the platform version, not required to be
+                             semver compatible
+    :param inclusive: see AppRelease.is_compatible()
+    :return: the query
+    """
+    key = version_key(pad_min_version(platform_version))
+    query = Q(platform_version_min_key__lte=key,
+              platform_version_max_key__gt=key)
+    if inclusive:
+        max_key = version_key(pad_max_inc_version(platform_version),
+                              clamp=True)
+        query |= Q(platform_version_min_key__lte=max_key,
+                   platform_version_max_key__gt=max_key)
+    return query
+
+
+class AppReleaseDeleteLogManager(Manager):
+    def since(self, timestamp):
+        return self.get_queryset().filter(last_modified__gte=timestamp)
 
 
 class AppReleaseDeleteLog(Model):
     """
-    Used to keep track of app and app release deletions
+    Used to keep track of app and app release deletions. App deletions are
+    logged without a version
     """
+    objects = AppReleaseDeleteLogManager()
     last_modified = DateTimeField(auto_now=True, db_index=True)
+    app_id = CharField(max_length=256, blank=True, db_index=True,
+                       verbose_name=_('App id'))
+    version = CharField(max_length=256, blank=True,
+                        verbose_name=_('Version'))
+    is_nightly = BooleanField(verbose_name=_('Nightly'), default=False)
+
+    @property
+    def is_app_deletion(self):
+        return self.version == ''
 
     class Meta:
         verbose_name = _('App release deletion')
         verbose_name_plural = _('App release deletions')
 
     def __str__(self) -> str:
-        return str(self.last_modified)
+        if self.is_app_deletion:
+            return '%s %s' % (self.app_id, self.last_modified)
+        return '%s %s %s' % (self.app_id, self.version, self.last_modified)
+
+
+class AppReleaseJobManager(Manager):
+    def claim(self, timeout, max_attempts):
+        """Marks the oldest queued job as running and returns it. Jobs which
+        were started more than timeout seconds ago are considered abandoned
+        by a crashed worker and are handed out again. Abandoned jobs which
+        were already handed out max_attempts times most likely crash the
+        worker themselves and are marked as failed instead. Safe to be called
+        by concurrent workers since a job is only claimed if its state did
+        not change in between
+
+        :param timeout: seconds after which running jobs are abandoned
+        :param max_attempts: number of times a job is handed out at most
+        :return: the claimed job or None if no job is waiting
+        """
+        now = timezone.now()
+        abandoned = now - datetime.timedelta(seconds=timeout)
+        self.get_queryset().filter(
+            state=AppReleaseJob.RUNNING, started__lt=abandoned,
+            attempts__gte=max_attempts
+        ).update(state=AppReleaseJob.FAILED, status_code=500,
+                 error=json.dumps({'detail': 'The upload was aborted %i '
+                                             'times' % max_attempts}),
+                 finished=now, last_modified=now)
+        waiting = self.get_queryset().filter(
+            Q(state=AppReleaseJob.QUEUED) |
+            Q(state=AppReleaseJob.RUNNING, started__lt=abandoned,
+              attempts__lt=max_attempts)
+        ).order_by('created')
+        for job in waiting[:10]:
+            now = timezone.now()
+            claimed = self.get_queryset().filter(
+                pk=job.pk, state=job.state, started=job.started
+            ).update(state=AppReleaseJob.RUNNING, started=now, stage='',
+                     attempts=F('attempts') + 1, last_modified=now)
+            if claimed:
+                job.state = AppReleaseJob.RUNNING
+                job.started = now
+                job.stage = ''
+                job.attempts += 1
+                return job
+        return None
+
+
+class AppReleaseJob(Model):
+    """
+    A queued release upload which is processed by the processreleasejobs
+    management command
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATES = (
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (SUCCEEDED, _('Succeeded')),
+        (FAILED, _('Failed')),
+    )
+
+    objects = AppReleaseJobManager()
+    id = UUIDField(primary_key=True, default=uuid4, editable=False)
+    owner = ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE,
+                       verbose_name=_('Owner'),
+                       related_name='app_release_jobs')
+    download = URLField(max_length=256, verbose_name=_('Archive download Url'))
+    signature = TextField(verbose_name=_('Signature'))
+    is_nightly = BooleanField(verbose_name=_('Nightly'), default=False)
+    state = CharField(max_length=16, choices=STATES, default=QUEUED,
+                      db_index=True, verbose_name=_('State'))
+    stage = CharField(max_length=32, blank=True, verbose_name=_('Stage'))
+    attempts = PositiveIntegerField(default=0, verbose_name=_('Attempts'))
+    status_code = IntegerField(null=True, blank=True,
+                               verbose_name=_('Status code'))
+    error = TextField(blank=True, verbose_name=_('Error'))
+    app_id = CharField(max_length=256, blank=True, verbose_name=_('App id'))
+    version = CharField(max_length=256, blank=True,
+                        verbose_name=_('Version'))
+    created = DateTimeField(auto_now_add=True, editable=False, db_index=True,
+                            verbose_name=_('Created at'))
+    last_modified = DateTimeField(auto_now=True, editable=False,
+                                  verbose_name=_('Updated at'))
+    started = DateTimeField(null=True, blank=True,
+                            verbose_name=_('Started at'))
+    finished = DateTimeField(null=True, blank=True,
+                             verbose_name=_('Finished at'))
+
+    class Meta:
+        verbose_name = _('App release job')
+        verbose_name_plural = _('App release jobs')
+        ordering = ('-created',)
+
+    def __str__(self) -> str:
+        return '%s %s' % (self.download, self.state)
+
+    def set_stage(self, stage):
+        self.stage = stage
+        self.save(update_fields=('stage', 'last_modified'))
+
+    def finish(self, status_code, error=''):
+        """Marks the job as succeeded or failed depending on the status code
+
+        :param status_code: the status code the upload API would have
+                            responded with
+        :param error: the error details if the upload failed
+        """
+        if status_code < 400:
+            self.state = AppReleaseJob.SUCCEEDED
+        else:
+            self.state = AppReleaseJob.FAILED
+        self.status_code = status_code
+        self.error = error
+        self.finished = timezone.now()
+        self.save()
+
+
+class AppReleaseMetadataManager(Manager):
+    def total_size(self):
+        """
+        :return: the size of all stored metadata in bytes
+        """
+        return self.get_queryset().aggregate(size=Sum('size'))['size'] or 0
+
+    def prune(self, max_size):
+        """Deletes the least recently used metadata until all stored metadata
+        takes up at most max_size bytes
+
+        :param max_size: the maximum size in bytes
+        :return: the number of deleted entries
+        """
+        total = self.total_size()
+        if total <= max_size:
+            return 0
+        cutoff = None
+        entries = self.get_queryset().order_by('last_used')
+        for last_used, size in entries.values_list('last_used', 'size'):
+            if total <= max_size:
+                break
+            total -= size
+            cutoff = last_used
+        deleted, _ = self.get_queryset().filter(last_used__lte=cutoff).delete()
+        # validators of urls whose metadata is gone can not be used anymore
+        AppReleaseOrigin.objects.exclude(
+            digest__in=self.get_queryset().values('digest')).delete()
+        return deleted
+
+
+class AppReleaseMetadata(Model):
+    """
+    The parsed info.xml and changelogs of a release archive, identified by
+    the SHA-256 digest of the archive. Uploading the same archive again
+    skips extracting and parsing it
+    """
+    objects = AppReleaseMetadataManager()
+    digest = CharField(max_length=64, verbose_name=_('SHA-256 digest'))
+    is_nightly = BooleanField(default=False, verbose_name=_('Nightly'))
+    parser = CharField(max_length=64, verbose_name=_('Parser version'),
+                       help_text=_('Metadata which was parsed using a '
+                                   'different schema or transformation is '
+                                   'not used'))
+    app_id = CharField(max_length=256, verbose_name=_('App id'))
+    version = CharField(max_length=256, verbose_name=_('Version'))
+    info = TextField(verbose_name=_('Parsed metadata as JSON'))
+    size = PositiveIntegerField(verbose_name=_('Size in bytes'))
+    hits = PositiveIntegerField(default=0, verbose_name=_('Hits'))
+    created = DateTimeField(auto_now_add=True, editable=False,
+                            verbose_name=_('Created at'))
+    last_used = DateTimeField(default=timezone.now, db_index=True,
+                              verbose_name=_('Last used at'))
+
+    class Meta:
+        verbose_name = _('App release metadata')
+        verbose_name_plural = _('App release metadata')
+        unique_together = (('digest', 'is_nightly', 'parser'),)
+
+    def __str__(self) -> str:
+        return '%s %s %s' % (self.app_id, self.version, self.digest)
+
+
+class AppReleaseOrigin(Model):
+    """
+    The HTTP validators of a release download url and the digests of the
+    archive it served last. They are sent on the next download of the url
+    so an unchanged archive is not downloaded again
+    """
+    url = URLField(max_length=256, unique=True,
+                   verbose_name=_('Archive download Url'))
+    etag = CharField(max_length=256, blank=True, verbose_name=_('ETag'))
+    last_modified = CharField(max_length=64, blank=True,
+                              verbose_name=_('Last-Modified'))
+    digest = CharField(max_length=64, db_index=True,
+                       verbose_name=_('SHA-256 digest'))
+    digests = TextField(verbose_name=_('Digests by algorithm as JSON'))
+    last_used = DateTimeField(default=timezone.now,
+                              verbose_name=_('Last used at'))
+
+    class Meta:
+        verbose_name = _('App release origin')
+        verbose_name_plural = _('App release origins')
+
+    def __str__(self) -> str:
+        return self.url
 
 
 class AppOwnershipTransfer(Model):
@@ -662,6 +1196,38 @@ class NextcloudReleaseManager(Manager):
     def get_current(self):
         return self.get_queryset().filter(is_current=True)[:1]
 
+    def get_nearest(self, version):
+        """Maps a platform version onto the closest known Nextcloud release
+        of the same major.minor series which is not newer than the version
+
+        :param version: a platform version, e.g. 11.0.2
+        :return: the closest known version or the version itself if no
+                 Nextcloud release of the series is known
+        """
+        return nearest_version(version, self.get_indexable_versions())
+
+    def get_indexable_versions(self):
+        """
+        :return: all versions which are kept in the compatibility index,
+                 sorted from oldest to newest
+        """
+        versions = filter(NextcloudRelease.is_indexable,
+                          self.get_queryset().values_list('version',
+                                                          flat=True))
+        return sorted(versions, key=lambda v: tuple(map(int, v.split('.'))))
+
+    def is_indexed(self, version, inclusive=False):
+        """Checks if compatibility lookups for a platform version can be
+        answered by the compatibility index
+
+        :param inclusive: see AppRelease.is_compatible(), only makes a
+                          difference for versions which are not fully padded
+        :return: True if the version is a known Nextcloud release
+        """
+        if not NextcloudRelease.is_indexable(version):
+            return False
+        return self.get_queryset().filter(version=version).exists()
+
 
 class NextcloudRelease(Model):
     objects = NextcloudReleaseManager()
@@ -689,3 +1255,198 @@ class NextcloudRelease(Model):
 
     def __str__(self):
         return self.version
+
+    @staticmethod
+    def is_indexable(version):
+        """Only full semantic versions are kept in the compatibility index
+        since inclusive and exclusive compatibility checks are equal for them
+        """
+        try:
+            parse_version(version)
+            return True
+        except ValueError:
+            return False
+
+    def update_compatibility(self):
+        """Updates the compatibility index entries of all app releases for
+        this Nextcloud release and the latest release pointers of all
+        affected apps
+        """
+        releases = AppRelease.objects.only('id', 'app_id', 'version',
+                                           'platform_version_spec')
+        compatible = set(r.id for r in releases
+                         if r._is_indexed_compatible(self.version))
+        indexed = set(self.compatibilities.values_list('app_release_id',
+                                                       flat=True))
+        self.compatibilities.filter(
+            app_release_id__in=indexed - compatible).delete()
+        AppReleaseCompatibility.objects.bulk_create([
+            AppReleaseCompatibility(app_release_id=release_id,
+                                    nextcloud_release=self)
+            for release_id in compatible - indexed
+        ])
+        changed = AppRelease.objects.filter(id__in=indexed ^ compatible)
+        app_ids = set(changed.values_list('app_id', flat=True))
+        for app_id in app_ids:
+            AppLatestRelease.objects.update_app(app_id)
+
+
+class AppReleaseCompatibility(Model):
+    """
+    Materialized compatibility between app releases and known Nextcloud
+    releases which is used to look up compatible apps and releases in the
+    database instead of checking every release's version spec
+    """
+    app_release = ForeignKey('AppRelease', on_delete=CASCADE,
+                             verbose_name=_('App release'),
+                             related_name='compatibilities')
+    nextcloud_release = ForeignKey('NextcloudRelease', on_delete=CASCADE,
+                                   verbose_name=_('Nextcloud release'),
+                                   related_name='compatibilities')
+
+    class Meta:
+        verbose_name = _('App release compatibility')
+        verbose_name_plural = _('App release compatibilities')
+        unique_together = (('nextcloud_release', 'app_release'),)
+
+    def __str__(self) -> str:
+        return '%s: %s' % (self.app_release, self.nextcloud_release)
+
+
+class AppLatestReleaseManager(Manager):
+    def update_app(self, app_id):
+        """Recomputes the latest stable and unstable releases of an app for
+        each platform main version from the compatibility index
+        :param app_id: the app id
+        """
+        index = AppReleaseCompatibility.objects.filter(
+            app_release__app_id=app_id).select_related('app_release')
+        releases = {}  # type: Dict[str, List[AppRelease]]
+        for entry in index:
+            releases.setdefault(entry.nextcloud_release_id, []).append(
+                entry.app_release)
+
+        latest = []
+        for version, releases in group_by_main_version(releases).items():
+            stable = latest_release(filter(lambda r: not r.is_unstable,
+                                           releases))
+            unstable = latest_release(filter(lambda r: r.is_unstable,
+                                             releases))
+            latest.append(AppLatestRelease(app_id=app_id,
+                                           platform_version=version,
+                                           stable=stable, unstable=unstable))
+        self.get_queryset().filter(app_id=app_id).delete()
+        self.bulk_create(latest)
+
+
+class AppLatestRelease(Model):
+    """
+    Points to the latest stable and unstable release of an app for a platform
+    main version, e.g. 12
+    """
+    objects = AppLatestReleaseManager()
+    app = ForeignKey('App', on_delete=CASCADE, verbose_name=_('App'),
+                     related_name='latest_releases')
+    platform_version = CharField(max_length=100,
+                                 verbose_name=_('Nextcloud main version'))
+    stable = ForeignKey('AppRelease', on_delete=SET_NULL, null=True,
+                        blank=True, related_name='+',
+                        verbose_name=_('Latest stable release'))
+    unstable = ForeignKey('AppRelease', on_delete=SET_NULL, null=True,
+                          blank=True, related_name='+',
+                          verbose_name=_('Latest unstable release'))
+
+    class Meta:
+        verbose_name = _('Latest app release')
+        verbose_name_plural = _('Latest app releases')
+        unique_together = (('app', 'platform_version'),)
+
+    def __str__(self) -> str:
+        return '%s: %s' % (self.app, self.platform_version)
+
+
+def latest_release(releases):
+    """
+    :param releases: an iterable of releases
+    :return: the latest release or None if there are no releases
+    """
+    try:
+        return max(releases, key=lambda r: AppSemVer(r.version, r.is_nightly,
+                                                     r.last_modified))
+    except ValueError:
+        return None
+
+
+@receiver(post_save, sender=AppRelease)
+def update_app_release_compatibility(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.update_compatibility()
+        AppLatestRelease.objects.update_app(instance.app_id)
+
+
+@receiver(post_delete, sender=AppRelease)
+def update_app_latest_releases(sender, instance, **kwargs):
+    AppLatestRelease.objects.update_app(instance.app_id)
+
+
+@receiver(post_save, sender=NextcloudRelease)
+def update_nextcloud_release_compatibility(sender, instance, raw=False,
+                                           **kwargs):
+    if not raw:
+        instance.update_compatibility()
+
+
+@receiver(post_delete, sender=NextcloudRelease)
+def update_nextcloud_release_latest_releases(sender, instance, **kwargs):
+    # the index entries are already gone, so update every app which had a
+    # release for the main version
+    main_version = instance.version.split('.')[0]
+    latest = AppLatestRelease.objects.filter(platform_version=main_version)
+    for app_id in set(latest.values_list('app_id', flat=True)):
+        AppLatestRelease.objects.update_app(app_id)
+
+
+@receiver(post_save, sender=App)
+def bump_app_generations(sender, instance, raw=False, **kwargs):
+    # the app is included in every document which lists one of its releases
+    releases = instance.releases.values_list('platform_version_spec',
+                                             'platform_version_min_key',
+                                             'platform_version_max_key')
+    generations = set()
+    for spec, min_key, max_key in releases:
+        generations |= release_generations(spec, min_key, max_key)
+    bump_generations(generations)
+
+
+@receiver(post_save, sender=AppRelease)
+def bump_app_release_generations(sender, instance, raw=False, **kwargs):
+    former = getattr(instance, 'former_generations', {ALL_PLATFORMS})
+    bump_generations(former | instance.generations)
+
+
+@receiver(post_delete, sender=AppRelease)
+def bump_deleted_app_release_generations(sender, instance, **kwargs):
+    bump_generations(instance.generations)
+
+
+@receiver(post_save, sender=AppRating)
+@receiver(post_delete, sender=AppRating)
+def bump_app_rating_generations(sender, instance, **kwargs):
+    bump_generations(['ratings', 'ratings:%s' % instance.app_id])
+
+
+@receiver(post_save, sender=Category)
+def bump_category_generations(sender, instance, **kwargs):
+    bump_generations(['categories'])
+
+
+@receiver(post_delete, sender=Category)
+def bump_deleted_category_generations(sender, instance, **kwargs):
+    # apps reference their categories by id
+    bump_generations(['categories', ALL_PLATFORMS])
+
+
+@receiver(post_save, sender=NextcloudRelease)
+@receiver(post_delete, sender=NextcloudRelease)
+def bump_nextcloud_release_generations(sender, instance, **kwargs):
+    bump_platform_versions()
@@ -1,6 +1,5 @@
 from django import template
-from nextcloudappstore.core.versioning import pad_min_version
-from semantic_version import Version
+from nextcloudappstore.core.versioning import parse_min_version
 
 register = template.Library()
 
@@ -10,6 +9,6 @@ def sort_by_version(value, arg):
     reverse = True if arg == 'desc' else False
     ret_list = []
     for key in sorted(value.keys(), reverse=reverse,
-                      key=lambda v: Version(pad_min_version(v))):
+                      key=parse_min_version):
         ret_list.append((key, value[key]))
     return ret_list
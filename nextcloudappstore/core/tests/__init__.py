@@ -3,3 +3,5 @@ from .test_rating import *
 from .test_compatibility import *
 from .test_search import *
 from .test_deletion_log import *
+from .test_caching import *
+from .test_benchmark import *
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from nextcloudappstore.core.benchmark.catalog import generate_catalog
+from nextcloudappstore.core.benchmark.download import measure_download
+from nextcloudappstore.core.benchmark.metadata import \
+    measure_metadata_parsing, measure_bounded_read
+from nextcloudappstore.core.benchmark.runner import scenario_urls, \
+    measure_url, compare_reports
+from nextcloudappstore.core.facades import read_relative_file
+from nextcloudappstore.core.models import App, AppRating, AppRelease, \
+    NextcloudRelease, Screenshot
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog(self):
+        generate_catalog(3, releases=2, languages=3, ratings=4,
+                         screenshots=2)
+        self.assertEqual(3, App.objects.count())
+        self.assertEqual(6, AppRelease.objects.count())
+        self.assertEqual(6, Screenshot.objects.count())
+        app = App.objects.get(id='benchmark0')
+        self.assertEqual(3, app.translations.count())
+        specs = list(AppRelease.objects.order_by('app', 'version').values_list(
+            'platform_version_spec', flat=True))
+        ratings = AppRating.objects.count()
+
+        # growing the catalog does not change existing apps
+        generate_catalog(4, releases=2, languages=3, ratings=4,
+                         screenshots=2)
+        self.assertEqual(specs, list(AppRelease.objects.exclude(
+            app_id='benchmark3').order_by('app', 'version').values_list(
+            'platform_version_spec', flat=True)))
+        self.assertEqual(ratings, AppRating.objects.exclude(
+            app_id='benchmark3').count())
+
+    def test_scenarios(self):
+        NextcloudRelease.objects.create(version='11.0.0', is_current=True)
+        generate_catalog(2, ratings=2, screenshots=1)
+        for name, url in scenario_urls('11.0.0', 'benchmark0'):
+            result = measure_url(url, 1)
+            self.assertEqual(200, result['status'], name)
+            self.assertGreater(result['bytes'], 0)
+            self.assertLessEqual(result['warm_queries'],
+                                 result['cold_queries'])
+
+    def test_compare_reports(self):
+        previous = {'results': [{'name': 'home', 'cold_duration': 2.0,
+                                 'cold_queries': 10, 'peak_rss': 100}]}
+        current = {'results': [{'name': 'home', 'cold_duration': 1.0,
+                                'cold_queries': 8, 'peak_rss': 150},
+                               {'name': 'feeds.rss', 'cold_duration': 1.0}]}
+        self.assertEqual([{'name': 'home', 'cold_duration': -0.5,
+                           'cold_queries': -2, 'peak_rss': 0.5}],
+                         compare_reports(previous, current))
+
+    def test_metadata_parsing(self):
+        xml = read_relative_file(
+            __file__, '../api/v1/tests/data/infoxmls/minimal.xml')
+        result = measure_metadata_parsing(xml, 2)
+        self.assertGreater(result['uncompiled'], 0)
+        self.assertGreater(result['compiled'], 0)
+
+    def test_bounded_read(self):
+        result = measure_bounded_read(4096, 2)
+        self.assertGreater(result['concatenating'], 0)
+        self.assertGreater(result['bounded'], 0)
+
+    def test_download(self):
+        result = measure_download(4096, 2, 1024)
+        self.assertEqual(2, result['unpooled']['connections'])
+        self.assertEqual(0, result['pooled']['connections'])
+        self.assertGreater(result['pooled']['throughput'], 0)
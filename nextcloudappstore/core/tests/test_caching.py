@@ -0,0 +1,247 @@
+import gzip
+from hashlib import sha1
+from unittest.mock import patch, MagicMock
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, RequestFactory, override_settings
+
+from nextcloudappstore.core.caching import get_snapshot, snapshot_response, \
+    get_accepted_encodings, apps_etag, categories_etag, app_ratings_etag, \
+    app_rating_etag, Snapshot
+from nextcloudappstore.core.generations import release_generations, \
+    ALL_PLATFORMS
+from nextcloudappstore.core.models import App, AppRelease, NextcloudRelease, \
+    Category, AppRating
+from nextcloudappstore.core.versioning import spec_bounds
+
+
+class SnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_render_once_per_etag(self):
+        with patch('nextcloudappstore.core.caching.gzip.compress',
+                   wraps=gzip.compress) as compress:
+            first = get_snapshot('test', 'etag', lambda: b'content')
+            second = get_snapshot('test', 'etag', lambda: b'other')
+            self.assertEqual(b'content', second.content)
+            self.assertEqual(first.encodings, second.encodings)
+            self.assertEqual(1, compress.call_count)
+            third = get_snapshot('test', 'etag2', lambda: b'other')
+            self.assertEqual(b'other', third.content)
+            self.assertEqual(2, compress.call_count)
+
+    def test_wait_for_other_process(self):
+        # another process holds the lock and stores the snapshot meanwhile
+        cache.add('snapshot:%s:lock:etag' % sha1(b'test').hexdigest(), True)
+
+        def sleep(seconds):
+            cache.set('snapshot:%s' % sha1(b'test').hexdigest(),
+                      Snapshot('etag', b'other', {'gzip': b'gzipped'}))
+
+        render = MagicMock(return_value=b'rendered')
+        with patch('nextcloudappstore.core.caching.time.sleep', sleep):
+            snapshot = get_snapshot('test', 'etag', render)
+        self.assertEqual(b'other', snapshot.content)
+        self.assertFalse(render.called)
+
+    @patch('nextcloudappstore.core.caching.SNAPSHOT_WAIT', 0)
+    def test_wait_timeout(self):
+        cache.add('snapshot:%s:lock:etag' % sha1(b'test').hexdigest(), True)
+        snapshot = get_snapshot('test', 'etag', lambda: b'content')
+        self.assertEqual(b'content', snapshot.content)
+        self.assertEqual({}, snapshot.encodings)
+        self.assertIsNone(cache.get('snapshot:%s' %
+                                    sha1(b'test').hexdigest()))
+
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = snapshot_response(request, snapshot, 'application/json')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b'content', response.content)
+
+    def test_accepted_encodings(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, '
+                                                             'br;q=0, '
+                                                             'deflate;q=0.5')
+        self.assertEqual(['gzip', 'deflate'], get_accepted_encodings(request))
+        self.assertEqual([], get_accepted_encodings(self.factory.get('/')))
+
+    def test_response_encoding(self):
+        snapshot = get_snapshot('test', 'etag', lambda: b'content' * 100)
+
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = snapshot_response(request, snapshot, 'application/json')
+        self.assertEqual('br', response['Content-Encoding'])
+        self.assertEqual(b'content' * 100,
+                         brotli.decompress(response.content))
+
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = snapshot_response(request, snapshot, 'application/json')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(b'content' * 100, gzip.decompress(response.content))
+        self.assertEqual('Accept-Encoding', response['Vary'])
+
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='identity')
+        response = snapshot_response(request, snapshot, 'application/json')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b'content' * 100, response.content)
+        self.assertEqual('application/json', response['Content-Type'])
+
+
+class EtagTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.user = get_user_model().objects.create_user(
+            username='test', password='test', email='test@test.com')
+        for version in ('10.0.0', '11.0.0', '12.0.0'):
+            NextcloudRelease.objects.create(version=version)
+        self.news = App.objects.create(pk='news', owner=self.user)
+        self.mail = App.objects.create(pk='mail', owner=self.user)
+        AppRelease.objects.create(app=self.news, version='1.0.0',
+                                  platform_version_spec='>=10.0.0,<11.0.0')
+
+    def test_single_cache_lookup(self):
+        apps_etag(self.request, '10.0.1')
+        with self.assertNumQueries(0), \
+                patch('nextcloudappstore.core.caching.cache.get_many',
+                      wraps=cache.get_many) as get_many:
+            etag = apps_etag(self.request, '10.0.1')
+            self.assertEqual(etag, apps_etag(self.request, '10.0.1'))
+            self.assertEqual(2, get_many.call_count)
+
+    def test_release_for_other_platform(self):
+        etag = apps_etag(self.request, '10.0.0')
+        other = apps_etag(self.request, '12.0.0')
+        AppRelease.objects.create(app=self.mail, version='1.0.0',
+                                  platform_version_spec='>=12.0.0,<13.0.0')
+        self.assertEqual(etag, apps_etag(self.request, '10.0.0'))
+        self.assertNotEqual(other, apps_etag(self.request, '12.0.0'))
+
+    def test_release_of_listed_app(self):
+        etag = apps_etag(self.request, '10.0.0')
+        AppRelease.objects.create(app=self.news, version='2.0.0',
+                                  platform_version_spec='>=12.0.0,<13.0.0')
+        self.news.save()
+        self.assertNotEqual(etag, apps_etag(self.request, '10.0.0'))
+
+    def test_changed_spec(self):
+        release = AppRelease.objects.create(
+            app=self.mail, version='1.0.0',
+            platform_version_spec='>=10.0.0,<11.0.0')
+        etag = apps_etag(self.request, '10.0.0')
+        release = AppRelease.objects.get(pk=release.pk)
+        release.platform_version_spec = '>=12.0.0,<13.0.0'
+        release.save()
+        self.assertNotEqual(etag, apps_etag(self.request, '10.0.0'))
+
+    def test_nearest_platform(self):
+        etag = apps_etag(self.request, '12.0.3')
+        AppRelease.objects.create(app=self.mail, version='1.0.0',
+                                  platform_version_spec='>=12.0.0,<13.0.0')
+        self.assertNotEqual(etag, apps_etag(self.request, '12.0.3'))
+
+    def test_newer_platform(self):
+        etag = apps_etag(self.request, '13.0.0')
+        AppRelease.objects.create(app=self.mail, version='1.0.0',
+                                  platform_version_spec='>=12.0.0,<13.0.0')
+        self.assertEqual(etag, apps_etag(self.request, '13.0.0'))
+        AppRelease.objects.create(app=self.mail, version='2.0.0',
+                                  platform_version_spec='>=13.0.0')
+        self.assertNotEqual(etag, apps_etag(self.request, '13.0.0'))
+
+    def test_new_platform(self):
+        etag = apps_etag(self.request, '10.0.0')
+        NextcloudRelease.objects.create(version='13.0.0')
+        self.assertNotEqual(etag, apps_etag(self.request, '10.0.0'))
+
+    def test_selection(self):
+        def etag(params):
+            request = RequestFactory().get('/', params)
+            return apps_etag(request, '10.0.0')
+
+        self.assertEqual(etag({}), apps_etag(self.request, '10.0.0'))
+        self.assertEqual(etag({'releaseFields': 'version,isNightly'}),
+                         etag({'releaseFields': 'is_nightly,version'}))
+        self.assertEqual(etag({'languages': 'DE,en'}),
+                         etag({'languages': 'en,de'}))
+        self.assertNotEqual(etag({}), etag({'fields': 'id'}))
+        self.assertNotEqual(etag({'fields': 'id'}),
+                            etag({'releaseFields': 'id'}))
+        self.assertNotEqual(etag({'languages': 'de'}),
+                            etag({'languages': 'fr'}))
+
+    def test_categories(self):
+        etag = categories_etag(self.request)
+        with self.assertNumQueries(0):
+            self.assertEqual(etag, categories_etag(self.request))
+        Category.objects.create(id='tools')
+        self.assertNotEqual(etag, categories_etag(self.request))
+
+    def test_ratings(self):
+        etag = app_ratings_etag(self.request)
+        news = app_rating_etag(self.request, 'news')
+        mail = app_rating_etag(self.request, 'mail')
+        AppRating.objects.create(app=self.news, user=self.user, rating=1.0)
+        self.assertNotEqual(etag, app_ratings_etag(self.request))
+        self.assertNotEqual(news, app_rating_etag(self.request, 'news'))
+        self.assertEqual(mail, app_rating_etag(self.request, 'mail'))
+
+    def test_release_generations(self):
+        def generations(spec):
+            return release_generations(spec, *spec_bounds(spec))
+
+        self.assertEqual({'apps:9', 'apps:10', 'apps:11'},
+                         generations('>=9.0.0,<12.0.0'))
+        self.assertEqual({'apps:12'}, generations('>=12.0.0,<12.0.1'))
+        self.assertEqual({ALL_PLATFORMS}, generations('>=9.0.0'))
+        self.assertEqual({ALL_PLATFORMS}, generations('*'))
+        self.assertEqual({ALL_PLATFORMS},
+                         release_generations('~9.0', None, None))
+        self.assertEqual(set(), release_generations('', None, None))
+
+
+class ApiV0AppsTest(TestCase):
+    url = reverse('api:v0:apps')
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(id='tools')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_unknown_category(self):
+        with patch('nextcloudappstore.core.api.v0.views.get_snapshot',
+                   wraps=get_snapshot) as snapshot:
+            response = self.client.get(self.url, {'version': '9x1',
+                                                  'categories': 'unknown'})
+            self.assertEqual(200, response.status_code)
+            self.assertIn(b'<totalitems>0</totalitems>', response.content)
+            snapshot.assert_not_called()
+            self.assertEqual(200, self.client.get(self.url, {
+                'version': '9x1', 'categories': Category.objects.get().ocsid
+            }).status_code)
+            self.assertEqual(1, snapshot.call_count)
+
+    @override_settings(ALLOWED_HOSTS=['one.com', '.two.com'])
+    def test_detail_page_of_request_host(self):
+        user = get_user_model().objects.create_user(
+            username='test', password='test', email='test@test.com')
+        app = App.objects.create(pk='news', owner=user, ocsid=1)
+        category = Category.objects.get()
+        category.name = 'Tools'
+        category.save()
+        app.categories.add(category)
+        AppRelease.objects.create(app=app, version='1.0.0',
+                                  platform_version_spec='>=10.0.0,<11.0.0')
+        with patch('nextcloudappstore.core.api.v0.views.get_snapshot',
+                   wraps=get_snapshot) as snapshot:
+            for host in ('one.com', 'www.two.com'):
+                response = self.client.get(self.url, {'version': '9x1'},
+                                           HTTP_HOST=host)
+                self.assertIn(('<detailpage>http://%s/' % host)
+                              .encode('utf-8'), response.content)
+        self.assertEqual(1, snapshot.call_count)
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
-from nextcloudappstore.core.models import App, AppRelease, NextcloudRelease
+from nextcloudappstore.core.models import App, AppRelease, \
+    NextcloudRelease, AppReleaseCompatibility, AppLatestRelease
 
 
 class CompatibilityTest(TestCase):
@@ -99,6 +100,103 @@ class CompatibilityTest(TestCase):
         self.assertEqual(app1['10']['stable'].version, '3.0.0')
         self.assertEqual(app1['12']['unstable'].version, '6.0.0')
 
+    def test_compatible_query(self):
+        specs = ['*', '>=9.0.0', '<10.0.0', '>=9.0.1,<9.0.2',
+                 '>=10.0.0,<12.0.0', '>=12.0.0', '>=9.1.0,<9.2.0']
+        for i, spec in enumerate(specs):
+            AppRelease.objects.create(app=self.app1, version='1.0.%i' % i,
+                                      platform_version_spec=spec)
+        for version in ['9', '9.0', '9.0.1', '9.1', '10.0.0', '11.0.3',
+                        '12.0.0-beta.1', '12.0.0', '13']:
+            for inclusive in [True, False]:
+                expected = {r.version for r in AppRelease.objects.all()
+                            if r.is_compatible(version, inclusive)}
+                releases = AppRelease.objects.compatible(version, inclusive)
+                self.assertEqual(expected, {r.version for r in releases},
+                                 '%s %s' % (version, inclusive))
+
+    def test_compatible_query_unencoded_spec(self):
+        AppRelease.objects.create(app=self.app1, version='1.0.0',
+                                  platform_version_spec='>9.0.0')
+        release = AppRelease.objects.get()
+        self.assertIsNone(release.platform_version_min_key)
+        self.assertEqual(['1.0.0'], [r.version for r in
+                                     self.app1.compatible_releases('9.0.1')])
+        self.assertEqual([], self.app1.compatible_releases('9.0.0'))
+        self.assertEqual(['news'], [a.id for a in
+                                    App.objects.get_compatible('9.0.1')])
+        self.assertEqual([], App.objects.get_compatible('9.0.0'))
+
+    def test_index_nextcloud_release_created_later(self):
+        self._create_example_releases()
+        self._create_nextcloud_versions()
+        indexed = AppReleaseCompatibility.objects.filter(
+            nextcloud_release_id='10.0.0', app_release__app=self.app1)
+        versions = sorted(indexed.values_list('app_release__version',
+                                              flat=True))
+        self.assertEqual(['2.0.0', '3.0.0'], versions)
+
+    def test_index_release_created_later(self):
+        self._create_nextcloud_versions()
+        self._create_example_releases()
+        indexed = AppReleaseCompatibility.objects.filter(
+            nextcloud_release_id='12.0.0', app_release__app=self.app1)
+        self.assertEqual(4, indexed.count())
+
+    def test_index_release_updated(self):
+        self._create_nextcloud_versions()
+        release = AppRelease.objects.create(
+            app=self.app1, version='1.0.0',
+            platform_version_spec='>=9.0.0,<10.0.0')
+        self.assertEqual(2, release.compatibilities.count())
+        release.platform_version_spec = '>=13.0.0'
+        release.save()
+        self.assertEqual(['13.0.0'], list(release.compatibilities.values_list(
+            'nextcloud_release_id', flat=True)))
+
+    def test_indexed_compatible_apps(self):
+        self._create_nextcloud_versions()
+        self._create_example_releases()
+        with self.assertNumQueries(1):
+            self.assertTrue(NextcloudRelease.objects.is_indexed('11.0.0'))
+        self.assertFalse(NextcloudRelease.objects.is_indexed('11.0'))
+        self.assertFalse(NextcloudRelease.objects.is_indexed('11.0.1'))
+        for version in self.platform_versions:
+            indexed = App.objects.get_compatible(version)
+            expected = [a for a in App.objects.all() if any(map(
+                lambda r: r.is_compatible(version), a.releases.all()))]
+            self.assertEqual(sorted(a.id for a in expected),
+                             sorted(a.id for a in indexed))
+
+    def test_indexed_compatible_releases_prefetched(self):
+        self._create_nextcloud_versions()
+        self._create_example_releases()
+        apps = App.objects.get_compatible('12.0.0')
+        with self.assertNumQueries(0):
+            releases = apps[0].compatible_releases('12.0.0')
+        self.assertEqual(['5.0.0', '4.0.0'],
+                         [r.version for r in releases])
+
+    def test_latest_release_deleted(self):
+        self._create_nextcloud_versions()
+        self._create_example_releases()
+        latest = AppLatestRelease.objects.get(app=self.app1,
+                                              platform_version='12')
+        self.assertEqual('5.0.0', latest.stable.version)
+        latest.stable.delete()
+        latest = self.app1.latest_releases_by_platform_v()
+        self.assertEqual('4.0.0', latest['12']['stable'].version)
+        self.assertEqual('6.0.0', latest['12']['unstable'].version)
+
+    def test_latest_nextcloud_release_deleted(self):
+        self._create_nextcloud_versions()
+        self._create_example_releases()
+        NextcloudRelease.objects.get(version='13.0.0').delete()
+        self.assertFalse(AppLatestRelease.objects.filter(
+            platform_version='13').exists())
+        self.assertTrue(AppLatestRelease.objects.filter(
+            platform_version='12').exists())
+
     def _create_nextcloud_versions(self):
         for version in self.platform_versions:
             NextcloudRelease.objects.create(version=version)
@@ -11,6 +11,9 @@ class DeletionLogTest(TestCase):
 
         app.delete()
         self.assertEqual(1, AppReleaseDeleteLog.objects.count())
+        log = AppReleaseDeleteLog.objects.get()
+        self.assertEqual('news', log.app_id)
+        self.assertTrue(log.is_app_deletion)
 
     def test_delete_owner(self):
         user = get_user_model().objects.create(username='john')
@@ -28,3 +31,8 @@ class DeletionLogTest(TestCase):
 
         release.delete()
         self.assertEqual(1, AppReleaseDeleteLog.objects.count())
+        log = AppReleaseDeleteLog.objects.get()
+        self.assertEqual('news', log.app_id)
+        self.assertEqual('1.0.0', log.version)
+        self.assertFalse(log.is_nightly)
+        self.assertFalse(log.is_app_deletion)
@@ -4,8 +4,10 @@ from sys import maxsize
 from django.test import TestCase
 from nextcloudappstore.core.versioning import pad_min_version, to_spec, \
     pad_max_version, pad_max_inc_version, raw_version, to_raw_spec, \
-    AppSemVer, \
-    group_by_main_version
+    AppSemVer, group_by_main_version, parse_version, parse_spec, \
+    parse_min_version, parse_max_inc_version, version_cache_info, \
+    clear_version_caches, version_key, spec_bounds, MIN_VERSION_KEY, \
+    MAX_VERSION_KEY
 
 
 class VersioningTest(TestCase):
@@ -76,3 +78,49 @@ class VersioningTest(TestCase):
         example['2.0.0'] = [1]
         result = group_by_main_version(example)
         self.assertDictEqual({'1': [2, 3], '2': [1]}, result)
+
+    def test_parse_cached(self):
+        clear_version_caches()
+        version = parse_version('9.0.1')
+        self.assertIs(version, parse_version('9.0.1'))
+        self.assertIs(parse_spec('>=9.0.0'), parse_spec('>=9.0.0'))
+        self.assertIn(version, parse_spec('>=9.0.0'))
+        info = version_cache_info()
+        self.assertEqual(1, info['version'].hits)
+        self.assertEqual(1, info['version'].misses)
+        self.assertEqual(2, info['spec'].hits)
+        self.assertEqual(1, info['spec'].misses)
+
+    def test_parse_padded(self):
+        self.assertEqual('9.0.0', str(parse_min_version('9')))
+        self.assertEqual('9.%i.%i' % (maxsize, maxsize),
+                         str(parse_max_inc_version('9')))
+
+    def test_parse_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_version('9.0')
+        with self.assertRaises(ValueError):
+            parse_spec('')
+
+    def test_version_key(self):
+        self.assertLess(version_key('9.0.1'), version_key('9.0.2'))
+        self.assertLess(version_key('9.0.999'), version_key('9.1.0'))
+        self.assertLess(version_key('9.999.0'), version_key('10.0.0'))
+        self.assertEqual(version_key('9.0.0'), version_key('9.0.0-beta.1'))
+        with self.assertRaises(ValueError):
+            version_key('9.%i.0' % maxsize)
+        self.assertEqual(version_key('9.999999.999999'),
+                         version_key('9.%i.%i' % (maxsize, maxsize), True))
+
+    def test_spec_bounds(self):
+        self.assertEqual((MIN_VERSION_KEY, MAX_VERSION_KEY), spec_bounds('*'))
+        self.assertEqual((version_key('9.0.0'), version_key('12.0.0')),
+                         spec_bounds('>=9.0.0,<12.0.0'))
+        self.assertEqual((version_key('9.0.0'), MAX_VERSION_KEY),
+                         spec_bounds('>=9.0.0'))
+        self.assertEqual((MIN_VERSION_KEY, version_key('12.0.0')),
+                         spec_bounds('<12.0.0'))
+        with self.assertRaises(ValueError):
+            spec_bounds('<=12.0.0')
+        with self.assertRaises(ValueError):
+            spec_bounds('>=12.0')
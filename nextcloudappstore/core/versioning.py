@@ -1,15 +1,24 @@
 from datetime import datetime
-from functools import reduce
+from functools import reduce, lru_cache
 from sys import maxsize
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
-from semantic_version import Version
+from semantic_version import Version, Spec
 
 SEMVER_REGEX = (r'(?:0|[1-9][0-9]*)'
                 r'\.(?:0|[1-9][0-9]*)'
                 r'\.(?:0|[1-9][0-9]*)'
                 r'(?:\-(?:[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?')
 
+# maximum number of parsed versions and specs that are kept per cache
+VERSION_CACHE_SIZE = 4096
+
+# versions are encoded into sortable integers which fit into a 64bit column,
+# every version part must be lower than VERSION_KEY_PART_LIMIT
+VERSION_KEY_PART_LIMIT = 10 ** 6
+MIN_VERSION_KEY = 0
+MAX_VERSION_KEY = VERSION_KEY_PART_LIMIT ** 3
+
 
 class AppSemVer:
     """
@@ -21,7 +30,7 @@ class AppSemVer:
                  released_at: datetime = None) -> None:
         self.released_at = released_at
         self.is_nightly = is_nightly
-        self.version = Version(version)
+        self.version = parse_version(version)
 
     def __lt__(self, other: 'AppSemVer') -> bool:
         if self.version == other.version:
@@ -143,8 +152,144 @@ def group_by_main_version(versions: GroupedVersions) -> GroupedVersions:
 
     def reduction(prev, item):
         key, value = item
-        main_version = str(Version(key).major)
+        main_version = str(parse_version(key).major)
         prev[main_version] = prev.get(main_version, []) + value
         return prev
 
     return reduce(reduction, versions.items(), {})
+
+
+# The parsed objects are shared between callers and must not be modified.
+# lru_cache is thread safe, bounded and counts hits and misses which can be
+# inspected with version_cache_info()
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_version(version: str) -> Version:
+    """
+    Parses a semantic version
+    :param version: the version, e.g. 9.0.1
+    :raises ValueError: if the version is not a semantic version
+    :return: the parsed version
+    """
+    return Version(version)
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_spec(spec: str) -> Spec:
+    """
+    Parses a semantic version spec
+    :param spec: the spec, e.g. >=9.0.0,<10.0.0
+    :raises ValueError: if the spec is invalid
+    :return: the parsed spec
+    """
+    return Spec(spec)
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_min_version(version: str) -> Version:
+    """
+    Pads a version like a minimum version and parses it, e.g. 9 into 9.0.0
+    :param version: the version
+    :raises ValueError: if the padded version is not a semantic version
+    :return: the parsed version
+    """
+    return parse_version(pad_min_version(version))
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_max_inc_version(version: str) -> Version:
+    """
+    Pads a version like an inclusive maximum version and parses it, e.g. 9
+    into 9.MAX_INT.MAX_INT
+    :param version: the version
+    :raises ValueError: if the padded version is not a semantic version
+    :return: the parsed version
+    """
+    return parse_version(pad_max_inc_version(version))
+
+
+VERSION_CACHES = {
+    'version': parse_version,
+    'spec': parse_spec,
+    'min_version': parse_min_version,
+    'max_inc_version': parse_max_inc_version,
+}
+
+
+def version_cache_info() -> Dict[str, Any]:
+    """
+    :return: the hits, misses, maximum and current size of each cache
+    """
+    return {name: func.cache_info() for name, func in VERSION_CACHES.items()}
+
+
+def clear_version_caches() -> None:
+    for func in VERSION_CACHES.values():
+        func.cache_clear()
+
+
+def version_key(version: str, clamp: bool = False) -> int:
+    """
+    Encodes a semantic version into an integer which sorts like the version.
+    Pre-releases share the key of their release since specs compare them as
+    equal, e.g. 9.0.0-beta is matched by >=9.0.0
+    :param version: the semantic version, e.g. 9.0.1
+    :param clamp: if True, version parts which are too big are lowered to the
+    biggest possible part instead of raising an error. Used for padded
+    inclusive maximum versions
+    :raises ValueError: if the version is not a semantic version or a part is
+    too big
+    :return: the encoded version
+    """
+    parsed = parse_version(version)
+    key = 0
+    for part in (parsed.major, parsed.minor, parsed.patch):
+        if part >= VERSION_KEY_PART_LIMIT:
+            if not clamp:
+                msg = 'Version %s can not be encoded' % version
+                raise ValueError(msg)
+            part = VERSION_KEY_PART_LIMIT - 1
+        key = key * VERSION_KEY_PART_LIMIT + part
+    return key
+
+
+def spec_bounds(spec: str) -> Tuple[int, int]:
+    """
+    Turns a spec created by to_spec into an inclusive minimum and an
+    exclusive maximum version key
+    :param spec: the spec, e.g. >=9.0.0,<12.0.0
+    :raises ValueError: if the spec can not be represented as a range
+    :return: the minimum and maximum version keys, MIN_VERSION_KEY and
+    MAX_VERSION_KEY if there is no lower or upper bound
+    """
+    min_key, max_key = MIN_VERSION_KEY, MAX_VERSION_KEY
+    for clause in spec.split(','):
+        clause = clause.strip()
+        if clause == '*':
+            continue
+        elif clause.startswith('>='):
+            min_key = max(min_key, version_key(clause[2:]))
+        elif clause.startswith('<') and not clause.startswith('<='):
+            max_key = min(max_key, version_key(clause[1:]))
+        else:
+            raise ValueError('Spec %s can not be encoded' % spec)
+    return min_key, max_key
+
+
+def nearest_version(version: str, known: List[str]) -> str:
+    """
+    Maps a platform version onto the closest known version of the same
+    major.minor series which is not newer than the version. Versions are
+    never mapped onto another series, if no such version is known the
+    version itself is used
+    :param version: a platform version, e.g. 11.0.2
+    :param known: the known full versions, sorted from oldest to newest
+    :return: the closest known version of the series or the version itself
+    """
+    def to_tuple(v):
+        return tuple(int(part) for part in v.split('.'))
+
+    target = to_tuple(pad_min_version(version))
+    older = [v for v in known
+             if to_tuple(v)[:2] == target[:2] and to_tuple(v) <= target]
+    return older[-1] if older else version
@@ -15,7 +15,6 @@ from django.views.generic.base import TemplateView
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
 from rest_framework.generics import ListAPIView
-from semantic_version import Version
 
 from nextcloudappstore.core.api.v1.serializers import AppRatingSerializer
 from nextcloudappstore.core.caching import app_etag
@@ -26,7 +25,7 @@ from nextcloudappstore.core.models import App, Category, AppRating, \
     NextcloudRelease
 from nextcloudappstore.core.scaffolding.archive import build_archive
 from nextcloudappstore.core.scaffolding.forms import AppScaffoldingForm
-from nextcloudappstore.core.versioning import pad_min_version
+from nextcloudappstore.core.versioning import parse_min_version
 
 
 @etag(app_etag)
@@ -160,7 +159,7 @@ class AppReleasesView(DetailView):
         """
 
         return sorted(releases_by_platform, reverse=reverse,
-                      key=lambda v: Version(pad_min_version(v[0])))
+                      key=lambda v: parse_min_version(v[0]))
 
 
 class CategoryAppListView(ListView):
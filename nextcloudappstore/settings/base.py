@@ -223,6 +223,12 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': LOG_FILE,
         },
+        # the metrics of every release upload are logged as JSON, replace
+        # this handler to keep them, e.g. with a FileHandler
+        'upload_metrics': {
+            'level': 'INFO',
+            'class': 'logging.NullHandler',
+        },
     },
     'loggers': {
         'django': {
@@ -230,6 +236,17 @@ LOGGING = {
             'level': LOG_LEVEL,
             'propagate': True,
         },
+        'nextcloudappstore': {
+            'handlers': ['file'],
+            'level': LOG_LEVEL,
+            'propagate': True,
+        },
+        # slow uploads are logged as warnings and also reach the file handler
+        'nextcloudappstore.core.api.v1.release.metrics': {
+            'handlers': ['upload_metrics'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 LOCALE_PATHS = (
@@ -255,6 +272,44 @@ MAX_DOWNLOAD_INFO_XML_SIZE = 512 * 1024  # bytes
 MAX_DOWNLOAD_TIMEOUT = 60  # seconds
 MAX_DOWNLOAD_REDIRECTS = 10
 MAX_DOWNLOAD_SIZE = 20 * (1024 ** 2)  # bytes
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes
+# connections are reused per process, connections to at most
+# DOWNLOAD_POOL_HOSTS hosts are kept open and at most DOWNLOAD_POOL_SIZE
+# connections per host are used at the same time
+DOWNLOAD_POOL_HOSTS = 10
+DOWNLOAD_POOL_SIZE = 4
+# downloads fail if no connection became free within DOWNLOAD_POOL_TIMEOUT
+DOWNLOAD_POOL_TIMEOUT = 60  # seconds
+
+# release uploads are processed during the request by default. If enabled,
+# clients can send a "Prefer: respond-async" header to queue the upload for
+# the processreleasejobs command instead
+RELEASE_UPLOAD_ASYNC = False
+# running jobs are handed out again once they did not finish in time
+RELEASE_JOB_TIMEOUT = 10 * 60  # seconds
+# jobs which were abandoned this many times are marked as failed
+RELEASE_JOB_MAX_ATTEMPTS = 3
+# batch uploads download and validate at most RELEASE_BATCH_WORKERS releases
+# at the same time, the imports run one after another
+RELEASE_BATCH_MAX_SIZE = 20
+RELEASE_BATCH_WORKERS = 4
+# the metrics of every release upload are logged as info, uploads which take
+# longer are logged as warnings
+RELEASE_UPLOAD_SLOW_DURATION = 10  # seconds
+# parsed metadata of uploaded archives is kept by their SHA-256 digest so
+# uploading the same archive again skips parsing it, 0 disables the store
+RELEASE_METADATA_STORE_SIZE = 50 * (1024 ** 2)  # bytes
+
+# apps.json is served from pre-rendered snapshots by default. Streaming
+# renders the apps list in chunks on every request instead which keeps the
+# peak memory usage of a worker independent of the catalog size
+APPS_JSON_STREAMING = False
+APPS_JSON_STREAMING_CHUNK_SIZE = 100  # apps
+# every selection of languages is kept in its own snapshot
+APPS_JSON_MAX_LANGUAGES = 5
+
+# maximum number of installed apps which can be sent to the update check
+UPDATE_CHECK_MAX_APPS = 500
 
 # certificate location configuration
 NEXTCLOUD_CERTIFICATE_LOCATION = join(